@@ -1,7 +1,8 @@
 import re
 from typing import Any, Dict, List, Optional
 
-import pandas as pd
+from app.data.features import TransactionFeatures
+from app.data.store import CustomerStore
 
 
 def _parse_top_n(text: str) -> Optional[int]:
@@ -11,28 +12,41 @@ def _parse_top_n(text: str) -> Optional[int]:
     return None
 
 
-def rank_at_risk(customers: pd.DataFrame, top_n: int = 10) -> List[Dict[str, Any]]:
-    ordered = customers.sort_values(by="churn_risk_score", ascending=False)
-    cols = [
-        "customer_id",
-        "name",
-        "email",
-        "segment",
-        "product",
-        "churn_risk_score",
-        "reason",
-    ]
-    return ordered.head(top_n)[cols].to_dict(orient="records")
+RANKED_COLUMNS = [
+    "customer_id",
+    "name",
+    "email",
+    "segment",
+    "product",
+    "churn_risk_score",
+    "reason",
+]
 
 
-def run_attrition(customers: pd.DataFrame, user_input: str, customer_id: Optional[str]) -> Dict[str, Any]:
+def rank_at_risk(
+    customers: CustomerStore,
+    top_n: int = 10,
+    segment: Optional[str] = None,
+    product: Optional[str] = None,
+    reason: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    return customers.top_at_risk(top_n, segment=segment, product=product, reason=reason, columns=RANKED_COLUMNS)
+
+
+def run_attrition(
+    customers: CustomerStore,
+    user_input: str,
+    customer_id: Optional[str],
+    features: Optional[TransactionFeatures] = None,
+) -> Dict[str, Any]:
     top_n = _parse_top_n(user_input) or 10
     if customer_id:
-        row = customers[customers["customer_id"] == customer_id]
-        if not row.empty:
+        customer = customers.get(customer_id)
+        if customer is not None:
             return {
                 "mode": "single",
-                "customer": row.iloc[0].to_dict(),
+                "customer": customer,
+                "features": features.get(customer_id) if features is not None else None,
             }
     if "top" in user_input.lower() or "at-risk" in user_input.lower() or "attrit" in user_input.lower():
         return {
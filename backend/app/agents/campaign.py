@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import anyio
+
+from app.agents.communication import agenerate_response
+from app.agents.rag import build_product_context, semantic_retrieve_many
+from app.agents.segmentation import segment_customer
+from app.core.concurrency import run_sync
+from app.core.config import (
+    CAMPAIGN_CHUNK_SIZE,
+    CAMPAIGN_FLUSH_ROWS,
+    CAMPAIGN_LEASE_SECONDS,
+    CAMPAIGN_LLM_CONCURRENCY,
+    CAMPAIGN_LLM_TIMEOUT_SECONDS,
+)
+from app.data.snapshot import DataSnapshot
+from app.db import CampaignLeaseLost, finish_campaign_job, save_campaign_results
+
+logger = logging.getLogger(__name__)
+
+# (position in the job's ranking, customer_id)
+PendingCustomer = Tuple[int, str]
+
+# Runs in this process by job id, for live progress.
+_ACTIVE: Dict[str, "CampaignRun"] = {}
+
+
+def campaign_progress(job_id: str) -> Optional[Dict[str, Any]]:
+    run = _ACTIVE.get(job_id)
+    return dict(run.summary) if run is not None else None
+
+
+class CampaignRun:
+    """Builds retention packages for a campaign job's remaining customers.
+
+    Customers are prepared `CAMPAIGN_CHUNK_SIZE` at a time on the offload pool. Preparation covers the
+    snapshot lookup, segmentation, offer lookup and product context, plus one batched semantic retrieval
+    for the chunk's distinct queries. Responses are then generated with at most `CAMPAIGN_LLM_CONCURRENCY` in
+    flight. The next chunk is only prepared while the generation queue is short, so memory stays bounded.
+    Results are yielded in completion order and written in batches of `CAMPAIGN_FLUSH_ROWS` (or sooner,
+    to keep the job's heartbeat fresh), so an interrupted job resumes from what was stored. Customers
+    that fail, including a canned fallback or truncated answer, are not stored and are retried on resume.
+    Every write carries the run's `lease_token`; once another run has claimed the job, the writes are refused
+    and this run stops as `superseded` without touching the job.
+    """
+
+    def __init__(
+        self, job_id: str, lease_token: str, total: int, snapshot: DataSnapshot, pending: List[PendingCustomer]
+    ):
+        self.job_id = job_id
+        self.lease_token = lease_token
+        self.snapshot = snapshot
+        self.pending = pending
+        self._semaphore = asyncio.Semaphore(max(1, CAMPAIGN_LLM_CONCURRENCY))
+        self._buffer: List[Dict[str, Any]] = []
+        self._failed_unsaved = 0
+        self._flushed_at = time.monotonic()
+        self._started = time.perf_counter()
+        self.summary: Dict[str, Any] = {
+            "job_id": job_id,
+            "total": total,
+            "already_done": total - len(pending),
+            "completed": 0,
+            "failed": 0,
+            "persisted": 0,
+            "retrieval_queries": 0,
+            "segments": {},
+        }
+
+    def _failure(self, position: int, customer_id: str, error: str) -> Dict[str, Any]:
+        self.summary["failed"] += 1
+        self._failed_unsaved += 1
+        return {"index": position, "customer_id": customer_id, "error": error}
+
+    def _prepare(self, window: List[PendingCustomer]) -> Tuple[List[Dict[str, Any]], List[Tuple[int, str, str]], int]:
+        """Everything before the LLM for one chunk; mirrors the chat graph's attrition/segmentation/RAG nodes.
+
+        Runs on the offload pool, so it only returns (prepared items, failures, retrieval queries).
+        """
+        snapshot = self.snapshot
+        prepared: List[Dict[str, Any]] = []
+        failed: List[Tuple[int, str, str]] = []
+        for position, customer_id in window:
+            customer = snapshot.customers.get(customer_id)
+            if customer is None:
+                failed.append((position, customer_id, "customer_not_found"))
+                continue
+            segment = segment_customer(customer)["segment"]
+            reason = customer.get("reason", "general")
+            prepared.append(
+                {
+                    "index": position,
+                    "customer": customer,
+                    "segment": segment,
+                    "reason": reason,
+                    "offers": snapshot.offer_index.find(segment, reason),
+                    "product_context": build_product_context(snapshot.product_catalog, customer.get("product")),
+                    "query": f"{reason} {segment} {customer.get('product', '')}",
+                }
+            )
+        # Campaign customers share a handful of (reason, segment, product) combinations; embed each once.
+        queries = list(dict.fromkeys(item["query"] for item in prepared))
+        try:
+            hits = dict(zip(queries, semantic_retrieve_many(snapshot.semantic_index, queries, top_k=3)))
+        except Exception:
+            logger.warning("campaign %s: retrieval failed for %d customers", self.job_id, len(prepared), exc_info=True)
+            failed.extend((item["index"], item["customer"]["customer_id"], "retrieval_failed") for item in prepared)
+            return [], failed, 0
+        for item in prepared:
+            item["knowledge"] = hits[item.pop("query")]
+        return prepared, failed, len(queries)
+
+    async def _generate(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        customer = item["customer"]
+        payload = {
+            "customer": customer,
+            "segment": item["segment"],
+            "reason": item["reason"],
+            "offers": item["offers"],
+            "product_context": item["product_context"],
+            "knowledge": item["knowledge"],
+        }
+        outcome: Dict[str, Any] = {}
+        async with self._semaphore:
+            try:
+                response = await asyncio.wait_for(
+                    agenerate_response(payload, snapshot=self.snapshot, outcome=outcome), CAMPAIGN_LLM_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                response = None
+        # A fallback or a stream cut off after its first tokens is not a package worth storing.
+        if response is None or not outcome.get("complete"):
+            return self._failure(item["index"], customer["customer_id"], "llm_unavailable")
+        result = {
+            "index": item["index"],
+            "customer_id": customer["customer_id"],
+            "segment": item["segment"],
+            "reason": item["reason"],
+            "offers": item["offers"],
+            "response": response,
+        }
+        self.summary["completed"] += 1
+        self.summary["segments"][item["segment"]] = self.summary["segments"].get(item["segment"], 0) + 1
+        self._buffer.append(result)
+        return result
+
+    async def _flush(self) -> None:
+        rows, self._buffer = self._buffer, []
+        failed, self._failed_unsaved = self._failed_unsaved, 0
+        self._flushed_at = time.monotonic()
+        self.summary["persisted"] += await run_sync(save_campaign_results, self.job_id, self.lease_token, rows, failed)
+
+    async def _maybe_flush(self) -> None:
+        stale = time.monotonic() - self._flushed_at > CAMPAIGN_LEASE_SECONDS / 3
+        if len(self._buffer) >= max(1, CAMPAIGN_FLUSH_ROWS) or stale:
+            await self._flush()
+
+    async def run(self) -> AsyncIterator[Dict[str, Any]]:
+        chunk_size = max(1, CAMPAIGN_CHUNK_SIZE)
+        max_queued = 2 * max(1, CAMPAIGN_LLM_CONCURRENCY)
+        tasks: Set[asyncio.Task] = set()
+        status = "interrupted"
+        _ACTIVE[self.job_id] = self
+        try:
+            for start in range(0, len(self.pending), chunk_size):
+                prepared, failed, queries = await run_sync(self._prepare, self.pending[start : start + chunk_size])
+                self.summary["retrieval_queries"] += queries
+                for position, customer_id, error in failed:
+                    yield self._failure(position, customer_id, error)
+                for item in prepared:
+                    tasks.add(asyncio.create_task(self._generate(item)))
+
+                # Emit whatever has finished; wait on generation only when too much is queued.
+                while tasks:
+                    done = {task for task in tasks if task.done()}
+                    if not done:
+                        if len(tasks) <= max_queued:
+                            break
+                        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        tasks.discard(task)
+                        yield task.result()
+                    await self._maybe_flush()
+
+            for task in asyncio.as_completed(tasks):
+                yield await task
+                await self._maybe_flush()
+            tasks.clear()
+            status = "partial" if self.summary["failed"] else "completed"
+        except CampaignLeaseLost:
+            status = "superseded"
+        finally:
+            for task in tasks:
+                task.cancel()
+            if _ACTIVE.get(self.job_id) is self:
+                _ACTIVE.pop(self.job_id)
+            # Also runs when the client disconnects; keep what finished so a resume skips it.
+            with anyio.CancelScope(shield=True):
+                try:
+                    if status != "superseded":
+                        await self._flush()
+                        await run_sync(finish_campaign_job, self.job_id, self.lease_token, status)
+                except CampaignLeaseLost:
+                    status = "superseded"
+                except Exception:
+                    logger.exception("campaign %s: could not persist final state", self.job_id)
+            if status == "superseded":
+                logger.warning("campaign %s: taken over by another run; stopping without further writes", self.job_id)
+            self.summary["status"] = status
+            self.summary["elapsed_seconds"] = round(time.perf_counter() - self._started, 3)
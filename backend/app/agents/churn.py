@@ -0,0 +1,128 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import CHURN_SCORE_BATCH_ROWS
+from app.data.features import TransactionFeatures
+from app.data.store import CustomerStore
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_COLUMNS = ("tenure_months", "complaints_90d", "avg_balance", "last_login_days")
+FEATURE_COLUMNS = ("days_since_last_txn", "mom_spend_drop")
+
+
+@dataclass(frozen=True)
+class ChurnModel:
+    """Logistic churn-risk model over whole columns.
+
+    The signal weights are a least-squares fit (on the logit) to the `churn_risk_score` values shipped in
+    customers.csv. The transaction weights are priors. Customers without transactions get no transaction term.
+    """
+
+    bias: float = 2.3
+    tenure: float = -0.04  # per log(1 + months)
+    complaints: float = 0.5  # per complaint in the last 90 days, capped at 5
+    balance: float = -0.75  # per log10(1 + balance)
+    login: float = 1.3  # per 30 days since last login, capped at 180 days
+    txn_recency: float = 0.3  # per 30 days since the last transaction, capped at 180 days
+    spend_drop: float = 1.0  # per unit of month-over-month spend drop (0..1)
+    version: str = "logit-v1"
+
+    def score(
+        self,
+        tenure_months: np.ndarray,
+        complaints_90d: np.ndarray,
+        avg_balance: np.ndarray,
+        last_login_days: np.ndarray,
+        days_since_last_txn: Optional[np.ndarray] = None,
+        mom_spend_drop: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Risk in [0, 1] rounded to 4 decimals, one per row; NaN signals count as 0."""
+        z = self.bias + self.tenure * np.log1p(np.clip(np.nan_to_num(tenure_months), 0, None))
+        z += self.complaints * np.clip(np.nan_to_num(complaints_90d), 0, 5)
+        z += self.balance * np.log10(1 + np.clip(np.nan_to_num(avg_balance), 0, None))
+        z += self.login * np.clip(np.nan_to_num(last_login_days), 0, 180) / 30
+        if days_since_last_txn is not None:
+            z += self.txn_recency * np.clip(np.nan_to_num(days_since_last_txn), 0, 180) / 30
+        if mom_spend_drop is not None:
+            z += self.spend_drop * np.clip(np.nan_to_num(mom_spend_drop), 0, 1)
+        return np.round(1 / (1 + np.exp(-z)), 4)
+
+
+MODEL = ChurnModel()
+
+
+def _book_features(customers: CustomerStore, features: Optional[TransactionFeatures]) -> Dict[str, np.ndarray]:
+    """Transaction features aligned to book rows (NaN for customers without transactions)."""
+    if features is None or not len(features):
+        return {}
+    rows = customers.rows_of(features.customer_ids)
+    found = rows >= 0
+    aligned = {}
+    for name in FEATURE_COLUMNS:
+        column = np.full(len(customers), np.nan, dtype=np.float32)
+        column[rows[found]] = features.column(name)[found]
+        aligned[name] = column
+    return aligned
+
+
+def score_book(
+    customers: CustomerStore,
+    features: Optional[TransactionFeatures] = None,
+    model: ChurnModel = MODEL,
+    batch_rows: int = CHURN_SCORE_BATCH_ROWS,
+) -> CustomerStore:
+    """Rescore every customer, `batch_rows` rows of each signal column at a time, and re-rank the book."""
+    aligned = _book_features(customers, features)
+    scores = np.empty(len(customers), dtype=np.float64)
+    batch_rows = max(1, batch_rows)
+    for start in range(0, len(customers), batch_rows):
+        stop = min(start + batch_rows, len(customers))
+        inputs = {name: np.asarray(customers.values(name, start, stop), dtype=np.float64) for name in SIGNAL_COLUMNS}
+        inputs.update({name: column[start:stop] for name, column in aligned.items()})
+        scores[start:stop] = model.score(**inputs)
+    return customers.with_scores(scores)
+
+
+def rescore_customers(
+    customers: CustomerStore,
+    customer_ids: Sequence[str],
+    features: Optional[TransactionFeatures] = None,
+    model: ChurnModel = MODEL,
+) -> CustomerStore:
+    """Rescore only `customer_ids` (unknown ids are ignored) and move them within the existing ranking."""
+    rows = customers.rows_of(customer_ids)
+    rows = np.unique(rows[rows >= 0])
+    if not len(rows):
+        return customers
+    inputs = {name: np.asarray(customers.columns[name][rows], dtype=np.float64) for name in SIGNAL_COLUMNS}
+    if features is not None and len(features):
+        ids = [customers.columns["customer_id"][row] for row in rows.tolist()]
+        inputs.update(features.columns_for(ids, list(FEATURE_COLUMNS)))
+    scores = np.array(customers.columns["churn_risk_score"], dtype=np.float64)
+    scores[rows] = model.score(**inputs)
+    return customers.with_scores(scores, changed_rows=rows)
+
+
+def refresh_scores(
+    customers: CustomerStore,
+    features: Optional[TransactionFeatures],
+    previous_features: Optional[TransactionFeatures],
+) -> CustomerStore:
+    """Scores after `features` replaced `previous_features` over an already-scored book.
+
+    When the new features continue straight on from the previous ones and the window end (`as_of`) did not
+    move, only customers with new transactions are rescored. Otherwise every customer's features may have
+    shifted, so the whole book is rescored.
+    """
+    if (
+        features is not None
+        and previous_features is not None
+        and features.feed_range[0] == previous_features.feed_range[1]
+        and features.as_of == previous_features.as_of
+    ):
+        return rescore_customers(customers, features.touched, features)
+    return score_book(customers, features)
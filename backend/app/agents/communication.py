@@ -1,6 +1,11 @@
-from typing import Any, Dict
+import hashlib
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
 
+from app.agents.response_cache import RESPONSE_CACHE, payload_key
+from app.core.concurrency import run_sync
+from app.core.config import OLLAMA_CHAT_MODEL, OLLAMA_CHAT_TEMPERATURE
 from app.core.llm import get_chat_llm
+from app.data.snapshot import DataSnapshot
 
 
 def _build_prompt(payload: Dict[str, Any]) -> str:
@@ -23,16 +28,127 @@ Keep it concise, professional, and empathetic.
 """.strip()
 
 
-def generate_response(payload: Dict[str, Any]) -> str:
+# Part of every cache key, so editing the prompt template never serves answers written for the old one.
+_PROMPT_FINGERPRINT = hashlib.sha256(_build_prompt({}).encode("utf-8")).hexdigest()[:16]
+
+
+def response_cache_key(payload: Dict[str, Any]) -> str:
+    return payload_key(payload, OLLAMA_CHAT_MODEL, OLLAMA_CHAT_TEMPERATURE, _PROMPT_FINGERPRINT)
+
+
+FALLBACK_RESPONSE = (
+    "retention_summary: Customer shows elevated churn risk driven by recent complaints and reduced engagement.\n"
+    "offers: Offer a fee waiver and targeted rewards boost on the Cash Back Mastercard for 3 months.\n"
+    "next_best_action: Call within 24 hours, acknowledge service issues, and confirm resolution timeline.\n"
+    "email_draft: Hello [Name], I wanted to reach out personally regarding your recent experience..."
+)
+
+
+def stream_response(payload: Dict[str, Any], outcome: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Yield the response as the model produces it; falls back to canned guidance if the model is unavailable.
+
+    `outcome["complete"]` is set once the model finished normally (not for a fallback or a cut-off stream).
+    """
+    llm = get_chat_llm()
+    prompt = _build_prompt(payload)
+    emitted = False
+    try:
+        for chunk in llm.stream(prompt):
+            text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if text:
+                emitted = True
+                yield text
+        if outcome is not None:
+            outcome["complete"] = emitted
+    except Exception:
+        # Once tokens have reached the client a canned answer can't replace them; stop at what was streamed.
+        if not emitted:
+            yield FALLBACK_RESPONSE
+
+
+def generate_response(
+    payload: Dict[str, Any],
+    on_token: Optional[Callable[[str], None]] = None,
+    snapshot: Optional[DataSnapshot] = None,
+    outcome: Optional[Dict[str, Any]] = None,
+) -> str:
+    """The full response. With the `snapshot` the payload was built from, answers are served from and saved to
+    `RESPONSE_CACHE`; a cached answer reaches `on_token` as a single token.
+
+    `outcome["complete"]` tells whether the text is a whole answer, rather than a fallback or a stream cut off
+    after its first tokens.
+    """
+    key = response_cache_key(payload) if snapshot is not None and RESPONSE_CACHE.enabled else None
+    if key is not None:
+        cached = RESPONSE_CACHE.get(snapshot, key)
+        if cached is None and RESPONSE_CACHE.shared:
+            cached = RESPONSE_CACHE.fetch(snapshot, key)
+        if cached is not None:
+            if on_token is not None:
+                on_token(cached)
+            if outcome is not None:
+                outcome["complete"] = True
+            return cached
+    parts: List[str] = []
+    outcome = {} if outcome is None else outcome
+    outcome["complete"] = False
+    for token in stream_response(payload, outcome):
+        parts.append(token)
+        if on_token is not None:
+            on_token(token)
+    response = "".join(parts)
+    if key is not None and outcome.get("complete"):
+        RESPONSE_CACHE.put(snapshot, key, response)
+        if RESPONSE_CACHE.shared:
+            RESPONSE_CACHE.share(snapshot, key, response)
+    return response
+
+
+async def astream_response(payload: Dict[str, Any], outcome: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
     llm = get_chat_llm()
     prompt = _build_prompt(payload)
+    emitted = False
     try:
-        response = llm.invoke(prompt)
-        return response.content if hasattr(response, "content") else str(response)
+        async for chunk in llm.astream(prompt):
+            text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if text:
+                emitted = True
+                yield text
+        if outcome is not None:
+            outcome["complete"] = emitted
     except Exception:
-        return (
-            "retention_summary: Customer shows elevated churn risk driven by recent complaints and reduced engagement.\n"
-            "offers: Offer a fee waiver and targeted rewards boost on the Cash Back Mastercard for 3 months.\n"
-            "next_best_action: Call within 24 hours, acknowledge service issues, and confirm resolution timeline.\n"
-            "email_draft: Hello [Name], I wanted to reach out personally regarding your recent experience..."
-        )
+        if not emitted:
+            yield FALLBACK_RESPONSE
+
+
+async def agenerate_response(
+    payload: Dict[str, Any],
+    on_token: Optional[Callable[[str], None]] = None,
+    snapshot: Optional[DataSnapshot] = None,
+    outcome: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Async `generate_response` (same `outcome`); the shared cache tier is queried and written on the offload pool."""
+    key = response_cache_key(payload) if snapshot is not None and RESPONSE_CACHE.enabled else None
+    if key is not None:
+        cached = RESPONSE_CACHE.get(snapshot, key)
+        if cached is None and RESPONSE_CACHE.shared:
+            cached = await run_sync(RESPONSE_CACHE.fetch, snapshot, key)
+        if cached is not None:
+            if on_token is not None:
+                on_token(cached)
+            if outcome is not None:
+                outcome["complete"] = True
+            return cached
+    parts: List[str] = []
+    outcome = {} if outcome is None else outcome
+    outcome["complete"] = False
+    async for token in astream_response(payload, outcome):
+        parts.append(token)
+        if on_token is not None:
+            on_token(token)
+    response = "".join(parts)
+    if key is not None and outcome.get("complete"):
+        RESPONSE_CACHE.put(snapshot, key, response)
+        if RESPONSE_CACHE.shared:
+            await run_sync(RESPONSE_CACHE.share, snapshot, key, response)
+    return response
@@ -1,35 +1,103 @@
-from typing import Any, Dict, List
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from app.rag.semantic import CorpusItem, SemanticIndex
 
+# (offer, valid from, valid until exclusive); None leaves that side of the window open.
+_Entry = Tuple[Dict[str, Any], Optional[datetime], Optional[datetime]]
 
-def find_offers(offers_catalog: List[Dict[str, Any]], segment: str, reason: str) -> List[Dict[str, Any]]:
-    matches = []
-    for offer in offers_catalog:
-        if segment in offer["segments"] and reason in offer["reasons"]:
-            matches.append(offer)
-    if not matches:
-        matches = [o for o in offers_catalog if segment in o["segments"]]
-    return matches[:3]
+
+def _offer_time(value: Any, end: bool) -> Optional[datetime]:
+    """Parse `valid_from` / `valid_until` (ISO date or datetime, naive = UTC) into a window bound.
+
+    `valid_until` is inclusive: a date covers that whole day, a datetime that instant.
+    """
+    if not value:
+        return None
+    text = str(value)
+    parsed = datetime.fromisoformat(text)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end:
+        parsed += timedelta(days=1) if len(text) == 10 else timedelta(microseconds=1)
+    return parsed
+
+
+class OfferIndex:
+    """The offer catalog bucketed by (segment, reason) and by segment, built once per catalog.
+
+    Each bucket lists offers by descending `priority` (default 0), then catalog order, so a lookup walks one
+    short bucket instead of the whole catalog. Offers outside their `valid_from` / `valid_until` window are
+    skipped at lookup time, so time-limited offers drop out without a rebuild. The data snapshot builds a
+    new index whenever the offers change.
+    """
+
+    def __init__(self, offers: Sequence[Dict[str, Any]]):
+        self.offers = list(offers)
+        entries = [
+            (offer, _offer_time(offer.get("valid_from"), False), _offer_time(offer.get("valid_until"), True))
+            for offer in self.offers
+        ]
+        order = sorted(range(len(entries)), key=lambda i: (-float(self.offers[i].get("priority") or 0), i))
+        self._by_pair: Dict[Tuple[str, str], List[_Entry]] = {}
+        self._by_segment: Dict[str, List[_Entry]] = {}
+        for i in order:
+            offer = self.offers[i]
+            reasons = dict.fromkeys(offer["reasons"])
+            for segment in dict.fromkeys(offer["segments"]):
+                self._by_segment.setdefault(segment, []).append(entries[i])
+                for reason in reasons:
+                    self._by_pair.setdefault((segment, reason), []).append(entries[i])
+
+    def __len__(self) -> int:
+        return len(self.offers)
+
+    @staticmethod
+    def _take(bucket: Sequence[_Entry], now: datetime, limit: int) -> List[Dict[str, Any]]:
+        found: List[Dict[str, Any]] = []
+        for offer, start, until in bucket:
+            if (start is None or start <= now) and (until is None or now < until):
+                found.append(offer)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def find(self, segment: str, reason: str, limit: int = 3, at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Offers valid at `at` (default now) for the segment and reason, else for the segment alone."""
+        now = at or datetime.now(timezone.utc)
+        return self._take(self._by_pair.get((segment, reason), ()), now, limit) or self._take(
+            self._by_segment.get(segment, ()), now, limit
+        )
+
+
+def find_offers(offers: OfferIndex, segment: str, reason: str) -> List[Dict[str, Any]]:
+    return offers.find(segment, reason)
 
 
 def build_product_context(product_catalog: Dict[str, Any], product_name: str) -> Dict[str, Any]:
     return product_catalog.get(product_name, {})
 
 
+def offer_corpus_item(offer: Dict[str, Any]) -> CorpusItem:
+    text = f"Offer: {offer['name']}. Segments: {', '.join(offer['segments'])}. Reasons: {', '.join(offer['reasons'])}. Details: {offer['details']}"
+    return CorpusItem(id=offer["id"], text=text, payload={"type": "offer", **offer})
+
+
+def knowledge_corpus_item(doc: Dict[str, Any]) -> CorpusItem:
+    text = f"{doc['title']}: {doc['content']}"
+    return CorpusItem(id=doc["id"], text=text, payload={"type": "knowledge", **doc})
+
+
 def build_semantic_index(offers: List[Dict[str, Any]], knowledge: List[Dict[str, Any]]) -> SemanticIndex:
-    items: List[CorpusItem] = []
-    for offer in offers:
-        text = f"Offer: {offer['name']}. Segments: {', '.join(offer['segments'])}. Reasons: {', '.join(offer['reasons'])}. Details: {offer['details']}"
-        items.append(CorpusItem(id=offer["id"], text=text, payload={"type": "offer", **offer}))
-    for doc in knowledge:
-        text = f"{doc['title']}: {doc['content']}"
-        items.append(CorpusItem(id=doc["id"], text=text, payload={"type": "knowledge", **doc}))
+    items: List[CorpusItem] = [offer_corpus_item(offer) for offer in offers]
+    items.extend(knowledge_corpus_item(doc) for doc in knowledge)
     return SemanticIndex(items)
 
 
-def semantic_retrieve(index: SemanticIndex, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-    results = index.search(query, top_k=top_k)
+def semantic_retrieve(
+    index: SemanticIndex, query: str, top_k: int = 3, where: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    results = index.search(query, top_k=top_k, where=where)
     return [
         {
             "score": score,
@@ -37,3 +105,12 @@ def semantic_retrieve(index: SemanticIndex, query: str, top_k: int = 3) -> List[
         }
         for item, score in results
     ]
+
+
+def semantic_retrieve_many(
+    index: SemanticIndex, queries: List[str], top_k: int = 3, where: Optional[Dict[str, Any]] = None
+) -> List[List[Dict[str, Any]]]:
+    return [
+        [{"score": score, **item.payload} for item, score in results]
+        for results in index.search_many(queries, top_k=top_k, where=where)
+    ]
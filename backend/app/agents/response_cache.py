@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.cache import TTLCache
+from app.core.config import (
+    OLLAMA_CHAT_MODEL,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_SHARED,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+from app.data.snapshot import DataSnapshot
+from app.db import get_cached_response, purge_response_cache, put_cached_response
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, np.generic):
+        return _normalize(value.item())
+    if isinstance(value, float):
+        value = round(value, 6)
+        return int(value) if value.is_integer() else value
+    return value
+
+
+def payload_key(payload: Dict[str, Any], *parts: Any) -> str:
+    """Hash of the payload plus `parts`, ignoring key order, runs of whitespace, float noise and 1 vs 1.0."""
+    text = json.dumps([_normalize(payload), *parts], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def data_generation(snapshot: DataSnapshot) -> str:
+    """Identifies the customer and offer data behind a snapshot, the same way in every worker.
+
+    Customers are identified by their files' size and mtime. Offers are hashed by content, so an in-memory
+    corpus update counts as a change too.
+    """
+    offers = json.dumps(snapshot.offers, sort_keys=True, default=str)
+    text = json.dumps([snapshot.files.get("customers"), snapshot.files.get("features"), offers])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class ResponseCache:
+    """Generated responses keyed by (data generation, payload key).
+
+    An in-process LRU with TTL, optionally backed by the `response_cache` table so workers share hits.
+    The generation changes with the customer or offer data. When a newer snapshot shows up, the in-process
+    entries are dropped, and the first shared lookup deletes other generations' rows. Requests still pinned
+    to an older snapshot neither read nor write the cache.
+    """
+
+    def __init__(self, enabled: bool, ttl_seconds: float, max_entries: int, shared: bool):
+        self.enabled = enabled
+        self.shared = shared
+        self.ttl_seconds = ttl_seconds
+        self._memory = TTLCache(ttl_seconds, max_entries)
+        self._lock = threading.Lock()
+        self._version = 0
+        self._generation: Optional[Tuple[int, str]] = None
+        self._purge: Optional[str] = None
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def _current(self, snapshot: DataSnapshot) -> Optional[str]:
+        """The snapshot's generation, or None when it is older than one already seen."""
+        with self._lock:
+            if snapshot.version < self._version:
+                return None
+            if self._generation is not None and self._generation[0] == snapshot.version:
+                return self._generation[1]
+        generation = data_generation(snapshot)
+        with self._lock:
+            if snapshot.version < self._version:
+                return None
+            changed = self._generation is not None and self._generation[1] != generation
+            self._version = snapshot.version
+            self._generation = (snapshot.version, generation)
+            if changed:
+                self.invalidations += 1
+                self._purge = generation
+        if changed:
+            self._memory.clear()
+            logger.info("response cache invalidated by data snapshot %s", snapshot.version)
+        return generation
+
+    def _count(self, hit: Optional[str], counter: str = "hits") -> None:
+        with self._lock:
+            if hit is None:
+                self.misses += 1
+            else:
+                setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, snapshot: DataSnapshot, key: str) -> Optional[str]:
+        """In-process lookup only; cheap enough for the event loop."""
+        generation = self._current(snapshot) if self.enabled else None
+        if generation is None:
+            return None
+        hit = self._memory.get((generation, key))
+        if hit is not None or not self.shared:
+            self._count(hit)
+        return hit
+
+    def fetch(self, snapshot: DataSnapshot, key: str) -> Optional[str]:
+        """Shared-tier lookup after a local miss (blocking); a hit is copied into memory for its remaining TTL."""
+        generation = self._current(snapshot) if self.enabled and self.shared else None
+        if generation is None:
+            return None
+        try:
+            self._purge_stale(generation)
+            row = get_cached_response(generation, key)
+        except Exception:
+            logger.warning("response cache: shared lookup failed", exc_info=True)
+            with self._lock:
+                self.errors += 1
+            row = None
+        hit = row["response"] if row else None
+        self._count(hit, "shared_hits")
+        if hit is not None:
+            self._memory.set((generation, key), hit, ttl_seconds=float(row["ttl_seconds"]))
+        return hit
+
+    def _purge_stale(self, generation: str) -> None:
+        with self._lock:
+            pending, self._purge = self._purge, None
+        if pending == generation:
+            deleted = purge_response_cache(generation)
+            logger.info("response cache: removed %d shared entries of older data", deleted)
+
+    def put(self, snapshot: DataSnapshot, key: str, response: str) -> None:
+        generation = self._current(snapshot) if self.enabled else None
+        if generation is not None:
+            self._memory.set((generation, key), response)
+
+    def share(self, snapshot: DataSnapshot, key: str, response: str) -> None:
+        """Write to the shared tier (blocking); failures only cost future hits."""
+        generation = self._current(snapshot) if self.enabled and self.shared else None
+        if generation is None:
+            return
+        try:
+            put_cached_response(generation, key, OLLAMA_CHAT_MODEL, response, self.ttl_seconds)
+        except Exception:
+            logger.warning("response cache: shared write failed", exc_info=True)
+            with self._lock:
+                self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "shared": self.shared,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "memory_entries": self._memory.stats()["size"],
+            "generation": self._generation[1] if self._generation else None,
+        }
+
+
+RESPONSE_CACHE = ResponseCache(
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_SHARED
+)
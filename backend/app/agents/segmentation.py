@@ -1,10 +1,40 @@
-from typing import Any, Dict
+import json
+import math
+from json.encoder import encode_basestring_ascii as _json_string
+from typing import Any, Dict, Iterator, Optional
 
+import numpy as np
 
-def segment_customer(customer: Dict[str, Any]) -> Dict[str, Any]:
-    balance = float(customer.get("avg_balance", 0))
-    tenure = int(customer.get("tenure_months", 0))
-    complaints = int(customer.get("complaints_90d", 0))
+from app.data.store import CustomerStore
+
+# Rule outcomes in precedence order; `segment_codes` returns indexes into this tuple.
+SEGMENTS = ("High-Net-Worth", "New-to-Bank", "Service-Recovery", "Mass Affluent")
+_SEGMENT_JSON = tuple(_json_string(segment) for segment in SEGMENTS)
+BOOK_CHUNK_ROWS = 50_000
+# Upper bound for a caller-chosen chunk size; one chunk's lines are built as a single string.
+BOOK_MAX_CHUNK_ROWS = 500_000
+
+
+def _signal(value: Any) -> float:
+    """A numeric signal; missing or NaN counts as 0, as in the churn model."""
+    value = float(value) if value is not None else 0.0
+    return 0.0 if math.isnan(value) else value
+
+
+def _signal_column(values: Any) -> np.ndarray:
+    """`_signal` over a whole column."""
+    column = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(column), 0.0, column)
+
+
+def segment_customer(customer: Dict[str, Any], features: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Rule-based segment; transaction `features`, when known, are passed through as signals only.
+
+    A missing or NaN signal counts as 0.
+    """
+    balance = _signal(customer.get("avg_balance"))
+    tenure = int(_signal(customer.get("tenure_months")))
+    complaints = int(_signal(customer.get("complaints_90d")))
 
     if balance >= 100000:
         segment = "High-Net-Worth"
@@ -15,11 +45,74 @@ def segment_customer(customer: Dict[str, Any]) -> Dict[str, Any]:
     else:
         segment = "Mass Affluent"
 
+    signals: Dict[str, Any] = {
+        "avg_balance": balance,
+        "tenure_months": tenure,
+        "complaints_90d": complaints,
+    }
+    if features is not None:
+        signals["transactions"] = features
     return {
         "segment": segment,
-        "signals": {
+        "signals": signals,
+    }
+
+
+def segment_codes(avg_balance: Any, tenure_months: Any, complaints_90d: Any) -> np.ndarray:
+    """`segment_customer` over whole columns: the index into `SEGMENTS` for every row.
+
+    Inputs are cast the way `segment_customer` casts them (NaN to 0, balance to float, tenure and complaints
+    truncated to int), and the first matching rule wins, exactly like its if/elif chain.
+    """
+    balance = _signal_column(avg_balance)
+    tenure = _signal_column(tenure_months).astype(np.int64)
+    complaints = _signal_column(complaints_90d).astype(np.int64)
+    return np.select([balance >= 100000, tenure < 12, complaints >= 2], [0, 1, 2], default=3).astype(np.int8)
+
+
+def segment_book(customers: CustomerStore, chunk_rows: int = BOOK_CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """Segment every customer in file order, `chunk_rows` (clamped to 1..`BOOK_MAX_CHUNK_ROWS`) at a time.
+
+    Yields `{"start", "customer_id", "codes", "avg_balance", "tenure_months", "complaints_90d"}` per chunk,
+    with the signals cast as in `segment_customer`; only one chunk is materialised at a time.
+    """
+    chunk_rows = min(max(1, chunk_rows), BOOK_MAX_CHUNK_ROWS)
+    for start in range(0, len(customers), chunk_rows):
+        stop = min(start + chunk_rows, len(customers))
+        balance = _signal_column(customers.values("avg_balance", start, stop))
+        tenure = _signal_column(customers.values("tenure_months", start, stop)).astype(np.int64)
+        complaints = _signal_column(customers.values("complaints_90d", start, stop)).astype(np.int64)
+        yield {
+            "start": start,
+            "customer_id": customers.values("customer_id", start, stop),
+            "codes": segment_codes(balance, tenure, complaints),
             "avg_balance": balance,
             "tenure_months": tenure,
             "complaints_90d": complaints,
-        },
-    }
+        }
+
+
+def segment_book_ndjson(
+    customers: CustomerStore, counts: Dict[str, int], chunk_rows: int = BOOK_CHUNK_ROWS
+) -> Iterator[str]:
+    """One NDJSON line per customer, shaped like `segment_customer` plus `customer_id`; one string per chunk.
+
+    Lines are formatted directly (byte-identical to `json.dumps` of the same dict) rather than dumped per row,
+    which dominated the cost of streaming a large book. Per-segment totals are accumulated into `counts` as
+    chunks are produced.
+    """
+    for chunk in segment_book(customers, chunk_rows):
+        codes = chunk["codes"]
+        for code, total in enumerate(np.bincount(codes, minlength=len(SEGMENTS)).tolist()):
+            counts[SEGMENTS[code]] = counts.get(SEGMENTS[code], 0) + total
+        ids = map(_json_string, chunk["customer_id"])
+        balances = chunk["avg_balance"]
+        # float repr is what json.dumps writes for finite floats; NaN/inf fall back to json's own spelling.
+        balance_text = map(float.__repr__ if np.isfinite(balances).all() else json.dumps, balances.tolist())
+        yield "".join(
+            f'{{"customer_id": {customer_id}, "segment": {_SEGMENT_JSON[code]}, "signals": '
+            f'{{"avg_balance": {balance}, "tenure_months": {tenure}, "complaints_90d": {complaints}}}}}\n'
+            for customer_id, code, balance, tenure, complaints in zip(
+                ids, codes.tolist(), balance_text, chunk["tenure_months"].tolist(), chunk["complaints_90d"].tolist()
+            )
+        )
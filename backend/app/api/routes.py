@@ -1,13 +1,45 @@
-from typing import Optional
-
-from fastapi import APIRouter, HTTPException
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-
-from app.core.config import SLA_COMPLIANCE, SLA_COMPLETENESS
-from app.db import add_audit_event, add_event, add_message, create_conversation, list_judge_runs, list_metrics
-from app.graph import build_graph
-from app.guards.guardrails import run_guardrails
+from pydantic import BaseModel, ValidationError
+
+from app.agents.attrition import rank_at_risk
+from app.agents.campaign import CampaignRun, campaign_progress
+from app.agents.response_cache import RESPONSE_CACHE
+from app.agents.segmentation import BOOK_CHUNK_ROWS, BOOK_MAX_CHUNK_ROWS, segment_book_ndjson
+from app.core.concurrency import run_sync
+from app.core.config import (
+    CAMPAIGN_LEASE_SECONDS,
+    CAMPAIGN_MAX_CUSTOMERS,
+    CHURN_SCORING_ENABLED,
+    GUARD_BULK_MAX_BODY_BYTES,
+    GUARD_BULK_MAX_ITEMS,
+    SLA_COMPLIANCE,
+    SLA_COMPLETENESS,
+)
+from app.data.snapshot import SNAPSHOTS
+from app.db import (
+    claim_campaign_job,
+    create_campaign_job,
+    get_campaign_job,
+    list_campaign_results,
+    list_judge_runs,
+    list_metrics,
+    pool_stats,
+    unit_of_work,
+    write_behind_stats,
+)
+from app.evaluations.batch import eval_batch_progress, run_eval_backfill
+from app.evaluations.judge_cache import judge_cache_stats
+from app.graph import RETENTION_GRAPH, apply_corpus_update, graph_config
+from app.guards.bulk import BulkScreening
+from app.guards.guardrails import arun_guardrails, verdict_cache_stats
 from app.telemetry.langfuse_client import start_trace
 
 router = APIRouter()
@@ -21,47 +53,89 @@ class ChatRequest(BaseModel):
     approve_email_content: Optional[str] = None
 
 
-class ChatResponse(BaseModel):
-    conversation_id: str
-    response: str
-    blocked: bool
-    guardrail_findings: dict
+class CorpusUpdateRequest(BaseModel):
+    offers: List[Dict[str, Any]] = []
+    knowledge: List[Dict[str, Any]] = []
+    delete_ids: List[str] = []
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    guardrail = run_guardrails(req.message)
-    conversation_id = req.conversation_id or create_conversation(req.customer_id)
+class DataReloadRequest(BaseModel):
+    force: bool = False
 
-    if guardrail.redactions:
-        add_audit_event(
-            conversation_id,
-            "pii_redaction",
-            {"redactions": guardrail.redactions, "original_length": len(req.message)},
-        )
 
-    if guardrail.blocked:
-        add_event(conversation_id, "guardrail_block", {"findings": guardrail.findings})
-        raise HTTPException(status_code=400, detail={"blocked": True, "findings": guardrail.findings})
+class ChurnRescoreRequest(BaseModel):
+    customer_ids: Optional[List[str]] = None
 
-    add_message(conversation_id, "user", guardrail.redacted_text, {"customer_id": req.customer_id})
 
-    trace = start_trace("retention_chat", {"message": guardrail.redacted_text, "customer_id": req.customer_id})
+class EvalBackfillRequest(BaseModel):
+    start: datetime
+    end: datetime
+    rescore: bool = False
+    budget: Optional[int] = None
 
-    state = {
-        "user_input": guardrail.redacted_text,
-        "customer_id": req.customer_id,
-        "approve_email": bool(req.approve_email),
-        "approve_email_content": req.approve_email_content,
-    }
-    graph = build_graph(trace_id=conversation_id)
-    result = graph.invoke(state)
-    response_text = result.get("response_text", "")
 
-    if trace:
-        trace.update(output={"response": response_text})
+class ScreenItem(BaseModel):
+    id: Optional[str] = None
+    text: str
 
-    add_message(conversation_id, "assistant", response_text, {"customer_id": req.customer_id})
+
+class BulkScreenRequest(BaseModel):
+    texts: List[str] = []
+    items: List[ScreenItem] = []
+
+
+class CampaignRequest(BaseModel):
+    top_n: int = 5000
+    segment: Optional[str] = None
+    product: Optional[str] = None
+    reason: Optional[str] = None
+
+
+class ChatResponse(BaseModel):
+    conversation_id: str
+    response: str
+    blocked: bool
+    guardrail_findings: dict
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    guardrail = await arun_guardrails(req.message)
+    # All of the request's rows are persisted together at the end, including on a guardrail block.
+    uow = unit_of_work()
+    try:
+        conversation_id = req.conversation_id or uow.create_conversation(req.customer_id)
+
+        if guardrail.redactions:
+            uow.add_audit_event(
+                conversation_id,
+                "pii_redaction",
+                {"redactions": guardrail.redactions, "original_length": len(req.message)},
+            )
+
+        if guardrail.blocked:
+            uow.add_event(conversation_id, "guardrail_block", {"findings": guardrail.findings})
+            raise HTTPException(status_code=400, detail={"blocked": True, "findings": guardrail.findings})
+
+        uow.add_message(conversation_id, "user", guardrail.redacted_text, {"customer_id": req.customer_id})
+
+        trace = start_trace("retention_chat", {"message": guardrail.redacted_text, "customer_id": req.customer_id})
+
+        state = {
+            "user_input": guardrail.redacted_text,
+            "customer_id": req.customer_id,
+            "approve_email": bool(req.approve_email),
+            "approve_email_content": req.approve_email_content,
+        }
+        result = await RETENTION_GRAPH.ainvoke(state, config=graph_config(trace_id=conversation_id))
+        response_text = result.get("response_text", "")
+
+        if trace:
+            trace.update(output={"response": response_text})
+
+        uow.add_message(conversation_id, "assistant", response_text, {"customer_id": req.customer_id})
+    finally:
+        await run_sync(uow.commit)
 
     return ChatResponse(
         conversation_id=conversation_id,
@@ -71,23 +145,43 @@ async def chat(req: ChatRequest):
     )
 
 
+NODE_PROGRESS = {
+    "attrition_node": "attrition",
+    "segmentation_node": "segmentation",
+    "rag_node": "retrieval",
+    "communication_node": "communication",
+}
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def _sse_chunks(text: str, chunk_size: int = 32) -> Iterator[str]:
+    for i in range(0, len(text), chunk_size):
+        yield _sse("chunk", text[i : i + chunk_size].replace("\n", "\\n"))
+
+
 @router.post("/chat/stream")
 async def chat_stream(req: ChatRequest):
-    guardrail = run_guardrails(req.message)
-    conversation_id = req.conversation_id or create_conversation(req.customer_id)
+    guardrail = await arun_guardrails(req.message)
+    # One unit of work spans the whole stream; it is committed when the stream finishes (or the client goes away).
+    uow = unit_of_work()
+    conversation_id = req.conversation_id or uow.create_conversation(req.customer_id)
 
     if guardrail.redactions:
-        add_audit_event(
+        uow.add_audit_event(
             conversation_id,
             "pii_redaction",
             {"redactions": guardrail.redactions, "original_length": len(req.message)},
         )
 
     if guardrail.blocked:
-        add_event(conversation_id, "guardrail_block", {"findings": guardrail.findings})
+        uow.add_event(conversation_id, "guardrail_block", {"findings": guardrail.findings})
+        await run_sync(uow.commit)
         raise HTTPException(status_code=400, detail={"blocked": True, "findings": guardrail.findings})
 
-    add_message(conversation_id, "user", guardrail.redacted_text, {"customer_id": req.customer_id})
+    uow.add_message(conversation_id, "user", guardrail.redacted_text, {"customer_id": req.customer_id})
 
     trace = start_trace("retention_chat", {"message": guardrail.redacted_text, "customer_id": req.customer_id})
 
@@ -97,37 +191,281 @@ async def chat_stream(req: ChatRequest):
         "approve_email": bool(req.approve_email),
         "approve_email_content": req.approve_email_content,
     }
-    graph = build_graph(trace_id=conversation_id)
-    result = graph.invoke(state)
-    response_text = result.get("response_text", "")
-
-    if trace:
-        trace.update(output={"response": response_text})
-
-    add_message(conversation_id, "assistant", response_text, {"customer_id": req.customer_id})
 
-    def sse():
-        yield f"event: meta\ndata: {conversation_id}\n\n"
-        chunk_size = 32
-        for i in range(0, len(response_text), chunk_size):
-            chunk = response_text[i : i + chunk_size].replace("\n", "\\n")
-            yield f"event: chunk\ndata: {chunk}\n\n"
-        yield "event: done\ndata: end\n\n"
+    async def sse() -> AsyncIterator[str]:
+        try:
+            yield _sse("meta", conversation_id)
+            streamed = ""
+            response_text = ""
+            async for mode, chunk in RETENTION_GRAPH.astream(
+                state, config=graph_config(trace_id=conversation_id), stream_mode=["updates", "custom"]
+            ):
+                if mode == "custom":
+                    token = chunk.get("token", "")
+                    streamed += token
+                    yield _sse("chunk", token.replace("\n", "\\n"))
+                    continue
+                for node, update in chunk.items():
+                    if update and "response_text" in update:
+                        response_text = update["response_text"]
+                    yield _sse("progress", json.dumps({"node": NODE_PROGRESS.get(node, node), "status": "done"}))
+
+            # Ranked tables and approvals never touch the LLM, and the node may append to the streamed draft;
+            # send whatever part of the final text the client has not seen yet. When the final text no longer
+            # extends the streamed tokens (a fallback, a rewritten draft), replace the client's copy outright.
+            if response_text.startswith(streamed):
+                for frame in _sse_chunks(response_text[len(streamed) :]):
+                    yield frame
+            else:
+                yield _sse("replace", response_text.replace("\n", "\\n"))
+
+            if trace:
+                trace.update(output={"response": response_text})
+
+            uow.add_message(conversation_id, "assistant", response_text, {"customer_id": req.customer_id})
+            yield _sse("done", "end")
+        finally:
+            # Runs on client disconnect too; keep the conversation and messages gathered so far.
+            with anyio.CancelScope(shield=True):
+                await run_sync(uow.commit)
 
     return StreamingResponse(sse(), media_type="text/event-stream")
 
 
 @router.get("/metrics")
 async def metrics(limit: int = 24):
+    semantic_index = SNAPSHOTS.current.semantic_index
     return {
-        "metrics": list(list_metrics(limit)),
+        "metrics": list(await run_sync(list_metrics, limit)),
         "sla": {
             "compliance": SLA_COMPLIANCE,
             "completeness": SLA_COMPLETENESS,
         },
+        "db_pool": pool_stats(),
+        "write_behind": write_behind_stats(),
+        "embedding_cache": semantic_index.cache_stats(),
+        "semantic_backend": semantic_index.backend_name(),
+        "guardrail_verdict_cache": verdict_cache_stats(),
+        "eval_batch": eval_batch_progress(),
+        "judge_cache": judge_cache_stats(),
+        "response_cache": RESPONSE_CACHE.stats(),
+        "data_snapshot": SNAPSHOTS.stats(),
     }
 
 
 @router.get("/judge-runs")
 async def judge_runs(limit: int = 50):
-    return {"runs": list(list_judge_runs(limit))}
+    return {"runs": list(await run_sync(list_judge_runs, limit))}
+
+
+@router.post("/admin/corpus")
+async def update_corpus(req: CorpusUpdateRequest):
+    try:
+        return await run_sync(apply_corpus_update, req.offers, req.knowledge, req.delete_ids)
+    except KeyError as exc:
+        raise HTTPException(status_code=422, detail={"missing_field": str(exc)})
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail={"invalid_value": str(exc)})
+
+
+@router.post("/admin/data/reload")
+async def reload_data(req: Optional[DataReloadRequest] = None):
+    """Swap in a new data snapshot if files under backend/data changed (all of them with `force`)."""
+    return await run_sync(SNAPSHOTS.refresh, bool(req and req.force))
+
+
+@router.post("/admin/churn/rescore")
+async def rescore_churn(req: Optional[ChurnRescoreRequest] = None):
+    """Recompute churn scores for `customer_ids` (e.g. after their records changed), or the whole book."""
+    if not CHURN_SCORING_ENABLED:
+        raise HTTPException(status_code=409, detail="churn scoring is disabled; scores come from customers.csv")
+    return await run_sync(SNAPSHOTS.rescore, req.customer_ids if req else None)
+
+
+@router.post("/admin/eval/backfill")
+async def eval_backfill(req: EvalBackfillRequest):
+    """One budgeted scoring pass over [start, end); repeat (without `rescore`) until `pending` is 0."""
+    result = await run_sync(run_eval_backfill, req.start, req.end, req.rescore, req.budget)
+    if result.get("skipped"):
+        raise HTTPException(status_code=409, detail="an evaluation run is already in progress")
+    return result
+
+
+async def _read_body(request: Request) -> bytes:
+    """The request body, refused with 413 as soon as it exceeds `GUARD_BULK_MAX_BODY_BYTES`."""
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > GUARD_BULK_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail=f"body exceeds {GUARD_BULK_MAX_BODY_BYTES} bytes")
+    chunks: List[bytes] = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > GUARD_BULK_MAX_BODY_BYTES:
+            raise HTTPException(status_code=413, detail=f"body exceeds {GUARD_BULK_MAX_BODY_BYTES} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _check_item_count(count: int) -> None:
+    if count > GUARD_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"more than {GUARD_BULK_MAX_ITEMS} items")
+
+
+def _parse_ndjson(body: bytes) -> List[Tuple[Any, str]]:
+    """One item per non-blank line; each line is a JSON string or an object with `text` (and `id`)."""
+    items: List[Tuple[Any, str]] = []
+    for line_no, line in enumerate(body.split(b"\n"), start=1):
+        if line.strip():
+            items.append(_ndjson_item(line, line_no))
+            _check_item_count(len(items))
+    return items
+
+
+def _ndjson_item(line: bytes, line_no: int) -> Tuple[Any, str]:
+    try:
+        value = json.loads(line)
+        if isinstance(value, str):
+            return None, value
+        item = ScreenItem(**value)
+    except (TypeError, ValueError, ValidationError) as exc:
+        raise ValueError(f"line {line_no}: {exc}") from exc
+    return item.id, item.text
+
+
+async def _iterate(items: List[Tuple[Any, str]]) -> AsyncIterator[Tuple[Any, str]]:
+    for item in items:
+        yield item
+
+
+@router.post("/guardrails/screen")
+async def screen_texts(request: Request):
+    """Screen many texts with the chat guardrail policy.
+
+    Accepts `{"texts": [...]}` / `{"items": [{"id", "text"}]}` as JSON, or an `application/x-ndjson` body with one
+    text per line, up to `GUARD_BULK_MAX_BODY_BYTES` and `GUARD_BULK_MAX_ITEMS`. Streams one NDJSON result per input
+    followed by a `{"summary": ...}` line; the aggregate redaction counts are written to `audit_trail`.
+    """
+    # The body is parsed before the response starts: on ASGI servers older than spec 2.4 a streaming response
+    # listens for disconnects on the same receive channel, so it can't be read while results stream out.
+    # Hence the caps on body size and item count (413 beyond them).
+    body = await _read_body(request)
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = _parse_ndjson(body)
+        else:
+            req = BulkScreenRequest(**json.loads(body))
+            _check_item_count(len(req.texts) + len(req.items))
+            items = [(None, text) for text in req.texts] + [(item.id, item.text) for item in req.items]
+    except (TypeError, ValueError, ValidationError) as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+    screening = BulkScreening()
+
+    async def ndjson() -> AsyncIterator[str]:
+        try:
+            async for row in screening.run(_iterate(items)):
+                yield json.dumps(row) + "\n"
+            yield json.dumps({"summary": screening.summary}) + "\n"
+        finally:
+            if screening.summary["items"]:
+                uow = unit_of_work()
+                uow.add_audit_event(None, "bulk_pii_redaction", screening.summary)
+                # A client disconnect cancels this generator; the audit row must still be written.
+                with anyio.CancelScope(shield=True):
+                    await run_sync(uow.commit)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.get("/segments")
+def segment_book(chunk_rows: int = BOOK_CHUNK_ROWS):
+    """Rule-based segment for every customer in the active snapshot, streamed as NDJSON in file order.
+
+    Each line matches `segment_customer`'s output plus `customer_id`; a final `{"summary": ...}` line carries the
+    per-segment counts and the snapshot version the results came from. `chunk_rows` is clamped to
+    1..`BOOK_MAX_CHUNK_ROWS`.
+    """
+    snapshot = SNAPSHOTS.current
+    counts: Dict[str, int] = {}
+    chunk_rows = min(max(1, chunk_rows), BOOK_MAX_CHUNK_ROWS)
+
+    def ndjson() -> Iterator[str]:
+        started = time.perf_counter()
+        yield from segment_book_ndjson(snapshot.customers, counts, chunk_rows)
+        summary = {
+            "customers": len(snapshot.customers),
+            "segments": counts,
+            "snapshot_version": snapshot.version,
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+        }
+        yield json.dumps({"summary": summary}) + "\n"
+
+    # A sync iterator: Starlette pulls each chunk on its thread pool, off the event loop.
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+def _campaign_stream(run: CampaignRun) -> StreamingResponse:
+    async def ndjson() -> AsyncIterator[str]:
+        yield json.dumps({"job": {"id": run.job_id, "total": run.summary["total"], "pending": len(run.pending)}}) + "\n"
+        async for row in run.run():
+            yield json.dumps(row, default=str) + "\n"
+        yield json.dumps({"summary": run.summary}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers={"X-Campaign-Job-Id": run.job_id})
+
+
+@router.post("/campaigns")
+async def start_campaign(req: CampaignRequest):
+    """Retention packages for the top-N at-risk customers, streamed as NDJSON as each customer finishes.
+
+    The first line carries the job id, then one line per customer (`response`, or `error`), then a summary.
+    Results are stored as they finish; `POST /campaigns/{id}/resume` continues an interrupted or partial job.
+    """
+    if not 0 < req.top_n <= CAMPAIGN_MAX_CUSTOMERS:
+        raise HTTPException(status_code=422, detail=f"top_n must be between 1 and {CAMPAIGN_MAX_CUSTOMERS}")
+    snapshot = SNAPSHOTS.current
+    ranked = rank_at_risk(snapshot.customers, req.top_n, req.segment, req.product, req.reason)
+    customer_ids = [row["customer_id"] for row in ranked]
+    job = await run_sync(create_campaign_job, req.model_dump(), customer_ids, snapshot.version)
+    run = CampaignRun(str(job["id"]), str(job["lease_token"]), job["total"], snapshot, list(enumerate(customer_ids)))
+    return _campaign_stream(run)
+
+
+@router.post("/campaigns/{job_id}/resume")
+async def resume_campaign(job_id: uuid.UUID):
+    """Continue a campaign with the customers that have no stored result yet (same ranking as the original run)."""
+    job = await run_sync(claim_campaign_job, str(job_id), CAMPAIGN_LEASE_SECONDS)
+    if job is None:
+        existing = await run_sync(get_campaign_job, str(job_id))
+        if existing is None:
+            raise HTTPException(status_code=404, detail="campaign not found")
+        raise HTTPException(status_code=409, detail=f"campaign is {existing['status']}")
+    run = CampaignRun(str(job["id"]), str(job["lease_token"]), job["total"], SNAPSHOTS.current, job["pending"])
+    return _campaign_stream(run)
+
+
+@router.get("/campaigns/{job_id}")
+async def campaign_status(job_id: uuid.UUID):
+    """Stored progress of a campaign, plus live counters while it runs in this process."""
+    job = await run_sync(get_campaign_job, str(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="campaign not found")
+    return {**job, "live": campaign_progress(str(job_id))}
+
+
+@router.get("/campaigns/{job_id}/results")
+async def campaign_results(job_id: uuid.UUID):
+    """Every stored result of a campaign in ranking order, as NDJSON."""
+    if await run_sync(get_campaign_job, str(job_id)) is None:
+        raise HTTPException(status_code=404, detail="campaign not found")
+
+    async def ndjson() -> AsyncIterator[str]:
+        after = -1
+        while True:
+            rows = await run_sync(list_campaign_results, str(job_id), after)
+            if not rows:
+                return
+            after = rows[-1]["position"]
+            yield "".join(json.dumps({"index": row.pop("position"), **row}, default=str) + "\n" for row in rows)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
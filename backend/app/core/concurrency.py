@@ -0,0 +1,26 @@
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from anyio import CapacityLimiter, to_thread
+
+from app.core.config import SYNC_OFFLOAD_LIMIT
+
+T = TypeVar("T")
+
+_limiter: Optional[CapacityLimiter] = None
+
+
+def _get_limiter() -> CapacityLimiter:
+    # Created on first use: anyio binds the limiter to the running event loop's backend.
+    global _limiter
+    if _limiter is None:
+        _limiter = CapacityLimiter(SYNC_OFFLOAD_LIMIT)
+    return _limiter
+
+
+async def run_sync(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run blocking work (psycopg, pandas, Ollama embeddings) in a worker thread without stalling the event loop.
+
+    Offloads share one bounded limiter so a burst of requests queues here instead of exhausting the DB pool.
+    """
+    return await to_thread.run_sync(partial(fn, *args, **kwargs), limiter=_get_limiter())
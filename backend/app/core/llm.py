@@ -1,7 +1,7 @@
 from langchain_ollama import ChatOllama
 
-from app.core.config import OLLAMA_BASE_URL, OLLAMA_CHAT_MODEL
+from app.core.config import OLLAMA_BASE_URL, OLLAMA_CHAT_MODEL, OLLAMA_CHAT_TEMPERATURE
 
 
 def get_chat_llm():
-    return ChatOllama(model=OLLAMA_CHAT_MODEL, base_url=OLLAMA_BASE_URL, temperature=0.2)
+    return ChatOllama(model=OLLAMA_CHAT_MODEL, base_url=OLLAMA_BASE_URL, temperature=OLLAMA_CHAT_TEMPERATURE)
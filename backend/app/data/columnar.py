@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Bump when the on-disk layout changes so existing caches are rebuilt rather than misread.
+FORMAT_VERSION = 1
+
+
+def id_hash(value: str) -> int:
+    """Stable 64-bit hash of an id; unlike hash(), identical in every process."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def build_id_index(ids: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(sorted id hashes, row of each hash): a lookup is a binary search plus one string compare."""
+    hashes = np.fromiter((id_hash(value) for value in ids), dtype=np.uint64)
+    rows = np.argsort(hashes, kind="stable")
+    return hashes[rows], rows
+
+
+class StringColumn:
+    """Variable-length UTF-8 strings stored Arrow-style: one byte buffer plus n+1 offsets."""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i] : self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        """Strings `start:stop`, decoded from one contiguous read of the byte buffer."""
+        offsets = self.offsets[start : stop + 1].tolist()
+        raw = self.data[offsets[0] : offsets[-1]].tobytes()
+        base = offsets[0]
+        return [raw[a - base : b - base].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+
+
+def encode_strings(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [("" if pd.isna(v) else str(v)).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def source_fingerprint(path: Path) -> str:
+    stat = path.stat()
+    key = f"{FORMAT_VERSION}:{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def write_columnar(
+    frame: pd.DataFrame, directory: Path, category_columns: Iterable[str], id_column: str, order_column: str
+) -> None:
+    """Write `frame` as one .npy per column plus the id index and descending `order_column` ranking."""
+    directory.mkdir(parents=True, exist_ok=True)
+    category_columns = set(category_columns)
+    manifest = {"format": FORMAT_VERSION, "rows": len(frame), "columns": []}
+    for name in frame.columns:
+        series = frame[name]
+        if name in category_columns:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            np.save(directory / f"{name}.npy", codes.astype(np.int32))
+            (directory / f"{name}.categories.json").write_text(json.dumps([str(u) for u in uniques]))
+            kind = "category"
+        elif series.dtype == object:
+            offsets, data = encode_strings(series)
+            np.save(directory / f"{name}.offsets.npy", offsets)
+            np.save(directory / f"{name}.data.npy", data)
+            kind = "string"
+        else:
+            np.save(directory / f"{name}.npy", series.to_numpy())
+            kind = "numeric"
+        manifest["columns"].append({"name": name, "kind": kind})
+    hashes, rows = build_id_index(frame[id_column].astype(str))
+    np.save(directory / "id_hashes.npy", hashes)
+    np.save(directory / "id_rows.npy", rows)
+    np.save(directory / "risk_order.npy", np.argsort(-frame[order_column].to_numpy(), kind="stable"))
+    # Written last: a directory without a manifest is an interrupted build.
+    (directory / "manifest.json").write_text(json.dumps(manifest))
+
+
+def read_columnar(directory: Path) -> Dict[str, object]:
+    """Memory-map a directory written by `write_columnar`; nothing is copied into process memory."""
+    manifest = json.loads((directory / "manifest.json").read_text())
+    columns: Dict[str, object] = {}
+    categories: Dict[str, np.ndarray] = {}
+    for column in manifest["columns"]:
+        name = column["name"]
+        if column["kind"] == "string":
+            columns[name] = StringColumn(
+                np.load(directory / f"{name}.offsets.npy", mmap_mode="r"),
+                np.load(directory / f"{name}.data.npy", mmap_mode="r"),
+            )
+        else:
+            columns[name] = np.load(directory / f"{name}.npy", mmap_mode="r")
+            if column["kind"] == "category":
+                categories[name] = np.asarray(json.loads((directory / f"{name}.categories.json").read_text()), dtype=object)
+    return {
+        "columns": columns,
+        "categories": categories,
+        "id_hashes": np.load(directory / "id_hashes.npy", mmap_mode="r"),
+        "id_rows": np.load(directory / "id_rows.npy", mmap_mode="r"),
+        "risk_order": np.load(directory / "risk_order.npy", mmap_mode="r"),
+    }
+
+
+@contextmanager
+def file_lock(path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def ensure_columnar(csv_path: Path, cache_root: Path, **layout) -> Path:
+    """Return the column directory for the current `csv_path`, converting it first if needed.
+
+    Directories are named by a fingerprint of the CSV (path, size, mtime), so an edited CSV gets a fresh
+    build. Workers starting together serialise on a lock file; the first converts, the rest map its output.
+    Older builds are removed once the new one is in place.
+    """
+    target = cache_root / source_fingerprint(csv_path)
+    if (target / "manifest.json").exists():
+        return target
+    with file_lock(cache_root / ".lock"):
+        if not (target / "manifest.json").exists():
+            staging = cache_root / f".{target.name}.{os.getpid()}.tmp"
+            shutil.rmtree(staging, ignore_errors=True)
+            write_columnar(pd.read_csv(csv_path), staging, **layout)
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(staging, target)
+        for stale in cache_root.iterdir():
+            # Processes that still map an old build keep their pages until they reload; unlinking is safe.
+            if stale.is_dir() and stale.name != target.name and not stale.name.startswith("."):
+                shutil.rmtree(stale, ignore_errors=True)
+    return target
@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import os
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import TRANSACTION_CHUNK_ROWS, TRANSACTION_FEATURES_DIR
+from app.data.columnar import StringColumn, encode_strings, file_lock
+
+logger = logging.getLogger(__name__)
+
+# Bump when the saved state layout changes; an old state is then rebuilt from the start of the feed.
+STATE_VERSION = 1
+WINDOW_DAYS = 30
+# Daily buckets older than this (relative to the newest transaction) can't affect any window and are dropped.
+HORIZON_DAYS = 2 * WINDOW_DAYS
+# The high-water mark also records a hash of the feed's first bytes, to notice a replaced file.
+HEAD_BYTES = 4096
+USE_COLUMNS = ["customer_id", "category", "amount", "transaction_date"]
+
+
+class _ByteRange(io.RawIOBase):
+    """Bytes [start, end) of an open file, so pandas stops at the last complete line."""
+
+    def __init__(self, handle, start: int, end: int):
+        handle.seek(start)
+        self._handle = handle
+        self._left = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), self._left)
+        if n <= 0:
+            return 0
+        data = self._handle.read(n)
+        buffer[: len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+
+def _complete_end(path: Path, size: int) -> int:
+    """Offset just past the last newline: a line the feed writer is still appending is left for the next run."""
+    with open(path, "rb") as handle:
+        position = size
+        while position > 0:
+            start = max(0, position - 65536)
+            handle.seek(start)
+            block = handle.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            position = start
+    return 0
+
+
+def _head_hash(path: Path, length: int) -> str:
+    with open(path, "rb") as handle:
+        return hashlib.sha256(handle.read(length)).hexdigest()
+
+
+def _day(value: int) -> str:
+    return (date(1970, 1, 1) + pd.Timedelta(days=int(value))).isoformat()
+
+
+def _sum_by(major: np.ndarray, minor: np.ndarray, width: int, **columns: np.ndarray) -> tuple:
+    """Sum `columns` per distinct (major, minor) pair, with `0 <= minor < width`, via one int64 key."""
+    codes, keys = pd.factorize(major.astype(np.int64) * width + minor)
+    sums = {name: np.bincount(codes, weights=values, minlength=len(keys)) for name, values in columns.items()}
+    return keys // width, keys % width, sums
+
+
+class FeatureState:
+    """Running aggregates over the transaction feed, small enough to keep between runs.
+
+    Per customer: transaction count, total spend, first/last transaction day, lifetime spend per category.
+    Daily spend and counts are kept only for the last `HORIZON_DAYS` days, which is all the 30-day windows
+    need. Memory therefore grows with customers and categories, not with the length of the feed.
+    """
+
+    def __init__(self) -> None:
+        self.customers = pd.Index([], dtype=object)
+        self.categories: List[str] = []
+        self.txn_count = np.zeros(0, dtype=np.int64)
+        self.total_spend = np.zeros(0, dtype=np.float64)
+        self.first_day = np.zeros(0, dtype=np.int64)
+        self.last_day = np.zeros(0, dtype=np.int64)
+        self.daily = pd.DataFrame({"customer": [], "day": [], "spend": [], "count": []}).astype(
+            {"customer": np.int64, "day": np.int64, "spend": np.float64, "count": np.int64}
+        )
+        self.mix = pd.DataFrame({"customer": [], "category": [], "spend": []}).astype(
+            {"customer": np.int64, "category": np.int64, "spend": np.float64}
+        )
+        self.max_day: Optional[int] = None
+        # Customer codes seen by `absorb` since this state was loaded; not persisted.
+        self.touched: List[np.ndarray] = []
+        self.mark: Dict[str, Any] = {"source": None, "offset": 0, "head_bytes": 0, "head_sha": None, "rows": 0, "skipped": 0}
+
+    @staticmethod
+    def _codes(values: pd.Series, known: pd.Index) -> tuple:
+        """Stable integer codes for `values`, appending unseen ones to `known`; only distinct values are hashed against it."""
+        local, uniques = pd.factorize(values)
+        codes = known.get_indexer(uniques)
+        fresh = codes < 0
+        if fresh.any():
+            codes[fresh] = np.arange(len(known), len(known) + int(fresh.sum()))
+            known = known.append(pd.Index(uniques[fresh], dtype=object))
+        return codes[local], known
+
+    def absorb(self, chunk: pd.DataFrame) -> None:
+        """Fold one chunk of raw rows into the aggregates; unparseable dates or amounts are counted and skipped."""
+        days = pd.to_datetime(chunk["transaction_date"], errors="coerce", format="ISO8601")
+        amounts = pd.to_numeric(chunk["amount"], errors="coerce")
+        valid = (days.notna() & amounts.notna() & chunk["customer_id"].notna()).to_numpy()
+        self.mark["rows"] += len(chunk)
+        self.mark["skipped"] += int((~valid).sum())
+        if not valid.any():
+            return
+        day = days[valid].to_numpy().astype("datetime64[D]").astype(np.int64)
+        amount = amounts[valid].to_numpy(dtype=np.float64)
+        customer, self.customers = self._codes(chunk["customer_id"][valid].astype(str), self.customers)
+        self.touched.append(np.unique(customer))
+        category, categories = self._codes(chunk["category"][valid].fillna("").astype(str), pd.Index(self.categories, dtype=object))
+        self.categories = categories.tolist()
+
+        n = len(self.customers)
+        grown = n - len(self.txn_count)
+        if grown:
+            self.txn_count = np.concatenate([self.txn_count, np.zeros(grown, dtype=np.int64)])
+            self.total_spend = np.concatenate([self.total_spend, np.zeros(grown)])
+            self.first_day = np.concatenate([self.first_day, np.full(grown, np.iinfo(np.int64).max)])
+            self.last_day = np.concatenate([self.last_day, np.full(grown, np.iinfo(np.int64).min)])
+        self.txn_count += np.bincount(customer, minlength=n)
+        self.total_spend += np.bincount(customer, weights=amount, minlength=n)
+        np.minimum.at(self.first_day, customer, day)
+        np.maximum.at(self.last_day, customer, day)
+        self.max_day = int(day.max()) if self.max_day is None else max(self.max_day, int(day.max()))
+
+        floor = self.max_day - HORIZON_DAYS
+        recent = day > floor
+        daily_customer = np.concatenate([self.daily["customer"].to_numpy(), customer[recent]])
+        daily_day = np.concatenate([self.daily["day"].to_numpy(), day[recent]])
+        keep = daily_day > floor
+        customer_code, offset, sums = _sum_by(
+            daily_customer[keep],
+            daily_day[keep] - floor,
+            HORIZON_DAYS + 1,
+            spend=np.concatenate([self.daily["spend"].to_numpy(), amount[recent]])[keep],
+            count=np.concatenate([self.daily["count"].to_numpy(), np.ones(int(recent.sum()), dtype=np.int64)])[keep],
+        )
+        self.daily = pd.DataFrame(
+            {"customer": customer_code, "day": offset + floor, "spend": sums["spend"], "count": sums["count"].astype(np.int64)}
+        )
+        customer_code, category_code, sums = _sum_by(
+            np.concatenate([self.mix["customer"].to_numpy(), customer]),
+            np.concatenate([self.mix["category"].to_numpy(), category]),
+            max(1, len(self.categories)),
+            spend=np.concatenate([self.mix["spend"].to_numpy(), amount]),
+        )
+        self.mix = pd.DataFrame({"customer": customer_code, "category": category_code, "spend": sums["spend"]})
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        offsets, data = encode_strings(self.customers)
+        tmp = directory / f".state.{os.getpid()}.npz"
+        with open(tmp, "wb") as handle:
+            np.savez(
+                handle,
+                customer_offsets=offsets,
+                customer_data=data,
+                txn_count=self.txn_count,
+                total_spend=self.total_spend,
+                first_day=self.first_day,
+                last_day=self.last_day,
+                **{f"daily_{name}": self.daily[name].to_numpy() for name in self.daily.columns},
+                **{f"mix_{name}": self.mix[name].to_numpy() for name in self.mix.columns},
+            )
+        manifest = {
+            "version": STATE_VERSION,
+            "categories": self.categories,
+            "max_day": self.max_day,
+            "mark": self.mark,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        # Arrays first, manifest last: a reader that finds the new manifest also finds matching arrays.
+        os.replace(tmp, directory / "state.npz")
+        (directory / ".state.json.tmp").write_text(json.dumps(manifest))
+        os.replace(directory / ".state.json.tmp", directory / "state.json")
+
+    @classmethod
+    def load(cls, directory: Path) -> "FeatureState":
+        state = cls()
+        if not (directory / "state.json").exists():
+            return state
+        try:
+            manifest = json.loads((directory / "state.json").read_text())
+            if manifest.get("version") != STATE_VERSION:
+                return state
+            with np.load(directory / "state.npz") as arrays:
+                ids = StringColumn(arrays["customer_offsets"], arrays["customer_data"])
+                state.customers = pd.Index(ids.slice(0, len(ids)) if len(ids) else [], dtype=object)
+                state.txn_count = arrays["txn_count"]
+                state.total_spend = arrays["total_spend"]
+                state.first_day = arrays["first_day"]
+                state.last_day = arrays["last_day"]
+                state.daily = pd.DataFrame({name: arrays[f"daily_{name}"] for name in state.daily.columns})
+                state.mix = pd.DataFrame({name: arrays[f"mix_{name}"] for name in state.mix.columns})
+        except (OSError, ValueError, KeyError):
+            logger.warning("transaction feature state in %s is unreadable; rebuilding from the start", directory, exc_info=True)
+            return cls()
+        state.categories = manifest["categories"]
+        state.max_day = manifest["max_day"]
+        state.mark = manifest["mark"]
+        return state
+
+    def continues(self, path: Path, end: int) -> bool:
+        """Whether `path` is the feed this state was built from, with rows only appended since."""
+        mark = self.mark
+        if mark["source"] != str(path.resolve()) or mark["offset"] > end:
+            return False
+        return mark["head_bytes"] == 0 or _head_hash(path, mark["head_bytes"]) == mark["head_sha"]
+
+    def features(self, since: int = 0) -> "TransactionFeatures":
+        n = len(self.customers)
+        as_of = self.max_day if self.max_day is not None else 0
+        daily = self.daily
+        day = daily["day"].to_numpy()
+        customer = daily["customer"].to_numpy()
+        recent = day > as_of - WINDOW_DAYS
+        previous = ~recent & (day > as_of - 2 * WINDOW_DAYS)
+        spend = daily["spend"].to_numpy(dtype=np.float64)
+        # bincount of an empty selection comes back as int64, hence the casts.
+        spend_30d = np.bincount(customer[recent], weights=spend[recent], minlength=n).astype(np.float64)
+        txn_30d = np.bincount(customer[recent], weights=daily["count"].to_numpy()[recent], minlength=n).astype(np.int64)
+        spend_prev = np.bincount(customer[previous], weights=spend[previous], minlength=n).astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drop = np.where(spend_prev > 0, np.clip((spend_prev - spend_30d) / spend_prev, 0.0, 1.0), 0.0)
+
+        # Category spend grouped per customer, largest first, with offsets so a lookup is one slice.
+        mix = self.mix.sort_values(["customer", "spend"], ascending=[True, False], kind="stable")
+        mix_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(mix["customer"].to_numpy(), minlength=n), out=mix_offsets[1:])
+        touched = np.unique(np.concatenate(self.touched)) if self.touched else np.zeros(0, dtype=np.int64)
+        return TransactionFeatures(
+            customers=self.customers,
+            touched=self.customers[touched].tolist(),
+            feed_range=(since, self.mark["offset"]),
+            categories=self.categories,
+            as_of=as_of,
+            columns={
+                "txn_count": self.txn_count,
+                "total_spend": self.total_spend,
+                "days_since_last_txn": as_of - self.last_day,
+                "txn_30d": txn_30d,
+                "spend_30d": spend_30d,
+                "spend_prev_30d": spend_prev,
+                "spend_velocity_30d": spend_30d / WINDOW_DAYS,
+                "mom_spend_drop": drop,
+            },
+            mix_offsets=mix_offsets,
+            mix_category=mix["category"].to_numpy(),
+            mix_spend=mix["spend"].to_numpy(),
+        )
+
+
+class TransactionFeatures:
+    """Per-customer behavioural features, looked up by `customer_id` through a hash index.
+
+    Windows are relative to `as_of`, the newest transaction day in the feed:
+    - `spend_30d` / `txn_30d` cover the last 30 days and `spend_prev_30d` the 30 days before.
+    - `spend_velocity_30d` is average daily spend over the last 30 days.
+    - `mom_spend_drop` is the fractional fall from the previous 30 days (0 when spend held or grew).
+    - `category_mix` is each category's share of lifetime spend, largest first.
+
+    `touched` lists the customers with rows in the feed bytes `feed_range` (start, end) that the update producing
+    this object read; all other customers' totals are as they were at `start`.
+    """
+
+    def __init__(
+        self,
+        customers: pd.Index,
+        touched: List[str],
+        feed_range: Tuple[int, int],
+        categories: List[str],
+        as_of: int,
+        columns: Dict[str, np.ndarray],
+        mix_offsets: np.ndarray,
+        mix_category: np.ndarray,
+        mix_spend: np.ndarray,
+    ):
+        self._customers = customers
+        self.touched = touched
+        self.feed_range = feed_range
+        self._categories = categories
+        self.as_of = _day(as_of)
+        self._columns = columns
+        self._mix_offsets = mix_offsets
+        self._mix_category = mix_category
+        self._mix_spend = mix_spend
+
+    def __len__(self) -> int:
+        return len(self._customers)
+
+    @property
+    def customer_ids(self) -> List[str]:
+        return self._customers.tolist()
+
+    def column(self, name: str) -> np.ndarray:
+        """One feature for every customer, in `customer_ids` order."""
+        return self._columns[name]
+
+    def columns_for(self, customer_ids: List[str], names: List[str]) -> Dict[str, np.ndarray]:
+        """Float columns of `names` for `customer_ids`, NaN where a customer has no transactions."""
+        rows = self._customers.get_indexer(customer_ids)
+        found = rows >= 0
+        out = {}
+        for name in names:
+            values = np.full(len(rows), np.nan)
+            values[found] = self._columns[name][rows[found]]
+            out[name] = values
+        return out
+
+    def get(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        i = self._customers.get_indexer([customer_id])[0]
+        if i < 0:
+            return None
+        row: Dict[str, Any] = {"as_of": self.as_of}
+        for name, column in self._columns.items():
+            value = column[i].item()
+            row[name] = round(value, 4) if isinstance(value, float) else value
+        start, end = self._mix_offsets[i], self._mix_offsets[i + 1]
+        spend = self._mix_spend[start:end]
+        total = spend.sum()
+        row["category_mix"] = {
+            self._categories[code]: round(float(value / total), 4) if total else 0.0
+            for code, value in zip(self._mix_category[start:end].tolist(), spend)
+        }
+        row["top_category"] = next(iter(row["category_mix"]), None)
+        return row
+
+
+def update_transaction_features(
+    csv_path: Path, state_dir: Path = TRANSACTION_FEATURES_DIR, chunk_rows: int = TRANSACTION_CHUNK_ROWS
+) -> TransactionFeatures:
+    """Fold rows appended to `csv_path` since the stored high-water mark into the saved state.
+
+    The mark is the byte offset after the last complete line processed. The feed is read `chunk_rows` rows at
+    a time from there. A feed that shrank or whose first bytes changed is treated as replaced and rebuilt from
+    the start. Workers updating together serialise on a lock file; the first does the work, the rest only
+    read its state.
+    """
+    with file_lock(state_dir / ".lock"):
+        state = FeatureState.load(state_dir)
+        end = _complete_end(csv_path, csv_path.stat().st_size)
+        if not state.continues(csv_path, end):
+            if state.mark["source"] is not None:
+                logger.info("transaction feed %s was replaced; rebuilding features from the start", csv_path)
+            state = FeatureState()
+            state.mark["source"] = str(csv_path.resolve())
+        since = state.mark["offset"]
+        if end > state.mark["offset"]:
+            with open(csv_path, "rb") as handle:
+                header = handle.readline()
+                names = header.decode("utf-8").strip().split(",")
+                start = max(state.mark["offset"], len(header))
+                reader = pd.read_csv(
+                    io.BufferedReader(_ByteRange(handle, start, end)),
+                    header=None,
+                    names=names,
+                    usecols=USE_COLUMNS,
+                    dtype={"customer_id": str, "category": str, "transaction_date": str},
+                    chunksize=max(1, chunk_rows),
+                )
+                before = state.mark["rows"]
+                for chunk in reader:
+                    state.absorb(chunk)
+            state.mark["offset"] = end
+            state.mark["head_bytes"] = min(HEAD_BYTES, end)
+            state.mark["head_sha"] = _head_hash(csv_path, state.mark["head_bytes"])
+            state.save(state_dir)
+            logger.info("transaction features: %d new rows, %d customers", state.mark["rows"] - before, len(state.customers))
+        return state.features(since)
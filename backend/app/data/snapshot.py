@@ -0,0 +1,271 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.agents.churn import MODEL, refresh_scores, rescore_customers, score_book
+from app.agents.rag import OfferIndex, build_semantic_index, knowledge_corpus_item, offer_corpus_item
+from app.data.store import (
+    DATA_DIR,
+    CustomerStore,
+    load_customer_store,
+    load_knowledge,
+    load_offers,
+    load_product_catalog,
+    load_transaction_features,
+)
+from app.data.features import TransactionFeatures
+from app.core.config import CHURN_SCORING_ENABLED
+from app.rag.semantic import SemanticIndex
+
+logger = logging.getLogger(__name__)
+
+# Snapshot field -> (file under DATA_DIR, loader).
+SOURCES: Dict[str, Tuple[str, Callable[[], Any]]] = {
+    "customers": ("customers.csv", load_customer_store),
+    "offers": ("offers.json", load_offers),
+    "product_catalog": ("product_catalog.json", load_product_catalog),
+    "knowledge": ("knowledge.json", load_knowledge),
+    "features": ("transactions.csv", load_transaction_features),
+}
+
+FileStamp = Tuple[int, int]
+
+
+def _stamp(filename: str) -> FileStamp:
+    stat = (DATA_DIR / filename).stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _merge_by_id(current: List[Dict[str, Any]], updates: List[Dict[str, Any]], delete_ids: set) -> List[Dict[str, Any]]:
+    merged = {doc["id"]: doc for doc in current if doc["id"] not in delete_ids}
+    merged.update({doc["id"]: doc for doc in updates})
+    return list(merged.values())
+
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    """One generation of the reference data the agents read. Never mutated; changes publish a new one."""
+
+    version: int
+    customers: CustomerStore
+    offers: List[Dict[str, Any]]
+    product_catalog: Dict[str, Any]
+    knowledge: List[Dict[str, Any]]
+    features: TransactionFeatures
+    offer_index: OfferIndex
+    semantic_index: SemanticIndex
+    files: Dict[str, FileStamp]
+    loaded_at: str
+    timings: Dict[str, float]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.timings,
+            "customers": len(self.customers),
+            "offers": len(self.offers),
+            "knowledge": len(self.knowledge),
+            "transaction_features": {"customers": len(self.features), "as_of": self.features.as_of},
+            "files": {name: {"size": size, "mtime_ns": mtime} for name, (size, mtime) in self.files.items()},
+        }
+
+
+class SnapshotManager:
+    """Holds the active `DataSnapshot` and swaps in a new one when the files under `backend/data` change.
+
+    Requests read `current` once and keep that object, so a reload never mixes two generations in one answer.
+    `refresh` runs off the request path (scheduler tick or admin call). It re-reads only files whose size or
+    mtime changed. The offer index is rebuilt when offers change. The semantic index is rebuilt and warmed
+    only when offers or knowledge changed. The new snapshot is published by a single reference assignment.
+    A failed load keeps the previous snapshot.
+    """
+
+    def __init__(self) -> None:
+        self._current: Optional[DataSnapshot] = None
+        self._lock = threading.Lock()
+        self._reloads = 0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+        self._failed_files: Optional[Dict[str, FileStamp]] = None
+        self._checked_at: Optional[str] = None
+
+    @property
+    def current(self) -> DataSnapshot:
+        snapshot = self._current
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            return self._loaded()
+
+    def _loaded(self) -> DataSnapshot:
+        if self._current is None:
+            self._current = self._build(None, self._files(), version=1, warm=False)
+            logger.info("data snapshot 1 loaded in %.2fs", self._current.timings["total"])
+        return self._current
+
+    @staticmethod
+    def _files() -> Dict[str, FileStamp]:
+        return {name: _stamp(filename) for name, (filename, _) in SOURCES.items()}
+
+    def _build(
+        self, previous: Optional[DataSnapshot], files: Dict[str, FileStamp], version: int, warm: bool
+    ) -> DataSnapshot:
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        parts: Dict[str, Any] = {}
+        for name, (_, loader) in SOURCES.items():
+            if previous is not None and previous.files.get(name) == files[name]:
+                parts[name] = getattr(previous, name)
+                continue
+            begin = time.perf_counter()
+            parts[name] = loader()
+            timings[name] = round(time.perf_counter() - begin, 4)
+
+        if CHURN_SCORING_ENABLED and ("customers" in timings or "features" in timings):
+            begin = time.perf_counter()
+            if "customers" in timings:
+                parts["customers"] = score_book(parts["customers"], parts["features"])
+            else:
+                parts["customers"] = refresh_scores(parts["customers"], parts["features"], previous.features)
+            timings["churn_scores"] = round(time.perf_counter() - begin, 4)
+
+        if previous is not None and "offers" not in timings:
+            offer_index = previous.offer_index
+        else:
+            begin = time.perf_counter()
+            offer_index = OfferIndex(parts["offers"])
+            timings["offer_index"] = round(time.perf_counter() - begin, 4)
+
+        if previous is not None and "offers" not in timings and "knowledge" not in timings:
+            index = previous.semantic_index
+        else:
+            begin = time.perf_counter()
+            index = build_semantic_index(parts["offers"], parts["knowledge"])
+            if warm:
+                # Embeddings of unchanged documents come from the embedding cache, so this is mostly new text.
+                try:
+                    index.warm()
+                except Exception:
+                    logger.warning("semantic index warm-up failed; it will be built on first search", exc_info=True)
+            timings["semantic_index"] = round(time.perf_counter() - begin, 4)
+
+        timings["total"] = round(time.perf_counter() - started, 4)
+        return DataSnapshot(
+            version=version,
+            offer_index=offer_index,
+            semantic_index=index,
+            files=files,
+            loaded_at=_now(),
+            timings=timings,
+            **parts,
+        )
+
+    def warm(self) -> None:
+        """Load the first snapshot and embed its corpus ahead of the first request."""
+        self.current.semantic_index.warm()
+
+    def refresh(self, force: bool = False) -> Dict[str, Any]:
+        """Reload if any data file changed (every file with `force`); returns whether a new snapshot went live."""
+        with self._lock:
+            self._checked_at = _now()
+            previous = self._loaded()
+            try:
+                files = self._files()
+            except OSError as exc:
+                return self._failed(previous, None, exc)
+            if not force and (files == previous.files or files == self._failed_files):
+                return {"reloaded": False, **self.stats()}
+            try:
+                snapshot = self._build(None if force else previous, files, previous.version + 1, warm=True)
+            except Exception as exc:
+                return self._failed(previous, files, exc)
+            self._current = snapshot
+            self._reloads += 1
+            self._last_error = None
+            self._failed_files = None
+        logger.info("data snapshot %s loaded in %.2fs %s", snapshot.version, snapshot.timings["total"], snapshot.timings)
+        return {"reloaded": True, **self.stats()}
+
+    def _failed(self, previous: DataSnapshot, files: Optional[Dict[str, FileStamp]], exc: Exception) -> Dict[str, Any]:
+        # Remember the files that failed so the watcher retries only after they change again.
+        self._failures += 1
+        self._failed_files = files
+        self._last_error = f"{type(exc).__name__}: {exc}"
+        logger.warning("data snapshot reload failed; keeping version %s", previous.version, exc_info=True)
+        return {"reloaded": False, **self.stats()}
+
+    def apply_corpus_update(
+        self, offers: List[Dict[str, Any]], knowledge: List[Dict[str, Any]], delete_ids: List[str]
+    ) -> Dict[str, Any]:
+        """Publish offer/knowledge changes as a new snapshot without re-embedding unchanged documents.
+
+        Updates and deletes land in one new snapshot, together with its semantic index. An id that is both
+        updated and deleted is ambiguous and rejected with ValueError before anything changes. The changes live
+        in memory only; they are replaced when the corresponding file is next reloaded.
+        """
+        drop = set(delete_ids)
+        conflicting = sorted(drop.intersection(doc["id"] for doc in [*offers, *knowledge]))
+        if conflicting:
+            raise ValueError(f"ids both updated and deleted: {', '.join(conflicting)}")
+        with self._lock:
+            snapshot = self._loaded()
+            merged_offers = _merge_by_id(snapshot.offers, offers, drop)
+            # Built before anything is embedded, so an offer with a bad validity date fails fast and changes nothing.
+            offer_index = OfferIndex(merged_offers)
+            # A new index for the new snapshot; requests pinned to the old one keep searching the old corpus.
+            index, counts = snapshot.semantic_index.with_changes(
+                [offer_corpus_item(o) for o in offers] + [knowledge_corpus_item(k) for k in knowledge], delete_ids
+            )
+            self._current = replace(
+                snapshot,
+                version=snapshot.version + 1,
+                offers=merged_offers,
+                offer_index=offer_index,
+                semantic_index=index,
+                knowledge=_merge_by_id(snapshot.knowledge, knowledge, drop),
+                loaded_at=_now(),
+            )
+        counts["corpus_size"] = len(index.items)
+        counts["version"] = snapshot.version + 1
+        return counts
+
+    def rescore(self, customer_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Recompute churn scores for the whole book, or only `customer_ids`, and publish them as a new version."""
+        with self._lock:
+            snapshot = self._loaded()
+            begin = time.perf_counter()
+            if customer_ids is None:
+                customers = score_book(snapshot.customers, snapshot.features)
+            else:
+                customers = rescore_customers(snapshot.customers, customer_ids, snapshot.features)
+            seconds = round(time.perf_counter() - begin, 4)
+            self._current = replace(
+                snapshot,
+                version=snapshot.version + 1,
+                customers=customers,
+                loaded_at=_now(),
+                timings={**snapshot.timings, "churn_scores": seconds},
+            )
+        logger.info("churn scores recomputed for %s customers in %.2fs", "all" if customer_ids is None else len(customer_ids), seconds)
+        return {"version": snapshot.version + 1, "model": MODEL.version, "seconds": seconds}
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._current
+        return {
+            **(snapshot.describe() if snapshot is not None else {"version": None}),
+            "reloads": self._reloads,
+            "failures": self._failures,
+            "last_error": self._last_error,
+            "checked_at": self._checked_at,
+        }
+
+
+SNAPSHOTS = SnapshotManager()
@@ -1,14 +1,39 @@
 import json
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
 import pandas as pd
 
+from app.core.config import CUSTOMER_CACHE_DIR, CUSTOMER_CACHE_ENABLED
+from app.data.columnar import StringColumn, build_id_index, ensure_columnar, id_hash, read_columnar
+from app.data.features import TransactionFeatures, update_transaction_features
+
 DATA_DIR = Path(__file__).resolve().parents[2] / "data"
 
+# Low-cardinality text columns kept as integer codes so filters are vectorized comparisons.
+CATEGORY_COLUMNS = ("segment", "product", "reason")
+RISK_COLUMN = "churn_risk_score"
+
 
 def load_customers():
     return pd.read_csv(DATA_DIR / "customers.csv")
 
 
+def load_customer_store() -> "CustomerStore":
+    """Customer book backed by shared memory-mapped column files, or parsed in-process when the cache is off."""
+    if not CUSTOMER_CACHE_ENABLED:
+        return CustomerStore.from_frame(load_customers())
+    directory = ensure_columnar(
+        DATA_DIR / "customers.csv",
+        CUSTOMER_CACHE_DIR,
+        category_columns=CATEGORY_COLUMNS,
+        id_column="customer_id",
+        order_column=RISK_COLUMN,
+    )
+    return CustomerStore.open(directory)
+
+
 def load_offers():
     with open(DATA_DIR / "offers.json", "r", encoding="utf-8") as f:
         return json.load(f)
@@ -22,3 +47,175 @@ def load_product_catalog():
 def load_knowledge():
     with open(DATA_DIR / "knowledge.json", "r", encoding="utf-8") as f:
         return json.load(f)
+
+
+def load_transaction_features() -> TransactionFeatures:
+    """Behavioural features from transactions.csv, folding in only the rows appended since the last load."""
+    return update_transaction_features(DATA_DIR / "transactions.csv")
+
+
+class CustomerStore:
+    """The customer book as one array per column, indexed for the agents' hot lookups.
+
+    - `customer_id` lookups use a hash index (sorted 64-bit id hashes plus their rows), so a lookup is a
+      binary search and one string compare, with no per-customer Python objects.
+    - Rows are ordered by descending `churn_risk_score` once at load, so an unfiltered top-N is a slice.
+    - Filtered top-N (segment / product / reason) builds a mask from integer category codes and
+      partially selects the N best survivors instead of sorting the whole book.
+
+    Columns may be in-memory arrays (`from_frame`) or read-only memory maps (`open`); string columns only
+    need to support `len()` and integer indexing.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, Any],
+        categories: Dict[str, np.ndarray],
+        id_hashes: np.ndarray,
+        id_rows: np.ndarray,
+        risk_order: np.ndarray,
+    ):
+        self.columns = columns
+        self.categories = categories
+        self.column_names = list(columns)
+        self._size = len(risk_order)
+        self._id_hashes = id_hashes
+        self._id_rows = id_rows
+        self._code_by_value = {
+            name: {value: code for code, value in enumerate(values.tolist())} for name, values in categories.items()
+        }
+        self._risk_order = risk_order
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "CustomerStore":
+        columns: Dict[str, Any] = {}
+        categories: Dict[str, np.ndarray] = {}
+        for name in frame.columns:
+            if name in CATEGORY_COLUMNS:
+                codes, uniques = pd.factorize(frame[name], use_na_sentinel=True)
+                columns[name] = codes.astype(np.int32)
+                categories[name] = np.asarray(uniques, dtype=object)
+            else:
+                columns[name] = frame[name].to_numpy()
+        id_hashes, id_rows = build_id_index(frame["customer_id"].astype(str))
+        # Stable so equal scores keep file order.
+        risk_order = np.argsort(-columns[RISK_COLUMN], kind="stable")
+        return cls(columns, categories, id_hashes, id_rows, risk_order)
+
+    @classmethod
+    def open(cls, directory: Path) -> "CustomerStore":
+        return cls(**read_columnar(directory))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _value(self, name: str, i: int) -> Any:
+        value = self.columns[name][i]
+        if name in self.categories:
+            return self.categories[name][value] if value >= 0 else None
+        return value.item() if isinstance(value, np.generic) else value
+
+    def values(self, name: str, start: int, stop: int) -> Any:
+        """Rows `start:stop` of one column: an array for numeric columns, a list for text and categories."""
+        column = self.columns[name]
+        if name in self.categories:
+            labels = self.categories[name]
+            return [labels[code] if code >= 0 else None for code in column[start:stop].tolist()]
+        if isinstance(column, StringColumn):
+            return column.slice(start, stop)
+        if column.dtype == object:
+            return column[start:stop].tolist()
+        return column[start:stop]
+
+    def row(self, i: int, columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        return {name: self._value(name, i) for name in (columns or self.column_names)}
+
+    def row_of(self, customer_id: str) -> Optional[int]:
+        target = np.uint64(id_hash(customer_id))
+        ids = self.columns["customer_id"]
+        pos = int(np.searchsorted(self._id_hashes, target))
+        # Distinct ids can share a hash; check each candidate's actual id.
+        while pos < len(self._id_hashes) and self._id_hashes[pos] == target:
+            row = int(self._id_rows[pos])
+            if ids[row] == customer_id:
+                return row
+            pos += 1
+        return None
+
+    def rows_of(self, customer_ids: Sequence[str]) -> np.ndarray:
+        """Row positions of `customer_ids`, -1 for unknown ids."""
+        rows = (self.row_of(customer_id) for customer_id in customer_ids)
+        return np.fromiter((-1 if row is None else row for row in rows), dtype=np.int64, count=len(customer_ids))
+
+    def get(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        i = self.row_of(customer_id)
+        return None if i is None else self.row(i)
+
+    def _risk_keys(self, scores: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        # Scores have 4 decimals, so (descending score, row) packs into one ascending int64.
+        return (10_000 - np.rint(scores[rows] * 10_000)).astype(np.int64) * self._size + rows
+
+    def with_scores(self, scores: np.ndarray, changed_rows: Optional[np.ndarray] = None) -> "CustomerStore":
+        """This book re-ranked by new `churn_risk_score` values (one per row, rounded to 4 decimals).
+
+        Every other column and the id index are shared. With `changed_rows`, only those rows are moved within
+        the current ranking (the other scores must be unchanged); otherwise the whole book is re-sorted.
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        if changed_rows is None:
+            order = np.argsort(-scores, kind="stable")
+        else:
+            moved = np.zeros(self._size, dtype=bool)
+            moved[changed_rows] = True
+            keep = self._risk_order[~moved[self._risk_order]]
+            changed = np.flatnonzero(moved)
+            changed = changed[np.argsort(self._risk_keys(scores, changed), kind="stable")]
+            positions = np.searchsorted(self._risk_keys(scores, keep), self._risk_keys(scores, changed))
+            order = np.insert(keep, positions, changed)
+        return CustomerStore(
+            {**self.columns, RISK_COLUMN: scores}, self.categories, self._id_hashes, self._id_rows, order
+        )
+
+    def _mask(self, filters: Dict[str, Optional[str]]) -> Optional[np.ndarray]:
+        mask = None
+        for name, value in filters.items():
+            if value is None:
+                continue
+            code = self._code_by_value[name].get(value)
+            if code is None:
+                return np.zeros(self._size, dtype=bool)
+            clause = self.columns[name] == code
+            mask = clause if mask is None else mask & clause
+        return mask
+
+    def top_at_risk_rows(
+        self, top_n: int, segment: Optional[str] = None, product: Optional[str] = None, reason: Optional[str] = None
+    ) -> np.ndarray:
+        """Row positions of the `top_n` highest-risk customers matching the filters, highest first."""
+        top_n = max(0, min(top_n, self._size))
+        mask = self._mask({"segment": segment, "product": product, "reason": reason})
+        if mask is None:
+            return self._risk_order[:top_n]
+        rows = np.flatnonzero(mask)
+        if len(rows) > top_n:
+            scores = self.columns[RISK_COLUMN][rows]
+            if top_n:
+                # Partial selection finds the cut-off score; customers tied at it are taken in file order.
+                cutoff = np.partition(scores, len(scores) - top_n)[len(scores) - top_n]
+                keep = scores > cutoff
+                keep[np.flatnonzero(scores == cutoff)[: top_n - int(keep.sum())]] = True
+                rows = rows[keep]
+            else:
+                rows = rows[:0]
+        # Sort only the survivors; ties fall back to file order like the precomputed ranking.
+        return rows[np.lexsort((rows, -self.columns[RISK_COLUMN][rows]))]
+
+    def top_at_risk(
+        self,
+        top_n: int,
+        segment: Optional[str] = None,
+        product: Optional[str] = None,
+        reason: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        return [self.row(int(i), columns) for i in self.top_at_risk_rows(top_n, segment, product, reason)]
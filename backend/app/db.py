@@ -1,16 +1,94 @@
 import json
+import logging
+import threading
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 
-from app.core.config import DATABASE_URL
+from app.core.config import (
+    DATABASE_URL,
+    DB_AUDIT_DURABILITY,
+    DB_POOL_MAX_IDLE_SECONDS,
+    DB_POOL_MAX_LIFETIME_SECONDS,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_WRITE_BEHIND_FLUSH_MS,
+    DB_WRITE_BEHIND_MAX_PENDING,
+    DB_WRITE_BEHIND_MAX_RETRIES,
+    DB_WRITE_BEHIND_MAX_ROWS,
+)
+
+logger = logging.getLogger(__name__)
+# Write-behind rows given up on, one record each, so they can be routed to a file and replayed.
+dead_letter_logger = logging.getLogger(__name__ + ".dead_letter")
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def open_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = ConnectionPool(
+                DATABASE_URL,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=max(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+                timeout=DB_POOL_TIMEOUT_SECONDS,
+                max_idle=DB_POOL_MAX_IDLE_SECONDS,
+                max_lifetime=DB_POOL_MAX_LIFETIME_SECONDS,
+                kwargs={"row_factory": dict_row},
+                # Validate connections on checkout so a Postgres restart doesn't surface as request errors.
+                check=ConnectionPool.check_connection,
+                name="retention",
+                open=False,
+            )
+            pool.open()
+            _pool = pool
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_pool() -> ConnectionPool:
+    return _pool if _pool is not None else open_pool()
 
 
 def get_conn():
-    return psycopg.connect(DATABASE_URL, row_factory=dict_row)
+    # Connections are borrowed from the shared pool and returned when the `with` block exits.
+    return get_pool().connection()
+
+
+def pool_stats() -> Dict[str, Any]:
+    if _pool is None:
+        return {"open": False}
+    stats = _pool.get_stats()
+    return {
+        "open": True,
+        "min_size": _pool.min_size,
+        "max_size": _pool.max_size,
+        "size": stats.get("pool_size", 0),
+        "available": stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "requests": stats.get("requests_num", 0),
+        "requests_queued": stats.get("requests_queued", 0),
+        "requests_wait_ms": stats.get("requests_wait_ms", 0),
+        "requests_timeouts": stats.get("requests_errors", 0),
+        "avg_wait_ms": stats.get("requests_wait_ms", 0) / max(1, stats.get("requests_queued", 0)),
+        "connections_errors": stats.get("connections_errors", 0),
+        "connections_lost": stats.get("connections_lost", 0),
+    }
 
 
 def init_db() -> None:
@@ -72,67 +150,388 @@ def init_db() -> None:
         scored_at timestamptz not null,
         created_at timestamptz not null
     );
+
+    -- Per-message evaluation marker. Messages that predate it were covered by the old
+    -- wall-clock window job, so they start out evaluated; backfills can reset a range.
+    do $$
+    begin
+        if not exists (
+            select 1 from information_schema.columns
+            where table_name = 'chat_messages' and column_name = 'evaluated_at'
+        ) then
+            alter table chat_messages add column evaluated_at timestamptz, add column eval_claimed_at timestamptz;
+            update chat_messages set evaluated_at = created_at;
+        end if;
+    end $$;
+
+    alter table llm_judge_runs
+        add column if not exists input_hash text,
+        add column if not exists cached_from uuid references llm_judge_runs(id);
+
+    create index if not exists llm_judge_runs_cache_key
+        on llm_judge_runs (scoring_revision, input_hash) where cached_from is null;
+
+    alter table chat_messages
+        add column if not exists eval_attempts integer not null default 0,
+        add column if not exists eval_failed_at timestamptz;
+
+    create index if not exists chat_messages_eval_pending
+        on chat_messages (created_at) where role = 'assistant' and evaluated_at is null;
+
+    create table if not exists campaign_jobs (
+        id uuid primary key,
+        params jsonb not null,
+        customer_ids text[] not null,
+        snapshot_version integer,
+        status text not null,
+        total integer not null,
+        completed integer not null default 0,
+        failed integer not null default 0,
+        heartbeat_at timestamptz,
+        created_at timestamptz not null,
+        finished_at timestamptz,
+        lease_token uuid
+    );
+
+    alter table campaign_jobs add column if not exists lease_token uuid;
+
+    create table if not exists campaign_results (
+        job_id uuid not null references campaign_jobs(id),
+        position integer not null,
+        customer_id text not null,
+        segment text not null,
+        reason text,
+        offers jsonb,
+        response text not null,
+        created_at timestamptz not null,
+        primary key (job_id, position)
+    );
+
+    create table if not exists response_cache (
+        generation text not null,
+        key text not null,
+        model text not null,
+        response text not null,
+        created_at timestamptz not null default now(),
+        expires_at timestamptz not null,
+        primary key (generation, key)
+    );
+
+    create index if not exists response_cache_expires_at on response_cache (expires_at);
     """
     with get_conn() as conn:
         conn.execute(ddl)
         conn.commit()
 
 
-def create_conversation(customer_id: Optional[str]) -> str:
-    convo_id = str(uuid.uuid4())
+_TABLE_COLUMNS = {
+    "conversations": ("id", "customer_id", "started_at"),
+    "chat_messages": ("id", "conversation_id", "role", "content", "metadata", "created_at"),
+    "events": ("id", "conversation_id", "event_type", "payload", "created_at"),
+    "audit_trail": ("id", "conversation_id", "event_type", "payload", "created_at"),
+    "llm_judge_runs": (
+        "id",
+        "conversation_id",
+        "scoring_id",
+        "scoring_version",
+        "scoring_revision",
+        "model",
+        "input",
+        "prompt",
+        "raw_output",
+        "parsed",
+        "scored_at",
+        "created_at",
+        "input_hash",
+        "cached_from",
+    ),
+    "campaign_results": ("job_id", "position", "customer_id", "segment", "reason", "offers", "response", "created_at"),
+}
+
+# Parents first so foreign keys resolve when rows for several tables land in one transaction.
+_TABLE_ORDER = ("conversations", "chat_messages", "events", "audit_trail", "llm_judge_runs", "campaign_results")
+
+PendingRow = Tuple[str, Tuple[Any, ...]]
+
+
+def _conversation_row(customer_id: Optional[str]) -> PendingRow:
+    return "conversations", (str(uuid.uuid4()), customer_id, datetime.now(timezone.utc))
+
+
+def _message_row(conversation_id: str, role: str, content: str, metadata: Optional[Dict[str, Any]]) -> PendingRow:
+    return "chat_messages", (
+        str(uuid.uuid4()),
+        conversation_id,
+        role,
+        content,
+        json.dumps(metadata or {}),
+        datetime.now(timezone.utc),
+    )
+
+
+def _event_row(table: str, conversation_id: Optional[str], event_type: str, payload: Dict[str, Any]) -> PendingRow:
+    return table, (
+        str(uuid.uuid4()),
+        conversation_id,
+        event_type,
+        json.dumps(payload),
+        datetime.now(timezone.utc),
+    )
+
+
+def _copy_rows(cur, rows: List[PendingRow]) -> None:
+    for table in _TABLE_ORDER:
+        batch = [params for name, params in rows if name == table]
+        if not batch:
+            continue
+        columns = ", ".join(_TABLE_COLUMNS[table])
+        with cur.copy(f"copy {table} ({columns}) from stdin") as copy:
+            for params in batch:
+                copy.write_row(params)
+
+
+def _insert_rows(rows: List[PendingRow]) -> None:
+    """Write rows for any of the log tables in one transaction, one COPY per table."""
+    if not rows:
+        return
     with get_conn() as conn:
-        conn.execute(
-            "insert into conversations (id, customer_id, started_at) values (%s, %s, %s)",
-            (convo_id, customer_id, datetime.now(timezone.utc)),
-        )
+        with conn.cursor() as cur:
+            _copy_rows(cur, rows)
         conn.commit()
-    return convo_id
+
+
+class WriteBehindQueue:
+    """Buffers log rows in memory and flushes them in bulk from a background thread.
+
+    A flush happens every `flush_interval` seconds, or sooner once `max_rows` rows are pending.
+    When Postgres is unreachable, the whole batch goes back to the head of the queue for the next tick; beyond
+    `max_pending` queued rows the oldest are dead-lettered. Any other failure means some row is bad (e.g. an
+    FK violation), so the batch is rewritten table by table, then row by row, and only the rows that still fail
+    are kept. A row rejected in `max_retries` flushes is written to the dead-letter log, counted, and dropped,
+    so one bad row can't hold up the rows behind it.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float,
+        max_rows: int,
+        max_retries: int = DB_WRITE_BEHIND_MAX_RETRIES,
+        max_pending: int = DB_WRITE_BEHIND_MAX_PENDING,
+    ):
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_retries = max(1, max_retries)
+        self.max_pending = max(max_rows, max_pending)
+        # (flushes that rejected the row, row)
+        self._rows: List[Tuple[int, PendingRow]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def enqueue(self, rows: List[PendingRow]) -> None:
+        if not rows:
+            return
+        with self._lock:
+            self._rows.extend((0, row) for row in rows)
+            full = len(self._rows) >= self.max_rows
+        if full:
+            self._wake.set()
+
+    def _isolate(
+        self, entries: List[Tuple[int, PendingRow]]
+    ) -> Tuple[int, List[Tuple[int, PendingRow]], List[Tuple[int, PendingRow]]]:
+        """Write a failed batch in smaller pieces; returns (rows written, rejected entries, entries not tried)."""
+        tables = list(dict.fromkeys(row[0] for _, row in entries))
+        if len(tables) > 1:
+            groups = [[e for e in entries if e[1][0] == table] for table in _TABLE_ORDER if table in tables]
+        else:
+            groups = [[entry] for entry in entries]
+        written, rejected, untried = 0, [], []
+        for i, group in enumerate(groups):
+            try:
+                _insert_rows([row for _, row in group])
+                written += len(group)
+            except psycopg.OperationalError:
+                # The database went away mid-way; keep the rest for the next tick.
+                untried.extend(entry for rest in groups[i:] for entry in rest)
+                break
+            except Exception:
+                if len(group) == 1:
+                    rejected.extend(group)
+                else:
+                    more, bad, later = self._isolate(group)
+                    written += more
+                    rejected.extend(bad)
+                    untried.extend(later)
+                    if later:
+                        untried.extend(entry for rest in groups[i + 1 :] for entry in rest)
+                        break
+        return written, rejected, untried
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                entries, self._rows = self._rows, []
+            if not entries:
+                return 0
+            try:
+                _insert_rows([row for _, row in entries])
+                written, rejected, untried = len(entries), [], []
+            except psycopg.OperationalError:
+                logger.warning("write-behind flush of %d rows failed: database unavailable", len(entries), exc_info=True)
+                written, rejected, untried = 0, [], entries
+            except Exception:
+                logger.warning("write-behind flush of %d rows failed; retrying in smaller batches", len(entries), exc_info=True)
+                written, rejected, untried = self._isolate(entries)
+            if rejected or untried:
+                self.failed_flushes += 1
+                retry = [(attempts + 1, row) for attempts, row in rejected if attempts + 1 < self.max_retries]
+                dead = [row for attempts, row in rejected if attempts + 1 >= self.max_retries]
+                with self._lock:
+                    self._rows[:0] = sorted(retry + untried, key=lambda entry: _TABLE_ORDER.index(entry[1][0]))
+                    overflow = len(self._rows) - self.max_pending
+                    if overflow > 0:
+                        dead.extend(row for _, row in self._rows[:overflow])
+                        del self._rows[:overflow]
+                self._dead_letter(dead)
+            if written:
+                self.flushes += 1
+                self.flushed_rows += written
+            return written
+
+    def _dead_letter(self, rows: List[PendingRow]) -> None:
+        if not rows:
+            return
+        for table, params in rows:
+            dead_letter_logger.error(json.dumps({"table": table, "row": params}, default=str))
+        self.dead_lettered += len(rows)
+        logger.error("write-behind dropped %d rows (rejected %d times, or the queue was full)", len(rows), self.max_retries)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._rows)
+        return {
+            "pending": pending,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+_write_behind: Optional[WriteBehindQueue] = None
+
+
+def start_write_behind() -> None:
+    global _write_behind
+    if _write_behind is None:
+        _write_behind = WriteBehindQueue(DB_WRITE_BEHIND_FLUSH_MS / 1000.0, DB_WRITE_BEHIND_MAX_ROWS)
+        _write_behind.start()
+
+
+def stop_write_behind() -> None:
+    global _write_behind
+    if _write_behind is not None:
+        _write_behind.stop()
+        _write_behind = None
+
+
+def write_behind_stats() -> Dict[str, Any]:
+    if _write_behind is None:
+        return {"enabled": False}
+    return {"enabled": True, "audit_durability": DB_AUDIT_DURABILITY, **_write_behind.stats()}
+
+
+def _is_synchronous(row: PendingRow) -> bool:
+    table = row[0]
+    # Conversations are FK parents of every other row, so they are never deferred.
+    return table == "conversations" or (table == "audit_trail" and DB_AUDIT_DURABILITY == "sync")
+
+
+class UnitOfWork:
+    """Collects the writes made while handling one request and persists them together.
+
+    Rows are buffered until `commit()` (or the end of the `with` block) and then written in a single
+    transaction. With write-behind enabled, conversations and (by default) audit rows are still written
+    synchronously while messages and events are handed to the background queue. Pending rows are also
+    persisted when the block raises, so audit and guardrail events survive a failed request.
+    """
+
+    def __init__(self) -> None:
+        self._rows: List[PendingRow] = []
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.commit()
+
+    def create_conversation(self, customer_id: Optional[str]) -> str:
+        row = _conversation_row(customer_id)
+        self._rows.append(row)
+        return row[1][0]
+
+    def add_message(self, conversation_id: str, role: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        self._rows.append(_message_row(conversation_id, role, content, metadata))
+
+    def add_event(self, conversation_id: str, event_type: str, payload: Dict[str, Any]) -> None:
+        self._rows.append(_event_row("events", conversation_id, event_type, payload))
+
+    def add_audit_event(self, conversation_id: str, event_type: str, payload: Dict[str, Any]) -> None:
+        self._rows.append(_event_row("audit_trail", conversation_id, event_type, payload))
+
+    def commit(self) -> None:
+        rows, self._rows = self._rows, []
+        if _write_behind is None:
+            _insert_rows(rows)
+            return
+        _insert_rows([row for row in rows if _is_synchronous(row)])
+        _write_behind.enqueue([row for row in rows if not _is_synchronous(row)])
+
+
+def unit_of_work() -> UnitOfWork:
+    return UnitOfWork()
+
+
+def create_conversation(customer_id: Optional[str]) -> str:
+    row = _conversation_row(customer_id)
+    _insert_rows([row])
+    return row[1][0]
 
 
 def add_message(conversation_id: str, role: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> None:
-    with get_conn() as conn:
-        conn.execute(
-            "insert into chat_messages (id, conversation_id, role, content, metadata, created_at) values (%s, %s, %s, %s, %s, %s)",
-            (
-                str(uuid.uuid4()),
-                conversation_id,
-                role,
-                content,
-                json.dumps(metadata or {}),
-                datetime.now(timezone.utc),
-            ),
-        )
-        conn.commit()
+    _insert_rows([_message_row(conversation_id, role, content, metadata)])
 
 
 def add_event(conversation_id: str, event_type: str, payload: Dict[str, Any]) -> None:
-    with get_conn() as conn:
-        conn.execute(
-            "insert into events (id, conversation_id, event_type, payload, created_at) values (%s, %s, %s, %s, %s)",
-            (
-                str(uuid.uuid4()),
-                conversation_id,
-                event_type,
-                json.dumps(payload),
-                datetime.now(timezone.utc),
-            ),
-        )
-        conn.commit()
+    _insert_rows([_event_row("events", conversation_id, event_type, payload)])
 
 
 def add_audit_event(conversation_id: str, event_type: str, payload: Dict[str, Any]) -> None:
-    with get_conn() as conn:
-        conn.execute(
-            "insert into audit_trail (id, conversation_id, event_type, payload, created_at) values (%s, %s, %s, %s, %s)",
-            (
-                str(uuid.uuid4()),
-                conversation_id,
-                event_type,
-                json.dumps(payload),
-                datetime.now(timezone.utc),
-            ),
-        )
-        conn.commit()
+    _insert_rows([_event_row("audit_trail", conversation_id, event_type, payload)])
 
 
 def list_metrics(limit: int = 24) -> Iterable[Dict[str, Any]]:
@@ -162,33 +561,147 @@ def insert_metric(window_start, window_end, compliance, completeness, guardrail_
         conn.commit()
 
 
+def _judge_run_row(conversation_id: str, payload: Dict[str, Any]) -> PendingRow:
+    return "llm_judge_runs", (
+        payload.get("id") or str(uuid.uuid4()),
+        conversation_id,
+        payload.get("scoring_id"),
+        payload.get("scoring_version"),
+        payload.get("scoring_revision"),
+        payload.get("model"),
+        json.dumps(payload.get("input", {})),
+        payload.get("prompt", ""),
+        payload.get("raw_output", ""),
+        json.dumps(payload.get("parsed", {})),
+        payload.get("scored_at"),
+        datetime.now(timezone.utc),
+        payload.get("input_hash"),
+        payload.get("cached_from"),
+    )
+
+
 def insert_llm_judge_run(conversation_id: str, payload: Dict[str, Any]) -> None:
+    _insert_rows([_judge_run_row(conversation_id, payload)])
+
+
+def insert_llm_judge_runs(runs: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """Bulk-insert (conversation_id, judge payload) pairs in one transaction."""
+    _insert_rows([_judge_run_row(conversation_id, payload) for conversation_id, payload in runs])
+
+
+def claim_messages_for_eval(
+    limit: int, lease_seconds: float, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """Lease up to `limit` unevaluated assistant messages, oldest first.
+
+    Rows locked by another replica's claim are skipped, and a lease older than `lease_seconds` (a worker
+    that died mid-run) can be taken over. The claim is committed immediately so no locks are held while
+    the judges run.
+    """
     with get_conn() as conn:
-        conn.execute(
-            "insert into llm_judge_runs (id, conversation_id, scoring_id, scoring_version, scoring_revision, model, input, prompt, raw_output, parsed, scored_at, created_at) values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-            (
-                str(uuid.uuid4()),
-                conversation_id,
-                payload.get("scoring_id"),
-                payload.get("scoring_version"),
-                payload.get("scoring_revision"),
-                payload.get("model"),
-                json.dumps(payload.get("input", {})),
-                payload.get("prompt", ""),
-                payload.get("raw_output", ""),
-                json.dumps(payload.get("parsed", {})),
-                payload.get("scored_at"),
-                datetime.now(timezone.utc),
-            ),
+        rows = conn.execute(
+            """
+            update chat_messages set eval_claimed_at = now()
+            where id in (
+                select id from chat_messages
+                where role = 'assistant' and evaluated_at is null and eval_failed_at is null
+                  and (eval_claimed_at is null or eval_claimed_at < now() - make_interval(secs => %s))
+                  and (%s::timestamptz is null or created_at >= %s)
+                  and (%s::timestamptz is null or created_at < %s)
+                order by created_at
+                limit %s
+                for update skip locked
+            )
+            returning id, conversation_id, role, content, created_at
+            """,
+            (lease_seconds, start, start, end, end, limit),
+        ).fetchall()
+        conn.commit()
+    return sorted(rows, key=lambda row: row["created_at"])
+
+
+def complete_eval(message_ids: List[str], runs: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """Store judge runs and mark their messages evaluated in one transaction, so a message is never half-scored."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            _copy_rows(cur, [_judge_run_row(conversation_id, payload) for conversation_id, payload in runs])
+            cur.execute(
+                "update chat_messages set evaluated_at = now(), eval_claimed_at = null where id = any(%s::uuid[])",
+                (message_ids,),
+            )
+        conn.commit()
+
+
+def release_eval_claims(message_ids: List[str]) -> None:
+    with get_conn() as conn:
+        conn.execute("update chat_messages set eval_claimed_at = null where id = any(%s::uuid[])", (message_ids,))
+        conn.commit()
+
+
+def record_eval_failures(message_ids: List[str], max_attempts: int) -> List[str]:
+    """Count a failed judging attempt for each message; returns those that reached `max_attempts`.
+
+    Those are marked `eval_failed_at` and released, so no later run claims them again. The others keep
+    their claim and are retried once it expires.
+    """
+    if not message_ids:
+        return []
+    with get_conn() as conn:
+        rows = conn.execute(
+            """
+            update chat_messages set
+                eval_attempts = eval_attempts + 1,
+                eval_failed_at = case when eval_attempts + 1 >= %s then now() end,
+                eval_claimed_at = case when eval_attempts + 1 >= %s then null else eval_claimed_at end
+            where id = any(%s::uuid[])
+            returning id, eval_failed_at
+            """,
+            (max_attempts, max_attempts, message_ids),
+        ).fetchall()
+        conn.commit()
+    return [str(row["id"]) for row in rows if row["eval_failed_at"] is not None]
+
+
+def reset_evaluations(start: datetime, end: datetime) -> int:
+    """Mark assistant messages in [start, end) as unevaluated so the next runs re-score them."""
+    with get_conn() as conn:
+        cur = conn.execute(
+            "update chat_messages set evaluated_at = null, eval_claimed_at = null, eval_attempts = 0, "
+            "eval_failed_at = null "
+            "where role = 'assistant' and created_at >= %s and created_at < %s",
+            (start, end),
         )
         conn.commit()
+        return cur.rowcount
 
 
-def list_recent_messages(window_start, window_end) -> Iterable[Dict[str, Any]]:
+def count_pending_evaluations(start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    with get_conn() as conn:
+        row = conn.execute(
+            "select count(*) as total from chat_messages where role = 'assistant' and evaluated_at is null "
+            "and eval_failed_at is null "
+            "and (%s::timestamptz is null or created_at >= %s) and (%s::timestamptz is null or created_at < %s)",
+            (start, start, end, end),
+        ).fetchone()
+    return int(row["total"]) if row else 0
+
+
+def find_judge_runs(scoring_revision: str, input_hashes: List[str]) -> List[Dict[str, Any]]:
+    """Latest original (non-cached, parseable) run per input hash for one scoring revision."""
+    if not input_hashes:
+        return []
     with get_conn() as conn:
         rows = conn.execute(
-            "select * from chat_messages where created_at >= %s and created_at < %s",
-            (window_start, window_end),
+            """
+            select distinct on (input_hash)
+                id, scoring_id, scoring_version, scoring_revision, model, input, prompt, raw_output, parsed,
+                scored_at, input_hash
+            from llm_judge_runs
+            where scoring_revision = %s and input_hash = any(%s) and cached_from is null
+              and not coalesce(parsed ? 'error', false)
+            order by input_hash, created_at desc
+            """,
+            (scoring_revision, input_hashes),
         ).fetchall()
     return rows
 
@@ -209,3 +722,177 @@ def list_judge_runs(limit: int = 50) -> Iterable[Dict[str, Any]]:
             (limit,),
         ).fetchall()
     return rows
+
+
+_CAMPAIGN_JOB_COLUMNS = (
+    "id, params, snapshot_version, status, total, completed, failed, heartbeat_at, created_at, finished_at"
+)
+
+
+class CampaignLeaseLost(RuntimeError):
+    """The campaign job was taken over by another run; this run's writes are refused."""
+
+
+def create_campaign_job(params: Dict[str, Any], customer_ids: List[str], snapshot_version: Optional[int]) -> Dict[str, Any]:
+    """Record a new campaign over `customer_ids` (in ranking order) and hold it as running.
+
+    The returned `lease_token` must accompany every write of the run that holds the job.
+    """
+    with get_conn() as conn:
+        row = conn.execute(
+            f"""
+            insert into campaign_jobs
+                (id, params, customer_ids, snapshot_version, status, total, heartbeat_at, created_at, lease_token)
+            values (%s, %s, %s, %s, 'running', %s, now(), now(), %s)
+            returning {_CAMPAIGN_JOB_COLUMNS}, lease_token
+            """,
+            (
+                str(uuid.uuid4()),
+                json.dumps(params),
+                customer_ids,
+                snapshot_version,
+                len(customer_ids),
+                str(uuid.uuid4()),
+            ),
+        ).fetchone()
+        conn.commit()
+    return row
+
+
+def get_campaign_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with get_conn() as conn:
+        return conn.execute(f"select {_CAMPAIGN_JOB_COLUMNS} from campaign_jobs where id = %s", (job_id,)).fetchone()
+
+
+def claim_campaign_job(job_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+    """Take over an unfinished campaign to resume it; `pending` lists the (position, customer_id) pairs left.
+
+    A job another worker is running is only taken once its heartbeat is older than `lease_seconds`.
+    The claim issues a new `lease_token`, which fences off the previous holder's writes.
+    Returns None if the job is missing, completed or still held.
+    """
+    with get_conn() as conn:
+        job = conn.execute(
+            f"""
+            update campaign_jobs set status = 'running', failed = 0, heartbeat_at = now(), finished_at = null,
+                lease_token = %s
+            where id = %s and status <> 'completed'
+              and (status <> 'running' or heartbeat_at < now() - make_interval(secs => %s))
+            returning {_CAMPAIGN_JOB_COLUMNS}, lease_token, customer_ids
+            """,
+            (str(uuid.uuid4()), job_id, lease_seconds),
+        ).fetchone()
+        if job is not None:
+            done = conn.execute("select position from campaign_results where job_id = %s", (job_id,)).fetchall()
+            finished = {row["position"] for row in done}
+            job["pending"] = [(i, cid) for i, cid in enumerate(job.pop("customer_ids")) if i not in finished]
+        conn.commit()
+    return job
+
+
+def _campaign_result_row(job_id: str, result: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        job_id,
+        result["index"],
+        result["customer_id"],
+        result["segment"],
+        result["reason"],
+        json.dumps(result["offers"]),
+        result["response"],
+        datetime.now(timezone.utc),
+    )
+
+
+def _hold_campaign_lease(cur, job_id: str, lease_token: str) -> None:
+    """Lock the job row for this transaction, or raise CampaignLeaseLost if another run holds the job."""
+    cur.execute("select 1 from campaign_jobs where id = %s and lease_token = %s for update", (job_id, lease_token))
+    if cur.fetchone() is None:
+        raise CampaignLeaseLost(job_id)
+
+
+def save_campaign_results(job_id: str, lease_token: str, results: List[Dict[str, Any]], failed: int) -> int:
+    """Store a batch of finished customers and advance the job's counters and heartbeat in one transaction.
+
+    Rows are COPY'd into a temp table and inserted with `on conflict do nothing`, so a position that is
+    already stored is kept and not counted twice. Returns the number of rows inserted.
+    """
+    columns = ", ".join(_TABLE_COLUMNS["campaign_results"])
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            _hold_campaign_lease(cur, job_id, lease_token)
+            inserted = 0
+            if results:
+                cur.execute(
+                    "create temp table campaign_results_batch (like campaign_results including defaults) on commit drop"
+                )
+                with cur.copy(f"copy campaign_results_batch ({columns}) from stdin") as copy:
+                    for result in results:
+                        copy.write_row(_campaign_result_row(job_id, result))
+                cur.execute(
+                    f"insert into campaign_results ({columns}) select {columns} from campaign_results_batch "
+                    "on conflict (job_id, position) do nothing"
+                )
+                inserted = cur.rowcount
+            cur.execute(
+                "update campaign_jobs set completed = completed + %s, failed = failed + %s, heartbeat_at = now() "
+                "where id = %s",
+                (inserted, failed, job_id),
+            )
+        conn.commit()
+    return inserted
+
+
+def finish_campaign_job(job_id: str, lease_token: str, status: str) -> None:
+    """Record the run's final status and release the lease; raises CampaignLeaseLost if the job was taken over."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            _hold_campaign_lease(cur, job_id, lease_token)
+            cur.execute(
+                "update campaign_jobs set status = %s, finished_at = now(), heartbeat_at = null, lease_token = null "
+                "where id = %s",
+                (status, job_id),
+            )
+        conn.commit()
+
+
+def list_campaign_results(job_id: str, after: int = -1, limit: int = 500) -> List[Dict[str, Any]]:
+    """Stored results in ranking order, `limit` rows after position `after` (keyset pagination)."""
+    with get_conn() as conn:
+        return conn.execute(
+            "select position, customer_id, segment, reason, offers, response, created_at from campaign_results "
+            "where job_id = %s and position > %s order by position limit %s",
+            (job_id, after, limit),
+        ).fetchall()
+
+
+def get_cached_response(generation: str, key: str) -> Optional[Dict[str, Any]]:
+    with get_conn() as conn:
+        return conn.execute(
+            "select response, extract(epoch from expires_at - now()) as ttl_seconds from response_cache "
+            "where generation = %s and key = %s and expires_at > now()",
+            (generation, key),
+        ).fetchone()
+
+
+def put_cached_response(generation: str, key: str, model: str, response: str, ttl_seconds: float) -> None:
+    with get_conn() as conn:
+        conn.execute(
+            """
+            insert into response_cache (generation, key, model, response, expires_at)
+            values (%s, %s, %s, %s, now() + make_interval(secs => %s))
+            on conflict (generation, key) do update
+                set response = excluded.response, created_at = now(), expires_at = excluded.expires_at
+            """,
+            (generation, key, model, response, ttl_seconds),
+        )
+        conn.commit()
+
+
+def purge_response_cache(keep_generation: str) -> int:
+    """Drop expired entries and every entry of other data generations; returns rows deleted."""
+    with get_conn() as conn:
+        deleted = conn.execute(
+            "delete from response_cache where generation <> %s or expires_at <= now()", (keep_generation,)
+        ).rowcount
+        conn.commit()
+    return deleted
@@ -1,12 +1,40 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple
 
-from app.core.config import EVAL_BATCH_WINDOW_MINUTES
-from app.db import count_guardrail_blocks, insert_llm_judge_run, insert_metric, list_recent_messages
-from app.evaluations.judge import load_scoring_function, run_llm_judge
+from app.core.config import (
+    EVAL_BATCH_WINDOW_MINUTES,
+    EVAL_CLAIM_CHUNK,
+    EVAL_CLAIM_LEASE_SECONDS,
+    EVAL_JUDGE_CONCURRENCY,
+    EVAL_MAX_ATTEMPTS,
+    EVAL_RUN_BUDGET,
+)
+from app.db import (
+    claim_messages_for_eval,
+    complete_eval,
+    count_guardrail_blocks,
+    count_pending_evaluations,
+    insert_metric,
+    record_eval_failures,
+    release_eval_claims,
+    reset_evaluations,
+)
+from app.evaluations.judge import ScoringFunction, input_hash, load_scoring_function, run_llm_judge
+from app.evaluations.judge_cache import JUDGE_CACHE, cached_run, is_cacheable
+
+logger = logging.getLogger(__name__)
 
 REQUIRED_FIELDS = ["retention_summary", "offers", "next_best_action"]
 
+# Serialises batch runs inside this process; the scheduler job is also registered with max_instances=1.
+# Across replicas, claims on chat_messages keep two runs from scoring the same message.
+_RUN_LOCK = threading.Lock()
+_progress: Dict[str, Any] = {"running": False}
+
 
 def compute_completeness(message_content: str) -> float:
     lower = message_content.lower()
@@ -14,28 +42,163 @@ def compute_completeness(message_content: str) -> float:
     return present / len(REQUIRED_FIELDS)
 
 
-def run_eval_batch() -> Dict[str, float]:
-    window_end = datetime.now(timezone.utc)
-    window_start = window_end - timedelta(minutes=EVAL_BATCH_WINDOW_MINUTES)
+def eval_batch_progress() -> Dict[str, Any]:
+    return {key: value for key, value in _progress.items() if not key.startswith("_")}
 
-    messages = list(list_recent_messages(window_start, window_end))
-    total_messages = len(messages)
-    if total_messages == 0:
-        compliance = 1.0
-        completeness = 1.0
-        guardrail_blocks = 0
-    else:
+
+def _run_judges(
+    jobs: List[Tuple[Tuple[str, str], Dict[str, Any], ScoringFunction]],
+    inputs: Dict[str, Dict[str, Any]],
+    runs_by_message: Dict[str, List[Tuple[str, Dict[str, Any]]]],
+    failed: set,
+) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Call the judge for each (key, message, scoring function) on a bounded thread pool; returns runs by key."""
+    results: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    if not jobs:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, EVAL_JUDGE_CONCURRENCY), thread_name_prefix="eval-judge") as pool:
+        futures = {pool.submit(run_llm_judge, sf, inputs[str(msg["id"])]): (key, msg, sf) for key, msg, sf in jobs}
+        for future in as_completed(futures):
+            key, msg, sf = futures[future]
+            try:
+                run = future.result()
+                results[key] = run
+                runs_by_message[str(msg["id"])].append((str(msg["conversation_id"]), run))
+            except Exception:
+                failed.add(str(msg["id"]))
+                _progress["judge_failed"] += 1
+                logger.warning("judge call failed for message %s", msg["id"], exc_info=True)
+            _progress["judge_done"] += 1
+            elapsed = time.perf_counter() - _progress["_started"]
+            _progress["judge_per_second"] = round(_progress["judge_done"] / elapsed, 2) if elapsed else None
+    return results
+
+
+def _judge_messages(
+    messages: List[Dict[str, Any]], scoring_functions: List[ScoringFunction]
+) -> Tuple[List[str], List[Tuple[str, Dict[str, Any]]]]:
+    """Judge every (message, scoring function) pair, calling the model only for inputs not seen before.
+
+    Repeated inputs get a row pointing at a stored or in-chunk original with a cacheable verdict. Returns the
+    ids of messages whose judges all succeeded, with their runs; any other message is retried whole later.
+    """
+    runs_by_message: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {str(msg["id"]): [] for msg in messages}
+    failed = set()
+    inputs = {str(msg["id"]): {"response_text": msg["content"]} for msg in messages}
+    hashes = {message_id: input_hash(payload) for message_id, payload in inputs.items()}
+    for sf in scoring_functions:
+        JUDGE_CACHE.prefetch(sf, list(hashes.values()))
+
+    leaders: Dict[Tuple[str, str], Tuple[Dict[str, Any], ScoringFunction]] = {}
+    followers: List[Tuple[Dict[str, Any], ScoringFunction, Tuple[str, str]]] = []
+    for msg in messages:
+        message_id = str(msg["id"])
+        for sf in scoring_functions:
+            key = (sf.revision_id, hashes[message_id])
+            if key in leaders:
+                followers.append((msg, sf, key))
+                continue
+            hit = JUDGE_CACHE.get(sf, key[1])
+            if hit is not None:
+                runs_by_message[message_id].append((str(msg["conversation_id"]), cached_run(hit, sf, inputs[message_id])))
+            else:
+                leaders[key] = (msg, sf)
+
+    _progress["judge_total"] += len(leaders)
+    results = _run_judges([(key, msg, sf) for key, (msg, sf) in leaders.items()], inputs, runs_by_message, failed)
+
+    # A verdict that is not cacheable (e.g. an unparseable answer) is not reused; those duplicates are judged alone.
+    alone: List[Tuple[Tuple[str, str], Dict[str, Any], ScoringFunction]] = []
+    shared: List[Tuple[str, str]] = []
+    for msg, sf, key in followers:
+        message_id = str(msg["id"])
+        if key not in results:
+            failed.add(message_id)
+        elif is_cacheable(results[key]):
+            JUDGE_CACHE.record_shared()
+            runs_by_message[message_id].append((str(msg["conversation_id"]), cached_run(results[key], sf, inputs[message_id])))
+            shared.append((message_id, str(leaders[key][0]["id"])))
+        else:
+            alone.append((key, msg, sf))
+    _progress["judge_total"] += len(alone)
+    _run_judges(alone, inputs, runs_by_message, failed)
+
+    # A failed message's runs are not stored, so copies pointing at them must wait for the retry too.
+    while True:
+        orphaned = {follower for follower, leader in shared if leader in failed and follower not in failed}
+        if not orphaned:
+            break
+        failed |= orphaned
+
+    done = [message_id for message_id in runs_by_message if message_id not in failed]
+    # Originals first, so rows that point at them via cached_from are written after them.
+    runs = [run for message_id in done for run in runs_by_message[message_id]]
+    runs.sort(key=lambda run: run[1].get("cached_from") is not None)
+    return done, runs
+
+
+def _evaluate(budget: int, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+    """Claim and score unevaluated assistant messages in chunks until none are left or `budget` is spent."""
+    started = time.perf_counter()
+    _progress.update(
+        running=True,
+        _started=started,
+        range_start=start.isoformat() if start else None,
+        range_end=end.isoformat() if end else None,
+        messages_scored=0,
+        judge_total=0,
+        judge_done=0,
+        judge_failed=0,
+        judge_per_second=None,
+        gave_up=0,
+    )
+    scoring_functions = [load_scoring_function("completeness", "v1"), load_scoring_function("compliance", "v1")]
+
+    scored: List[Dict[str, Any]] = []
+    judge_runs = 0
+    while len(scored) < budget:
+        chunk = claim_messages_for_eval(min(EVAL_CLAIM_CHUNK, budget - len(scored)), EVAL_CLAIM_LEASE_SECONDS, start, end)
+        if not chunk:
+            break
+        ids = [str(msg["id"]) for msg in chunk]
+        try:
+            done, runs = _judge_messages(chunk, scoring_functions)
+            complete_eval(done, runs)
+        except Exception:
+            # Hand the chunk back right away rather than waiting for the lease to expire.
+            release_eval_claims(ids)
+            raise
+        # Only stored originals are offered for reuse, so a cached_from reference always resolves.
+        by_revision = {sf.revision_id: sf for sf in scoring_functions}
+        for _, run in runs:
+            if run.get("cached_from") is None:
+                JUDGE_CACHE.put(by_revision[run["scoring_revision"]], run)
+        done_ids = set(done)
+        scored.extend(msg for msg in chunk if str(msg["id"]) in done_ids)
+        gave_up = record_eval_failures([i for i in ids if i not in done_ids], EVAL_MAX_ATTEMPTS)
+        if gave_up:
+            _progress["gave_up"] += len(gave_up)
+            logger.warning(
+                "eval: giving up on %d messages after %d failed attempts: %s", len(gave_up), EVAL_MAX_ATTEMPTS, gave_up
+            )
+        judge_runs += len(runs)
+        _progress["messages_scored"] = len(scored)
+        if len(done) < len(chunk):
+            # The judge model is failing; leave the rest for the next run instead of burning the budget.
+            break
+
+    now = datetime.now(timezone.utc)
+    if scored:
+        window_start = min(msg["created_at"] for msg in scored)
+        window_end = max(msg["created_at"] for msg in scored) + timedelta(microseconds=1)
+        total_messages = len(scored)
         guardrail_blocks = count_guardrail_blocks(window_start, window_end)
         compliance = max(0.0, 1.0 - (guardrail_blocks / total_messages))
-        completeness = sum(compute_completeness(m["content"]) for m in messages) / total_messages
-
-        completeness_sf = load_scoring_function("completeness", "v1")
-        compliance_sf = load_scoring_function("compliance", "v1")
-        for msg in messages:
-            judge_payload = run_llm_judge(completeness_sf, {"response_text": msg["content"]})
-            insert_llm_judge_run(str(msg["conversation_id"]), judge_payload)
-            judge_payload = run_llm_judge(compliance_sf, {"response_text": msg["content"]})
-            insert_llm_judge_run(str(msg["conversation_id"]), judge_payload)
+        completeness = sum(compute_completeness(m["content"]) for m in scored) / total_messages
+    else:
+        # Nothing new: keep one row per tick so the dashboard timeline has no gaps.
+        window_start, window_end = now - timedelta(minutes=EVAL_BATCH_WINDOW_MINUTES), now
+        total_messages, guardrail_blocks, compliance, completeness = 0, 0, 1.0, 1.0
 
     insert_metric(
         window_start=window_start,
@@ -45,9 +208,53 @@ def run_eval_batch() -> Dict[str, float]:
         guardrail_blocks=guardrail_blocks,
         total_messages=total_messages,
     )
+    pending = count_pending_evaluations(start, end)
+    elapsed = time.perf_counter() - started
+    _progress.update(pending=pending, last_duration_seconds=round(elapsed, 3), last_finished_at=now.isoformat())
+    logger.info(
+        "eval batch: %d messages, %d judge runs in %.1fs (%.2f runs/s), %d still pending",
+        total_messages,
+        judge_runs,
+        elapsed,
+        judge_runs / elapsed if elapsed else 0.0,
+        pending,
+    )
     return {
         "compliance": compliance,
         "completeness": completeness,
         "guardrail_blocks": guardrail_blocks,
         "total_messages": total_messages,
+        "judge_runs": judge_runs,
+        "pending": pending,
+        "duration_seconds": round(elapsed, 3),
     }
+
+
+def _locked(fn, *args, **kwargs) -> Dict[str, Any]:
+    if not _RUN_LOCK.acquire(blocking=False):
+        logger.info("eval batch already running; skipping")
+        return {"skipped": True}
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _progress["running"] = False
+        _RUN_LOCK.release()
+
+
+def run_eval_batch() -> Dict[str, Any]:
+    """Score assistant messages that have not been evaluated yet, up to EVAL_RUN_BUDGET per run."""
+    return _locked(_evaluate, EVAL_RUN_BUDGET)
+
+
+def run_eval_backfill(start: datetime, end: datetime, rescore: bool = False, budget: Optional[int] = None) -> Dict[str, Any]:
+    """Score unevaluated assistant messages created in [start, end), one budgeted pass per call.
+
+    With `rescore`, messages in the range are first marked unevaluated; pass it on the first call only and
+    repeat without it until `pending` is 0.
+    """
+
+    def backfill() -> Dict[str, Any]:
+        reset = reset_evaluations(start, end) if rescore else 0
+        return {"reset": reset, **_evaluate(budget or EVAL_RUN_BUDGET, start, end)}
+
+    return _locked(backfill)
@@ -2,12 +2,21 @@ from __future__ import annotations
 
 import hashlib
 import json
+import logging
+import threading
+import time
+import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import cached_property
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
+from app.core.config import SCORING_RELOAD_INTERVAL_SECONDS
 from app.core.llm import get_chat_llm
+from app.evaluations.schema import Validator, compile_schema
+
+logger = logging.getLogger(__name__)
 
 SCORING_DIR = Path(__file__).resolve().parents[2] / "scoring_functions"
 
@@ -21,7 +30,7 @@ class ScoringFunction:
     schema: Dict[str, Any]
     model: str
 
-    @property
+    @cached_property
     def revision_id(self) -> str:
         payload = json.dumps(
             {
@@ -36,8 +45,7 @@ class ScoringFunction:
         return hashlib.sha256(payload).hexdigest()[:12]
 
 
-def load_scoring_function(name: str, version: str) -> ScoringFunction:
-    path = SCORING_DIR / name / version / "spec.json"
+def _read_spec(path: Path) -> ScoringFunction:
     data = json.loads(path.read_text())
     return ScoringFunction(
         id=data["id"],
@@ -49,6 +57,94 @@ def load_scoring_function(name: str, version: str) -> ScoringFunction:
     )
 
 
+@dataclass
+class _LoadedSpec:
+    scoring: ScoringFunction
+    validate: Validator
+    mtime_ns: int
+
+
+class ScoringRegistry:
+    """All `<name>/<version>/spec.json` files under `root`, parsed once and kept in memory.
+
+    Spec mtimes are re-checked at most every `reload_interval` seconds; a changed file is re-parsed (and its
+    revision id and schema validator rebuilt), new files appear and deleted ones disappear. A spec that fails
+    to parse keeps serving its last good version.
+    """
+
+    def __init__(self, root: Path, reload_interval: float):
+        self.root = root
+        self.reload_interval = reload_interval
+        self._specs: Dict[Tuple[str, str], _LoadedSpec] = {}
+        self._validators: Dict[str, Validator] = {}
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+                return
+            specs: Dict[Tuple[str, str], _LoadedSpec] = {}
+            for path in self.root.glob("*/*/spec.json") if self.root.exists() else []:
+                key = (path.parent.parent.name, path.parent.name)
+                current = self._specs.get(key)
+                mtime_ns = 0
+                try:
+                    mtime_ns = path.stat().st_mtime_ns
+                    if current is not None and current.mtime_ns == mtime_ns:
+                        specs[key] = current
+                        continue
+                    scoring = _read_spec(path)
+                    specs[key] = _LoadedSpec(scoring, self._validator_for(scoring), mtime_ns)
+                    if current is not None:
+                        logger.info("reloaded scoring function %s/%s (revision %s)", *key, scoring.revision_id)
+                except (OSError, ValueError, KeyError):
+                    logger.warning("could not load scoring function %s", path, exc_info=True)
+                    if current is not None:
+                        # Remember the broken file's mtime so it is retried only once it changes again.
+                        specs[key] = _LoadedSpec(current.scoring, current.validate, mtime_ns)
+            self._specs = specs
+            self._checked_at = now
+
+    def _validator_for(self, scoring: ScoringFunction) -> Validator:
+        validate = self._validators.get(scoring.revision_id)
+        if validate is None:
+            validate = compile_schema(scoring.schema)
+            self._validators[scoring.revision_id] = validate
+        return validate
+
+    def get(self, name: str, version: str) -> ScoringFunction:
+        self._refresh()
+        spec = self._specs.get((name, version))
+        if spec is None:
+            raise FileNotFoundError(self.root / name / version / "spec.json")
+        return spec.scoring
+
+    def validator(self, scoring: ScoringFunction) -> Validator:
+        """Compiled schema validator for `scoring`, shared by every spec object with the same revision."""
+        return self._validator_for(scoring)
+
+    def list(self) -> List[Dict[str, str]]:
+        self._refresh()
+        return [{"name": name, "version": version} for name, version in sorted(self._specs)]
+
+
+REGISTRY = ScoringRegistry(SCORING_DIR, SCORING_RELOAD_INTERVAL_SECONDS)
+
+
+def load_scoring_function(name: str, version: str) -> ScoringFunction:
+    return REGISTRY.get(name, version)
+
+
+def input_hash(input_payload: Dict[str, Any]) -> str:
+    """Content address of a judge input; surrounding and repeated whitespace in string fields is ignored."""
+    normalized = {key: " ".join(value.split()) if isinstance(value, str) else value for key, value in input_payload.items()}
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
 def run_llm_judge(scoring: ScoringFunction, input_payload: Dict[str, Any]) -> Dict[str, Any]:
     prompt = scoring.prompt_template.format(**input_payload)
     response = get_chat_llm().invoke(prompt)
@@ -57,8 +153,13 @@ def run_llm_judge(scoring: ScoringFunction, input_payload: Dict[str, Any]) -> Di
         score_payload = json.loads(content)
     except json.JSONDecodeError:
         score_payload = {"error": "invalid_json", "raw": content}
+    else:
+        violations = REGISTRY.validator(scoring)(score_payload)
+        if violations:
+            score_payload = {"error": "schema_violation", "violations": violations, "raw": content}
 
     return {
+        "id": str(uuid.uuid4()),
         "scoring_id": scoring.id,
         "scoring_version": scoring.version,
         "scoring_revision": scoring.revision_id,
@@ -68,18 +169,9 @@ def run_llm_judge(scoring: ScoringFunction, input_payload: Dict[str, Any]) -> Di
         "raw_output": content,
         "parsed": score_payload,
         "scored_at": datetime.now(timezone.utc).isoformat(),
+        "input_hash": input_hash(input_payload),
     }
 
 
 def list_available_scoring_functions() -> List[Dict[str, str]]:
-    entries: List[Dict[str, str]] = []
-    if not SCORING_DIR.exists():
-        return entries
-    for sf_dir in SCORING_DIR.iterdir():
-        if not sf_dir.is_dir():
-            continue
-        for version_dir in sf_dir.iterdir():
-            spec = version_dir / "spec.json"
-            if spec.exists():
-                entries.append({"name": sf_dir.name, "version": version_dir.name})
-    return entries
+    return REGISTRY.list()
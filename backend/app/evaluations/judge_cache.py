@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import JUDGE_CACHE_ENABLED, JUDGE_CACHE_MAX_ENTRIES, JUDGE_CACHE_TTL_SECONDS
+from app.db import find_judge_runs
+from app.evaluations.judge import ScoringFunction
+
+
+def is_cacheable(run: Dict[str, Any]) -> bool:
+    parsed = run.get("parsed")
+    return not (isinstance(parsed, dict) and "error" in parsed)
+
+
+def cached_run(original: Dict[str, Any], scoring: ScoringFunction, input_payload: Dict[str, Any]) -> Dict[str, Any]:
+    """A judge-run payload for `input_payload` that reuses `original`'s verdict and points back at it."""
+    return {
+        "id": str(uuid.uuid4()),
+        "scoring_id": scoring.id,
+        "scoring_version": scoring.version,
+        "scoring_revision": scoring.revision_id,
+        "model": scoring.model,
+        "input": input_payload,
+        "prompt": scoring.prompt_template.format(**input_payload),
+        "raw_output": original.get("raw_output", ""),
+        "parsed": original.get("parsed", {}),
+        "scored_at": datetime.now(timezone.utc).isoformat(),
+        "input_hash": original.get("input_hash"),
+        "cached_from": str(original["id"]),
+    }
+
+
+class JudgeCache:
+    """Judge results keyed by (scoring revision, input hash).
+
+    An in-process LRU sits in front of `llm_judge_runs`, so results are shared across restarts and replicas.
+    Keys embed the revision, so an edited spec never sees old verdicts; the in-process entries of a
+    scoring function are also dropped as soon as a new revision of it is seen.
+    """
+
+    def __init__(self, enabled: bool, ttl_seconds: float, max_entries: int):
+        self.enabled = enabled
+        self._memory = TTLCache(ttl_seconds, max_entries)
+        self._revisions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_revision(self, scoring: ScoringFunction) -> None:
+        with self._lock:
+            previous = self._revisions.get(scoring.id)
+            self._revisions[scoring.id] = scoring.revision_id
+        if previous is not None and previous != scoring.revision_id:
+            # Entries are few and short-lived; dropping the whole memory tier is simpler than tracking per-spec keys.
+            self._memory.clear()
+
+    def prefetch(self, scoring: ScoringFunction, hashes: List[str]) -> None:
+        """Load stored originals for the given input hashes into memory with one query."""
+        if not self.enabled:
+            return
+        self._check_revision(scoring)
+        revision = scoring.revision_id
+        missing = sorted({h for h in hashes if self._memory.get((revision, h)) is None})
+        for row in find_judge_runs(revision, missing):
+            self._memory.set((revision, row["input_hash"]), dict(row))
+
+    def get(self, scoring: ScoringFunction, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        hit = self._memory.get((scoring.revision_id, key))
+        with self._lock:
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return hit
+
+    def record_shared(self) -> None:
+        """Count a duplicate input within one batch, served by another message's judge call, as a hit."""
+        with self._lock:
+            self.hits += 1
+
+    def put(self, scoring: ScoringFunction, run: Dict[str, Any]) -> None:
+        if self.enabled and is_cacheable(run):
+            self._memory.set((scoring.revision_id, run["input_hash"]), run)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "memory_entries": self._memory.stats()["size"],
+        }
+
+
+JUDGE_CACHE = JudgeCache(JUDGE_CACHE_ENABLED, JUDGE_CACHE_TTL_SECONDS, JUDGE_CACHE_MAX_ENTRIES)
+
+
+def judge_cache_stats() -> Dict[str, Any]:
+    return JUDGE_CACHE.stats()
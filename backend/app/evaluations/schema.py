@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List
+
+# Validates `value` at `path`, appending human-readable violations to `errors`.
+Check = Callable[[Any, str, List[str]], None]
+Validator = Callable[[Any], List[str]]
+
+_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    # bool is an int subclass in Python but not a number in JSON Schema.
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def _compile(schema: Dict[str, Any]) -> List[Check]:
+    checks: List[Check] = []
+
+    if "type" in schema:
+        names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        predicates = [_TYPES[name] for name in names]
+        expected = "/".join(names)
+
+        def check_type(value: Any, path: str, errors: List[str]) -> None:
+            if not any(predicate(value) for predicate in predicates):
+                errors.append(f"{path}: expected {expected}, got {type(value).__name__}")
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(value: Any, path: str, errors: List[str]) -> None:
+            if value not in allowed:
+                errors.append(f"{path}: {value!r} is not one of {allowed}")
+
+        checks.append(check_enum)
+
+    for keyword, compare, word in (("minimum", lambda v, b: v < b, "below"), ("maximum", lambda v, b: v > b, "above")):
+        if keyword in schema:
+            bound = schema[keyword]
+
+            def check_bound(value: Any, path: str, errors: List[str], bound=bound, compare=compare, word=word) -> None:
+                if _TYPES["number"](value) and compare(value, bound):
+                    errors.append(f"{path}: {value} is {word} {bound}")
+
+            checks.append(check_bound)
+
+    required = list(schema.get("required", []))
+    properties = {name: _compile(sub) for name, sub in schema.get("properties", {}).items()}
+    closed = schema.get("additionalProperties") is False
+    if required or properties or closed:
+
+        def check_object(value: Any, path: str, errors: List[str]) -> None:
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path}: missing required property {name!r}")
+            for name, sub_checks in properties.items():
+                if name in value:
+                    for check in sub_checks:
+                        check(value[name], f"{path}.{name}", errors)
+            if closed:
+                for name in value:
+                    if name not in properties:
+                        errors.append(f"{path}: unexpected property {name!r}")
+
+        checks.append(check_object)
+
+    if "items" in schema:
+        item_checks = _compile(schema["items"])
+
+        def check_items(value: Any, path: str, errors: List[str]) -> None:
+            if not isinstance(value, list):
+                return
+            for i, item in enumerate(value):
+                for check in item_checks:
+                    check(item, f"{path}[{i}]", errors)
+
+        checks.append(check_items)
+
+    return checks
+
+
+def compile_schema(schema: Dict[str, Any]) -> Validator:
+    """Turn a JSON Schema into a function returning its violations (empty when valid).
+
+    Covers the subset scoring specs use: `type`, `enum`, `minimum`/`maximum`, `properties`, `required`,
+    `additionalProperties: false` and `items`. Other keywords are ignored. The schema is walked once here,
+    not on every validation.
+    """
+    checks = _compile(schema)
+
+    def validate(value: Any) -> List[str]:
+        errors: List[str] = []
+        for check in checks:
+            check(value, "$", errors)
+        return errors
+
+    return validate
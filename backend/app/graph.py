@@ -1,12 +1,14 @@
-from typing import Any, Dict, Optional, TypedDict
+from typing import Any, Dict, List, Optional, TypedDict
 
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
+from langgraph.types import StreamWriter
 
 from app.agents.attrition import run_attrition
 from app.agents.segmentation import segment_customer
-from app.agents.rag import build_product_context, build_semantic_index, find_offers, semantic_retrieve
-from app.agents.communication import generate_response
-from app.data.store import load_customers, load_offers, load_product_catalog, load_knowledge
+from app.agents.rag import build_product_context, find_offers, semantic_retrieve
+from app.agents.communication import agenerate_response
+from app.data.snapshot import SNAPSHOTS, DataSnapshot
 from app.telemetry.langfuse_client import get_langfuse_handler
 
 
@@ -23,15 +25,22 @@ class RetentionState(TypedDict, total=False):
     response_text: str
 
 
-CUSTOMERS = load_customers()
-OFFERS = load_offers()
-PRODUCT_CATALOG = load_product_catalog()
-KNOWLEDGE = load_knowledge()
-SEMANTIC_INDEX = build_semantic_index(OFFERS, KNOWLEDGE)
+def apply_corpus_update(
+    offers: List[Dict[str, Any]], knowledge: List[Dict[str, Any]], delete_ids: List[str]
+) -> Dict[str, Any]:
+    """Publish offer/knowledge changes and deletions as one new snapshot, re-embedding only changed documents."""
+    return SNAPSHOTS.apply_corpus_update(offers, knowledge, delete_ids)
 
 
-def attrition_node(state: RetentionState) -> RetentionState:
-    attrition = run_attrition(CUSTOMERS, state["user_input"], state.get("customer_id"))
+def _snapshot(config: Optional[RunnableConfig]) -> DataSnapshot:
+    # graph_config pins one snapshot per request, so every node sees the same data even across a reload.
+    snapshot = ((config or {}).get("configurable") or {}).get("snapshot")
+    return snapshot if snapshot is not None else SNAPSHOTS.current
+
+
+def attrition_node(state: RetentionState, config: RunnableConfig) -> RetentionState:
+    snapshot = _snapshot(config)
+    attrition = run_attrition(snapshot.customers, state["user_input"], state.get("customer_id"), snapshot.features)
     return {"attrition": attrition}
 
 
@@ -40,24 +49,25 @@ def segmentation_node(state: RetentionState) -> RetentionState:
         customer = state["attrition"]["customer"]
     else:
         customer = state["attrition"]["customers"][0]
-    segment = segment_customer(customer)
+    segment = segment_customer(customer, state["attrition"].get("features"))
     return {"segment": segment}
 
 
-def rag_node(state: RetentionState) -> RetentionState:
+def rag_node(state: RetentionState, config: RunnableConfig) -> RetentionState:
+    snapshot = _snapshot(config)
     if state["attrition"]["mode"] == "single":
         customer = state["attrition"]["customer"]
     else:
         customer = state["attrition"]["customers"][0]
     reason = customer.get("reason", "general")
-    offers = find_offers(OFFERS, state["segment"]["segment"], reason)
-    product_context = build_product_context(PRODUCT_CATALOG, customer.get("product"))
+    offers = find_offers(snapshot.offer_index, state["segment"]["segment"], reason)
+    product_context = build_product_context(snapshot.product_catalog, customer.get("product"))
     query = f"{reason} {state['segment']['segment']} {customer.get('product', '')}"
-    semantic_hits = semantic_retrieve(SEMANTIC_INDEX, query, top_k=3)
+    semantic_hits = semantic_retrieve(snapshot.semantic_index, query, top_k=3)
     return {"offers": offers, "product_context": product_context, "semantic_hits": semantic_hits}
 
 
-def communication_node(state: RetentionState) -> RetentionState:
+async def communication_node(state: RetentionState, writer: StreamWriter, config: RunnableConfig) -> RetentionState:
     if state["attrition"]["mode"] == "single":
         customer = state["attrition"]["customer"]
     else:
@@ -91,13 +101,16 @@ def communication_node(state: RetentionState) -> RetentionState:
         "product_context": state["product_context"],
         "knowledge": state.get("semantic_hits", []),
     }
-    response_text = generate_response(payload)
+    # Tokens go out on the "custom" stream as they arrive; `writer` is a no-op for plain ainvoke().
+    response_text = await agenerate_response(
+        payload, on_token=lambda token: writer({"token": token}), snapshot=_snapshot(config)
+    )
     if wants_email and "email_draft" not in response_text.lower():
         response_text = response_text + "\n\nemail_draft:\n(Provide the drafted email here.)"
     return {"response_text": response_text}
 
 
-def build_graph(trace_id: Optional[str] = None):
+def build_graph():
     graph = StateGraph(RetentionState)
     graph.add_node("attrition_node", attrition_node)
     graph.add_node("segmentation_node", segmentation_node)
@@ -109,8 +122,19 @@ def build_graph(trace_id: Optional[str] = None):
     graph.add_edge("segmentation_node", "rag_node")
     graph.add_edge("rag_node", "communication_node")
     graph.add_edge("communication_node", END)
-    compiled = graph.compile()
+    return graph.compile()
+
+
+# Compiled once per process; per-request tracing is supplied through the runtime config instead.
+# communication_node is async, so run it with ainvoke()/astream(); the sync nodes are executed in a thread pool.
+RETENTION_GRAPH = build_graph()
+
+
+def graph_config(trace_id: Optional[str] = None) -> Dict[str, Any]:
+    config: Dict[str, Any] = {"configurable": {"snapshot": SNAPSHOTS.current}}
+    if trace_id:
+        config["metadata"] = {"trace_id": trace_id}
     handler = get_langfuse_handler(trace_id=trace_id)
     if handler:
-        return compiled.with_config({"callbacks": [handler]})
-    return compiled
+        config["callbacks"] = [handler]
+    return config
@@ -0,0 +1,193 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from app.core.concurrency import run_sync
+from app.core.config import (
+    GUARD_BULK_CHUNK_SIZE,
+    GUARD_BULK_LLM_BATCH_SIZE,
+    GUARD_BULK_LLM_CONCURRENCY,
+    GUARD_BULK_LLM_TIMEOUT_SECONDS,
+    GUARD_BULK_WORKERS,
+)
+from app.guards.guardrails import (
+    SCANNER,
+    GuardrailResult,
+    apply_risk,
+    cached_verdict,
+    remember_verdict,
+    scan_pii,
+    verdict_key,
+)
+from app.guards.llm_guard import UNAVAILABLE_VERDICT, aclassify_risk_batch
+
+ScreenInput = Tuple[Any, str]
+CheapResult = Tuple[GuardrailResult, Dict[str, bool]]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _cheap_screen(texts: List[str]) -> List[CheapResult]:
+    """Regex and keyword stage for one chunk; runs in a worker process."""
+    return [(scan_pii(text), SCANNER.match_keywords(text)) for text in texts]
+
+
+def _worker_count() -> int:
+    return max(1, GUARD_BULK_WORKERS or os.cpu_count() or 1)
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    workers = _worker_count()
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked: the API process already runs scheduler, pool and queue threads.
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_bulk_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+async def _run_cheap_stage(chunks: List[List[str]]) -> List[List[CheapResult]]:
+    pool = _get_pool()
+    if pool is None:
+        return [await run_sync(_cheap_screen, chunk) for chunk in chunks]
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(loop.run_in_executor(pool, _cheap_screen, chunk) for chunk in chunks))
+
+
+async def _windows(items: AsyncIterator[ScreenInput], size: int) -> AsyncIterator[List[ScreenInput]]:
+    window: List[ScreenInput] = []
+    async for item in items:
+        window.append(item)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+class BulkScreening:
+    """Screens a stream of texts with the `/api/chat` guardrail policy.
+
+    Input is consumed in windows of one `GUARD_BULK_CHUNK_SIZE` chunk per worker process. Each window's
+    regex/keyword stage is split across the worker pool; texts that are already decided (keyword hit or
+    cached classifier verdict) are emitted straight away, and the rest are grouped into multi-message
+    classifier prompts, at most `GUARD_BULK_LLM_CONCURRENCY` in flight. Reading stops while too many
+    prompts are queued, so the in-flight work stays bounded however long the input is. (`/api/guardrails/screen`
+    still buffers the request body, capped by `GUARD_BULK_MAX_BODY_BYTES`/`GUARD_BULK_MAX_ITEMS`.) Results are
+    emitted in completion order and carry the input `index`.
+    """
+
+    def __init__(self) -> None:
+        self._semaphore = asyncio.Semaphore(max(1, GUARD_BULK_LLM_CONCURRENCY))
+        self._started = time.perf_counter()
+        self.summary: Dict[str, Any] = {
+            "items": 0,
+            "blocked": 0,
+            "redacted_items": 0,
+            "redactions": {},
+            "findings": {},
+            "cache_hits": 0,
+            "classified": 0,
+            "classifier_prompts": 0,
+        }
+
+    def _finish(self, index: int, item_id: Any, result: GuardrailResult) -> Dict[str, Any]:
+        summary = self.summary
+        summary["items"] += 1
+        summary["blocked"] += int(result.blocked)
+        if result.redactions:
+            summary["redacted_items"] += 1
+            for label, count in result.redactions.items():
+                summary["redactions"][label] = summary["redactions"].get(label, 0) + count
+        for finding in result.findings:
+            summary["findings"][finding] = summary["findings"].get(finding, 0) + 1
+        return {
+            "index": index,
+            "id": item_id,
+            "blocked": result.blocked,
+            "findings": result.findings,
+            "redactions": result.redactions,
+            "redacted_text": result.redacted_text,
+        }
+
+    async def _classify(self, batch: List[Tuple[int, Any, str, str, GuardrailResult]]) -> List[Dict[str, Any]]:
+        async with self._semaphore:
+            try:
+                verdicts = await asyncio.wait_for(
+                    aclassify_risk_batch([text for _, _, text, _, _ in batch]), GUARD_BULK_LLM_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                verdicts = [dict(UNAVAILABLE_VERDICT) for _ in batch]
+        self.summary["classifier_prompts"] += 1
+        self.summary["classified"] += len(batch)
+        return [
+            self._finish(index, item_id, apply_risk(result, False, False, remember_verdict(key, verdict)))
+            for (index, item_id, _, key, result), verdict in zip(batch, verdicts)
+        ]
+
+    async def run(self, items: AsyncIterator[ScreenInput]) -> AsyncIterator[Dict[str, Any]]:
+        chunk_size = max(1, GUARD_BULK_CHUNK_SIZE)
+        workers = _worker_count()
+        batch_size = max(1, GUARD_BULK_LLM_BATCH_SIZE)
+        max_queued = 2 * max(1, GUARD_BULK_LLM_CONCURRENCY)
+        tasks: Set[asyncio.Task] = set()
+        offset = 0
+        try:
+            async for window in _windows(items, chunk_size * workers):
+                texts = [text for _, text in window]
+                chunks = [texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)]
+                cheap = [entry for chunk in await _run_cheap_stage(chunks) for entry in chunk]
+
+                pending: List[Tuple[int, Any, str, str, GuardrailResult]] = []
+                for i, ((item_id, text), (result, keywords)) in enumerate(zip(window, cheap)):
+                    index = offset + i
+                    if keywords["jailbreak"] or keywords["threat"]:
+                        yield self._finish(index, item_id, apply_risk(result, keywords["jailbreak"], keywords["threat"], None))
+                        continue
+                    key = verdict_key(text)
+                    cached = cached_verdict(key)
+                    if cached is not None:
+                        self.summary["cache_hits"] += 1
+                        yield self._finish(index, item_id, apply_risk(result, False, False, cached))
+                        continue
+                    pending.append((index, item_id, text, key, result))
+                offset += len(window)
+
+                for start in range(0, len(pending), batch_size):
+                    tasks.add(asyncio.create_task(self._classify(pending[start : start + batch_size])))
+
+                # Emit whatever has finished; block on the classifier only when too much work is queued.
+                while tasks:
+                    done = {task for task in tasks if task.done()}
+                    if not done:
+                        if len(tasks) <= max_queued:
+                            break
+                        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        tasks.discard(task)
+                        for row in task.result():
+                            yield row
+
+            for task in asyncio.as_completed(tasks):
+                for row in await task:
+                    yield row
+            tasks.clear()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.summary["elapsed_seconds"] = round(time.perf_counter() - self._started, 3)
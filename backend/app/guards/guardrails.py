@@ -1,9 +1,23 @@
-import re
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
 from dataclasses import dataclass
-from typing import Dict, List
-
-from app.guards.llm_guard import classify_risk
+from typing import Dict, List, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import (
+    GUARD_CLASSIFIER_CONCURRENCY,
+    GUARD_LLM_FAIL_MODE,
+    GUARD_LLM_TIMEOUT_SECONDS,
+    GUARD_VERDICT_CACHE_MAX_ENTRIES,
+    GUARD_VERDICT_CACHE_TTL_SECONDS,
+)
+from app.guards.llm_guard import UNAVAILABLE_VERDICT, aclassify_risk, classify_risk
 from app.guards.policy import POLICIES
+from app.guards.scanner import GuardrailScanner
 
 JAILBREAK_KEYWORDS = [
     "ignore previous", "system prompt", "developer message", "bypass", "jailbreak",
@@ -23,55 +37,122 @@ class GuardrailResult:
     redactions: Dict[str, int]
 
 
+SCANNER = GuardrailScanner(POLICIES, {"jailbreak": JAILBREAK_KEYWORDS, "threat": THREAT_KEYWORDS})
+
+
 def detect_pii(text: str) -> List[str]:
-    hits = []
-    for policy in POLICIES:
-        if policy.pattern.search(text):
-            hits.append(policy.label)
-    return hits
+    return SCANNER.scan_pii(text)[0]
 
 
 def redact_pii(text: str) -> (str, Dict[str, int]):
-    redacted = text
-    counts: Dict[str, int] = {}
-    for policy in POLICIES:
-        matches = list(policy.pattern.finditer(redacted))
-        if matches:
-            counts[policy.label] = counts.get(policy.label, 0) + len(matches)
-            redacted = policy.pattern.sub(policy.replacement(""), redacted)
+    _, redacted, counts = SCANNER.scan_pii(text)
     return redacted, counts
 
 
 def detect_jailbreak(text: str) -> bool:
-    lower = text.lower()
-    return any(k in lower for k in JAILBREAK_KEYWORDS)
+    return SCANNER.match_keywords(text)["jailbreak"]
 
 
 def detect_threat(text: str) -> bool:
-    lower = text.lower()
-    return any(k in lower for k in THREAT_KEYWORDS)
+    return SCANNER.match_keywords(text)["threat"]
 
 
-def run_guardrails(text: str) -> GuardrailResult:
+_VERDICT_CACHE = TTLCache(GUARD_VERDICT_CACHE_TTL_SECONDS, GUARD_VERDICT_CACHE_MAX_ENTRIES)
+_CLASSIFIER_POOL = ThreadPoolExecutor(max_workers=max(1, GUARD_CLASSIFIER_CONCURRENCY), thread_name_prefix="guard-llm")
+# One slot per submitted call, released when the call finishes rather than when its caller gives up, so calls
+# that outlive GUARD_LLM_TIMEOUT_SECONDS can't pile up an unbounded queue behind a slow classifier.
+_CLASSIFIER_SLOTS = threading.BoundedSemaphore(max(1, GUARD_CLASSIFIER_CONCURRENCY))
+
+
+def verdict_key(text: str) -> str:
+    # Case and whitespace don't change the verdict, so "Top 10 at-risk customers " shares an entry.
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def remember_verdict(key: str, verdict: Dict[str, bool]) -> Dict[str, bool]:
+    if not verdict.get("unavailable"):
+        _VERDICT_CACHE.set(key, verdict)
+    return verdict
+
+
+def cached_verdict(key: str) -> Optional[Dict[str, bool]]:
+    return _VERDICT_CACHE.get(key)
+
+
+def verdict_cache_stats() -> Dict[str, float]:
+    return _VERDICT_CACHE.stats()
+
+
+def scan_pii(text: str) -> GuardrailResult:
     findings: Dict[str, List[str]] = {}
-    pii_hits = detect_pii(text)
+    pii_hits, redacted_text, redactions = SCANNER.scan_pii(text)
     if pii_hits:
         findings["pii"] = pii_hits
+    return GuardrailResult(blocked=False, redacted_text=redacted_text, findings=findings, redactions=redactions)
 
-    keyword_jailbreak = detect_jailbreak(text)
-    keyword_threat = detect_threat(text)
 
-    llm_risk = classify_risk(text)
+def apply_risk(
+    result: GuardrailResult, keyword_jailbreak: bool, keyword_threat: bool, llm_risk: Optional[Dict[str, bool]]
+) -> GuardrailResult:
+    findings = result.findings
+    llm_risk = llm_risk or {}
     if keyword_jailbreak or llm_risk.get("jailbreak"):
         findings["jailbreak"] = ["keyword" if keyword_jailbreak else "llm"]
     if keyword_threat or llm_risk.get("threat"):
         findings["threat"] = ["keyword" if keyword_threat else "llm"]
+    if llm_risk.get("unavailable") and GUARD_LLM_FAIL_MODE == "closed":
+        findings["classifier"] = ["unavailable"]
+    result.blocked = "threat" in findings or "jailbreak" in findings or "classifier" in findings
+    return result
 
-    blocked = "threat" in findings or "jailbreak" in findings
-    redacted_text, redactions = redact_pii(text)
-    return GuardrailResult(
-        blocked=blocked,
-        redacted_text=redacted_text,
-        findings=findings,
-        redactions=redactions,
-    )
+
+def run_guardrails(text: str) -> GuardrailResult:
+    keywords = SCANNER.match_keywords(text)
+    keyword_jailbreak, keyword_threat = keywords["jailbreak"], keywords["threat"]
+    if keyword_jailbreak or keyword_threat:
+        # A keyword hit already blocks the request; the classifier can't change the outcome.
+        return apply_risk(scan_pii(text), keyword_jailbreak, keyword_threat, None)
+
+    key = verdict_key(text)
+    cached = cached_verdict(key)
+    if cached is not None:
+        return apply_risk(scan_pii(text), False, False, cached)
+
+    deadline = time.monotonic() + GUARD_LLM_TIMEOUT_SECONDS
+    if not _CLASSIFIER_SLOTS.acquire(timeout=GUARD_LLM_TIMEOUT_SECONDS):
+        return apply_risk(scan_pii(text), False, False, dict(UNAVAILABLE_VERDICT))
+    try:
+        future = _CLASSIFIER_POOL.submit(classify_risk, text)
+    except BaseException:
+        _CLASSIFIER_SLOTS.release()
+        raise
+    future.add_done_callback(lambda _: _CLASSIFIER_SLOTS.release())
+    result = scan_pii(text)
+    try:
+        verdict = remember_verdict(key, future.result(timeout=max(0.0, deadline - time.monotonic())))
+    except FuturesTimeout:
+        verdict = dict(UNAVAILABLE_VERDICT)
+    return apply_risk(result, False, False, verdict)
+
+
+async def arun_guardrails(text: str) -> GuardrailResult:
+    keywords = SCANNER.match_keywords(text)
+    keyword_jailbreak, keyword_threat = keywords["jailbreak"], keywords["threat"]
+    if keyword_jailbreak or keyword_threat:
+        return apply_risk(scan_pii(text), keyword_jailbreak, keyword_threat, None)
+
+    key = verdict_key(text)
+    cached = cached_verdict(key)
+    if cached is not None:
+        return apply_risk(scan_pii(text), False, False, cached)
+
+    task = asyncio.create_task(aclassify_risk(text))
+    # Yield once so the classifier request is on the wire before the PII scan runs.
+    await asyncio.sleep(0)
+    result = scan_pii(text)
+    try:
+        verdict = remember_verdict(key, await asyncio.wait_for(task, GUARD_LLM_TIMEOUT_SECONDS))
+    except asyncio.TimeoutError:
+        verdict = dict(UNAVAILABLE_VERDICT)
+    return apply_risk(result, False, False, verdict)
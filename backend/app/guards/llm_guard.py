@@ -1,22 +1,70 @@
 import json
-from typing import Dict
+from typing import Dict, List
 
 from app.core.llm import get_chat_llm
 
+# Returned when the model can't be reached or answers with something unparseable; the guardrail
+# layer decides whether that fails open or closed.
+UNAVAILABLE_VERDICT = {"jailbreak": False, "threat": False, "unavailable": True}
 
-def classify_risk(text: str) -> Dict[str, bool]:
-    prompt = (
+
+def _risk_prompt(text: str) -> str:
+    return (
         "Classify the user message for security risks.\n"
         "Return JSON with keys: jailbreak (true/false), threat (true/false).\n"
         f"Message: {text}"
     )
+
+
+def _parse_verdict(response) -> Dict[str, bool]:
+    content = response.content if hasattr(response, "content") else str(response)
+    payload = json.loads(content.strip())
+    return {
+        "jailbreak": bool(payload.get("jailbreak")),
+        "threat": bool(payload.get("threat")),
+    }
+
+
+def classify_risk(text: str) -> Dict[str, bool]:
+    try:
+        return _parse_verdict(get_chat_llm().invoke(_risk_prompt(text)))
+    except Exception:
+        return dict(UNAVAILABLE_VERDICT)
+
+
+async def aclassify_risk(text: str) -> Dict[str, bool]:
+    try:
+        return _parse_verdict(await get_chat_llm().ainvoke(_risk_prompt(text)))
+    except Exception:
+        return dict(UNAVAILABLE_VERDICT)
+
+
+def _batch_risk_prompt(texts: List[str]) -> str:
+    numbered = "\n".join(f"{i}: {json.dumps(text)}" for i, text in enumerate(texts))
+    return (
+        "Classify each numbered user message for security risks.\n"
+        "Return a JSON array with one object per message: "
+        '{"id": <number>, "jailbreak": true/false, "threat": true/false}.\n'
+        f"Messages:\n{numbered}"
+    )
+
+
+def _parse_batch_verdicts(response, count: int) -> List[Dict[str, bool]]:
+    content = response.content if hasattr(response, "content") else str(response)
+    verdicts = [dict(UNAVAILABLE_VERDICT) for _ in range(count)]
+    # Messages the model skipped or numbered out of range stay unavailable rather than defaulting to safe.
+    for entry in json.loads(content.strip()):
+        index = entry.get("id") if isinstance(entry, dict) else None
+        if isinstance(index, int) and 0 <= index < count:
+            verdicts[index] = {"jailbreak": bool(entry.get("jailbreak")), "threat": bool(entry.get("threat"))}
+    return verdicts
+
+
+async def aclassify_risk_batch(texts: List[str]) -> List[Dict[str, bool]]:
+    """Classify several messages with one prompt; one verdict per text, in order."""
+    if not texts:
+        return []
     try:
-        response = get_chat_llm().invoke(prompt)
-        content = response.content if hasattr(response, "content") else str(response)
-        payload = json.loads(content.strip())
-        return {
-            "jailbreak": bool(payload.get("jailbreak")),
-            "threat": bool(payload.get("threat")),
-        }
+        return _parse_batch_verdicts(await get_chat_llm().ainvoke(_batch_risk_prompt(texts)), len(texts))
     except Exception:
-        return {"jailbreak": False, "threat": False}
+        return [dict(UNAVAILABLE_VERDICT) for _ in texts]
@@ -8,27 +8,38 @@ class RedactionPolicy:
     label: str
     pattern: re.Pattern
     replacement: Callable[[str], str]
+    # The pattern can only match text containing at least one of these characters; lets the scanner
+    # skip the regex entirely for ordinary prose. Empty means "always run".
+    required_chars: str = ""
 
 
+DIGITS = "0123456789"
+
 POLICIES: List[RedactionPolicy] = [
     RedactionPolicy(
         label="email",
         pattern=re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"),
         replacement=lambda _: "[REDACTED_EMAIL]",
+        required_chars="@",
     ),
     RedactionPolicy(
         label="phone",
         pattern=re.compile(r"\b(?:\+?1[-.\s]?)?(?:\(?\d{3}\)?[-.\s]?)\d{3}[-.\s]?\d{4}\b"),
         replacement=lambda _: "[REDACTED_PHONE]",
+        required_chars=DIGITS,
     ),
     RedactionPolicy(
         label="ssn",
         pattern=re.compile(r"\b\d{3}-\d{2}-\d{4}\b"),
         replacement=lambda _: "[REDACTED_SSN]",
+        required_chars=DIGITS,
     ),
     RedactionPolicy(
         label="credit_card",
-        pattern=re.compile(r"\b(?:\d[ -]*?){13,16}\b"),
+        # Card layouts (4-4-4-1..4, Amex 4-6-5, or contiguous 13-16 digits) with fixed-width groups, so the
+        # engine can't backtrack through arbitrary digit/separator runs or swallow a neighbouring date or SSN.
+        pattern=re.compile(r"\b(?:\d{4}[ -]?\d{4}[ -]?\d{4}[ -]?\d{1,4}|\d{4}[ -]?\d{6}[ -]?\d{5})\b"),
         replacement=lambda _: "[REDACTED_CARD]",
+        required_chars=DIGITS,
     ),
 ]
@@ -0,0 +1,75 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from app.guards.policy import RedactionPolicy
+
+
+@dataclass
+class ScanResult:
+    pii_labels: List[str]
+    redacted_text: str
+    redactions: Dict[str, int]
+    keywords: Dict[str, bool]
+
+
+class GuardrailScanner:
+    """Compiled PII and keyword scanner.
+
+    All PII policies are merged into one alternation with a named group per label, so a single `sub()`
+    pass both finds every span and writes the redacted text; alternatives are tried in policy order.
+    Policies whose `required_chars` don't occur in the text are left out of the pattern (compiled
+    variants are memoised per active-policy set), so plain prose never enters the regex engine.
+
+    Keyword sets share one lower-cased copy of the text and stop at the first hit per category.
+    CPython's substring search beats both `re` alternations and a pure-Python Aho-Corasick automaton
+    for keyword lists of this size, so it is used for the keyword side.
+    """
+
+    def __init__(self, policies: Sequence[RedactionPolicy], keyword_sets: Dict[str, Sequence[str]]):
+        self.policies = list(policies)
+        self.keyword_sets = {category: tuple(k.lower() for k in words) for category, words in keyword_sets.items()}
+        self._replacements = {p.label: p.replacement("") for p in self.policies}
+        self._compiled: Dict[Tuple[str, ...], re.Pattern] = {}
+
+    def _pattern_for(self, labels: Tuple[str, ...]) -> re.Pattern:
+        pattern = self._compiled.get(labels)
+        if pattern is None:
+            by_label = {p.label: p for p in self.policies}
+            pattern = re.compile("|".join(f"(?P<{label}>{by_label[label].pattern.pattern})" for label in labels))
+            self._compiled[labels] = pattern
+        return pattern
+
+    def _active_labels(self, text: str) -> Tuple[str, ...]:
+        present: Dict[str, bool] = {}
+
+        def has_any(chars: str) -> bool:
+            if chars not in present:
+                present[chars] = any(c in text for c in chars)
+            return present[chars]
+
+        return tuple(p.label for p in self.policies if not p.required_chars or has_any(p.required_chars))
+
+    def scan_pii(self, text: str) -> Tuple[List[str], str, Dict[str, int]]:
+        """Return (labels found, redacted text, per-label counts) from one pass over `text`."""
+        labels = self._active_labels(text)
+        if not labels:
+            return [], text, {}
+        counts: Dict[str, int] = {}
+
+        def replace(match: re.Match) -> str:
+            label = match.lastgroup
+            counts[label] = counts.get(label, 0) + 1
+            return self._replacements[label]
+
+        redacted = self._pattern_for(labels).sub(replace, text)
+        found = [p.label for p in self.policies if p.label in counts]
+        return found, redacted, {label: counts[label] for label in found}
+
+    def match_keywords(self, text: str) -> Dict[str, bool]:
+        lower = text.lower()
+        return {category: any(k in lower for k in words) for category, words in self.keyword_sets.items()}
+
+    def scan(self, text: str) -> ScanResult:
+        labels, redacted, counts = self.scan_pii(text)
+        return ScanResult(pii_labels=labels, redacted_text=redacted, redactions=counts, keywords=self.match_keywords(text))
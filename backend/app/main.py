@@ -1,23 +1,58 @@
+import logging
 from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from app.api.routes import router
-from app.core.config import EVAL_BATCH_WINDOW_MINUTES
-from app.db import init_db
+from app.core.concurrency import run_sync
+from app.core.config import (
+    CHURN_RESCORE_INTERVAL_SECONDS,
+    CHURN_SCORING_ENABLED,
+    DATA_RELOAD_INTERVAL_SECONDS,
+    DB_WRITE_BEHIND,
+    EVAL_BATCH_WINDOW_MINUTES,
+)
+from app.data.snapshot import SNAPSHOTS
+from app.db import close_pool, init_db, open_pool, start_write_behind, stop_write_behind
 from app.evaluations.batch import run_eval_batch
+from app.guards.bulk import shutdown_bulk_pool
 
+logger = logging.getLogger(__name__)
 scheduler = BackgroundScheduler()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    open_pool()
     init_db()
-    scheduler.add_job(run_eval_batch, "interval", minutes=EVAL_BATCH_WINDOW_MINUTES, id="eval_batch")
+    if DB_WRITE_BEHIND:
+        start_write_behind()
+    try:
+        # Load the data snapshot, cached embeddings and the persisted ANN index before the first request arrives.
+        await run_sync(SNAPSHOTS.warm)
+    except Exception:
+        logger.warning("semantic index warm-up failed; it will be built on first search", exc_info=True)
+    # A run that outlasts its interval delays the next one instead of overlapping it; missed ticks collapse into one.
+    scheduler.add_job(
+        run_eval_batch, "interval", minutes=EVAL_BATCH_WINDOW_MINUTES, id="eval_batch", max_instances=1, coalesce=True
+    )
+    if DATA_RELOAD_INTERVAL_SECONDS > 0:
+        scheduler.add_job(
+            SNAPSHOTS.refresh, "interval", seconds=DATA_RELOAD_INTERVAL_SECONDS, id="data_reload", max_instances=1, coalesce=True
+        )
+    if CHURN_SCORING_ENABLED and CHURN_RESCORE_INTERVAL_SECONDS > 0:
+        scheduler.add_job(
+            SNAPSHOTS.rescore, "interval", seconds=CHURN_RESCORE_INTERVAL_SECONDS, id="churn_rescore", max_instances=1, coalesce=True
+        )
     scheduler.start()
     yield
     scheduler.shutdown()
+    shutdown_bulk_pool()
+    # Drain queued rows before the pool goes away.
+    stop_write_behind()
+    close_pool()
 
 
 app = FastAPI(title="Retention Intelligence Assistant", lifespan=lifespan)
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+SearchResult = Tuple[np.ndarray, np.ndarray]
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.clip(norms, 1e-6, None)).astype(np.float32, copy=False)
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the `top_k` highest scores along the last axis, best first.
+
+    Uses a partial selection (O(n)) and only sorts the k survivors.
+    """
+    n = scores.shape[-1]
+    k = min(top_k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+def _empty_result(n_queries: int) -> SearchResult:
+    return np.empty((n_queries, 0), dtype=np.intp), np.empty((n_queries, 0), dtype=np.float32)
+
+
+def _pad(rows: List[np.ndarray], scores: List[np.ndarray], top_k: int) -> SearchResult:
+    """Stack ragged per-query results; rows with fewer than top_k hits are padded with -1."""
+    width = min(top_k, max((len(r) for r in rows), default=0))
+    idx = np.full((len(rows), width), -1, dtype=np.intp)
+    out = np.full((len(rows), width), -np.inf, dtype=np.float32)
+    for i, (r, s) in enumerate(zip(rows, scores)):
+        idx[i, : len(r)] = r
+        out[i, : len(s)] = s
+    return idx, out
+
+
+class ExactBackend:
+    """Brute-force cosine scan over every (allowed) row."""
+
+    name = "exact"
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    def search(self, queries: np.ndarray, top_k: int, allowed: Optional[np.ndarray] = None) -> SearchResult:
+        if allowed is None:
+            scores = queries @ self.matrix.T
+            idx = top_k_indices(scores, top_k)
+            return idx, np.take_along_axis(scores, idx, axis=-1)
+        rows = np.flatnonzero(allowed)
+        if rows.size == 0:
+            return _empty_result(len(queries))
+        scores = queries @ self.matrix[rows].T
+        local = top_k_indices(scores, top_k)
+        return rows[local], np.take_along_axis(scores, local, axis=-1)
+
+
+class IVFBackend:
+    """Inverted-file index: spherical k-means coarse quantizer plus exact re-scoring of probed lists.
+
+    `nlist` controls how finely the corpus is partitioned and `nprobe` how many partitions are scanned
+    per query; raising `nprobe` trades latency for recall (nprobe == nlist is an exact scan).
+    """
+
+    name = "ivf"
+
+    def __init__(self, matrix: np.ndarray, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray, nprobe: int):
+        self.matrix = matrix
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int, nprobe: int, iterations: int = 10, seed: int = 0) -> "IVFBackend":
+        n = len(matrix)
+        nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+        rng = np.random.default_rng(seed)
+        # Train on a bounded sample (the usual ~256 points per centroid) so build time stays flat as the corpus grows.
+        sample = matrix[rng.choice(n, size=min(n, nlist * 256), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assign, minlength=nlist)
+            order = np.argsort(assign, kind="stable")
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums = np.zeros_like(centroids)
+            filled = counts > 0
+            sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+            empty = ~filled
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = (sums / np.clip(norms, 1e-6, None)).astype(np.float32)
+
+        return cls.assign(matrix, centroids, nprobe)
+
+    @classmethod
+    def assign(cls, matrix: np.ndarray, centroids: np.ndarray, nprobe: int) -> "IVFBackend":
+        """File every row under its nearest existing centroid (no re-training)."""
+        n = len(matrix)
+        assign = np.empty(n, dtype=np.intp)
+        for start in range(0, n, 65536):
+            assign[start : start + 65536] = np.argmax(matrix[start : start + 65536] @ centroids.T, axis=1)
+        list_rows = np.argsort(assign, kind="stable")
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))])
+        return cls(matrix, centroids, list_offsets, list_rows, nprobe)
+
+    def search(self, queries: np.ndarray, top_k: int, allowed: Optional[np.ndarray] = None) -> SearchResult:
+        """Top-k per query from the `nprobe` nearest lists.
+
+        With an `allowed` mask, a filter no larger than the rows a probe would scan is searched exactly, and a
+        query whose probed lists hold fewer than `top_k` allowed rows is re-scanned exactly over all of them,
+        so a selective filter never comes back short.
+        """
+        nprobe = min(self.nprobe, self.nlist)
+        if allowed is not None:
+            allowed_rows = np.flatnonzero(allowed)
+            if allowed_rows.size <= nprobe * len(self.matrix) / self.nlist:
+                return ExactBackend(self.matrix).search(queries, top_k, allowed)
+        probes = top_k_indices(queries @ self.centroids.T, nprobe)
+        all_rows: List[np.ndarray] = []
+        all_scores: List[np.ndarray] = []
+        for query, lists in zip(queries, probes):
+            rows = np.concatenate([self.list_rows[self.list_offsets[c] : self.list_offsets[c + 1]] for c in lists])
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            if rows.size == 0:
+                all_rows.append(rows)
+                all_scores.append(np.empty(0, dtype=np.float32))
+                continue
+            scores = self.matrix[rows] @ query
+            local = top_k_indices(scores, top_k)
+            all_rows.append(rows[local])
+            all_scores.append(scores[local])
+        if allowed is not None:
+            short = [i for i, rows in enumerate(all_rows) if len(rows) < min(top_k, allowed_rows.size)]
+            if short:
+                idx, scores = ExactBackend(self.matrix).search(queries[short], top_k, allowed)
+                for i, row_idx, row_scores in zip(short, idx, scores):
+                    all_rows[i], all_scores[i] = row_idx, row_scores
+        return _pad(all_rows, all_scores, top_k)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp.npz")
+        np.savez(tmp, centroids=self.centroids, list_offsets=self.list_offsets, list_rows=self.list_rows)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, matrix: np.ndarray, nprobe: int) -> "IVFBackend":
+        with np.load(path) as data:
+            return cls(matrix, data["centroids"], data["list_offsets"], data["list_rows"], nprobe)
+
+
+def corpus_fingerprint(model: str, texts: List[str], params: str) -> str:
+    digest = hashlib.sha256(f"{model}\0{params}".encode("utf-8"))
+    for text in texts:
+        digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+    return digest.hexdigest()[:24]
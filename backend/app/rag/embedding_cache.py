@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import EMBED_CACHE_DIR, EMBED_CACHE_ENABLED, OLLAMA_EMBED_MODEL
+
+EmbedFn = Callable[[List[str]], np.ndarray]
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding store shared by every worker on the host.
+
+    Vectors for one embed model live in segments: `<model>.<id>.npy` (memory-mapped read-only) plus a parallel
+    `<model>.<id>.keys.json` listing the sha256 of each row's text. `<model>.segments.json` names the live
+    segments in order. A write adds one segment holding only the new rows and then swaps the manifest, so
+    existing files are never rewritten. To keep lookups from fanning out over many small segments, a new
+    segment at least half the size of the one before it is merged with it (and repeatedly), so every row is
+    rewritten O(log n) times over the cache's life. Writes from different processes are serialised with a lock
+    file; readers that still map a merged-away segment keep a valid view.
+    """
+
+    def __init__(self, directory: Path, model: str):
+        self.slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+        self.directory = Path(directory)
+        self.model = model
+        self.manifest_path = self.directory / f"{self.slug}.segments.json"
+        self.lock_path = self.directory / f"{self.slug}.lock"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._segments: List[Tuple[str, np.ndarray, List[str]]] = []
+        self._row_by_key: Dict[str, Tuple[int, int]] = {}
+        try:
+            self._load()
+        except FileNotFoundError:
+            # A writer merged segments between reading the manifest and opening them.
+            with self._file_lock():
+                self._load()
+
+    def _segment_paths(self, name: str) -> Tuple[Path, Path]:
+        return self.directory / f"{name}.npy", self.directory / f"{name}.keys.json"
+
+    def _manifest(self) -> List[str]:
+        if self.manifest_path.exists():
+            return json.loads(self.manifest_path.read_text())
+        # Caches written before segments existed are a single `<model>.npy` / `<model>.keys.json` pair.
+        vectors_path, keys_path = self._segment_paths(self.slug)
+        return [self.slug] if vectors_path.exists() and keys_path.exists() else []
+
+    def _load(self) -> None:
+        segments: List[Tuple[str, np.ndarray, List[str]]] = []
+        row_by_key: Dict[str, Tuple[int, int]] = {}
+        for name in self._manifest():
+            vectors_path, keys_path = self._segment_paths(name)
+            keys = json.loads(keys_path.read_text())
+            vectors = np.load(vectors_path, mmap_mode="r")
+            keys = keys[: vectors.shape[0]]
+            for row, key in enumerate(keys):
+                row_by_key.setdefault(key, (len(segments), row))
+            segments.append((name, vectors, keys))
+        self._segments = segments
+        self._row_by_key = row_by_key
+
+    @contextmanager
+    def _file_lock(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _write_segment(self, keys: List[str], vectors: np.ndarray) -> str:
+        name = f"{self.slug}.{uuid.uuid4().hex[:12]}"
+        vectors_path, keys_path = self._segment_paths(name)
+        tmp_vectors = vectors_path.with_suffix(f".{os.getpid()}.tmp.npy")
+        tmp_keys = keys_path.with_suffix(f".{os.getpid()}.tmp")
+        np.save(tmp_vectors, vectors)
+        tmp_keys.write_text(json.dumps(keys))
+        os.replace(tmp_vectors, vectors_path)
+        os.replace(tmp_keys, keys_path)
+        return name
+
+    def _write_manifest(self, names: List[str]) -> None:
+        tmp = self.manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(names))
+        os.replace(tmp, self.manifest_path)
+
+    def _append(self, keys: List[str], vectors: np.ndarray) -> None:
+        with self._file_lock():
+            # Another worker may have appended since we last looked; only add what is still missing.
+            self._load()
+            fresh = [i for i, key in enumerate(keys) if key not in self._row_by_key]
+            if not fresh:
+                return
+            segments = [(name, len(segment_keys)) for name, _, segment_keys in self._segments]
+            tail_keys = [keys[i] for i in fresh]
+            tail_vectors = vectors[fresh].astype(np.float32)
+            merged: List[str] = []
+            while segments and 2 * len(tail_keys) >= segments[-1][1]:
+                name, _ = segments.pop()
+                _, segment_vectors, segment_keys = self._segments[len(segments)]
+                tail_keys = segment_keys + tail_keys
+                tail_vectors = np.vstack([np.asarray(segment_vectors), tail_vectors])
+                merged.append(name)
+            names = [name for name, _ in segments] + [self._write_segment(tail_keys, tail_vectors)]
+            self._write_manifest(names)
+            for name in merged:
+                for path in self._segment_paths(name):
+                    path.unlink(missing_ok=True)
+            self._load()
+
+    def get_many(self, texts: List[str], embed: EmbedFn) -> np.ndarray:
+        """Return one vector per text, embedding only texts whose hash is not cached yet."""
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in self._row_by_key and key not in missing:
+                    missing[key] = text
+            miss_count = sum(1 for key in keys if key in missing)
+            self.misses += miss_count
+            self.hits += len(keys) - miss_count
+            if missing:
+                missing_keys = list(missing)
+                self._append(missing_keys, embed([missing[key] for key in missing_keys]))
+            locations = np.array([self._row_by_key[key] for key in keys], dtype=np.intp).reshape(-1, 2)
+            dim = self._segments[0][1].shape[1] if self._segments else 0
+            out = np.empty((len(keys), dim), dtype=np.float32)
+            for index, (_, vectors, _) in enumerate(self._segments):
+                picks = locations[:, 0] == index
+                if picks.any():
+                    # Fancy indexing copies the rows out of the memory map.
+                    out[picks] = vectors[locations[picks, 1]]
+            return out
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._row_by_key),
+            "segments": len(self._segments),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_default_cache: Optional[EmbeddingCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    global _default_cache
+    if not EMBED_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache(Path(EMBED_CACHE_DIR), OLLAMA_EMBED_MODEL)
+    return _default_cache
@@ -1,12 +1,24 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple
+import copy
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 from langchain_ollama import OllamaEmbeddings
 
-from app.core.config import OLLAMA_BASE_URL, OLLAMA_EMBED_MODEL
+from app.core.config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_EMBED_MODEL,
+    RAG_ANN_MIN_ITEMS,
+    RAG_INDEX_BACKEND,
+    RAG_INDEX_DIR,
+    RAG_IVF_NLIST,
+    RAG_IVF_NPROBE,
+)
+from app.rag.ann import ExactBackend, IVFBackend, corpus_fingerprint, normalize_rows
+from app.rag.embedding_cache import EmbeddingCache, get_embedding_cache
 
 
 @dataclass
@@ -16,26 +28,192 @@ class CorpusItem:
     payload: Dict[str, Any]
 
 
+def cosine_top_k(matrix: np.ndarray, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Score a batch of queries against an L2-normalized corpus matrix with one matrix multiply."""
+    return ExactBackend(matrix).search(normalize_rows(np.atleast_2d(queries)), top_k)
+
+
+def _matches(field: Any, value: Any) -> bool:
+    if isinstance(field, (list, tuple, set)):
+        return value in field
+    return field == value
+
+
+@dataclass
+class _IndexState:
+    """Everything a search reads. Never mutated after publication; updates build and swap a new one."""
+
+    items: List[CorpusItem]
+    matrix: np.ndarray
+    backend: Any
+    row_by_id: Dict[str, int]
+    masks: Dict[Tuple[str, str], np.ndarray] = field(default_factory=dict)
+
+
 class SemanticIndex:
-    def __init__(self, items: List[CorpusItem]):
-        self.items = items
-        self._embeddings = None
+    def __init__(self, items: List[CorpusItem], cache: Optional[EmbeddingCache] = None, backend: Optional[str] = None):
+        self._pending_items = items
+        self._state: Optional[_IndexState] = None
         self._model = OllamaEmbeddings(model=OLLAMA_EMBED_MODEL, base_url=OLLAMA_BASE_URL)
+        self._cache = cache if cache is not None else get_embedding_cache()
+        self._backend_name = backend or RAG_INDEX_BACKEND
+        self._write_lock = threading.Lock()
+
+    @property
+    def items(self) -> List[CorpusItem]:
+        state = self._state
+        return state.items if state is not None else self._pending_items
 
     def _embed(self, texts: List[str]) -> np.ndarray:
         vectors = self._model.embed_documents(texts)
         return np.array(vectors, dtype=np.float32)
 
-    def _ensure_embeddings(self):
-        if self._embeddings is None:
-            self._embeddings = self._embed([item.text for item in self.items])
+    def _embed_corpus(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if self._cache is not None:
+            vectors = self._cache.get_many(texts, self._embed)
+        else:
+            vectors = self._embed(texts)
+        # Stored pre-normalized so a query is a single dot product per corpus row.
+        return normalize_rows(vectors)
 
-    def search(self, query: str, top_k: int = 3) -> List[Tuple[CorpusItem, float]]:
-        if not self.items:
-            return []
+    def _ensure_embeddings(self) -> _IndexState:
+        state = self._state
+        if state is not None:
+            return state
+        with self._write_lock:
+            if self._state is None:
+                items = self._pending_items
+                matrix = self._embed_corpus([item.text for item in items])
+                self._state = self._make_state(items, matrix, previous=None)
+            return self._state
+
+    def _make_state(self, items: List[CorpusItem], matrix: np.ndarray, previous: Optional[_IndexState]) -> _IndexState:
+        return _IndexState(
+            items=items,
+            matrix=matrix,
+            backend=self._build_backend(items, matrix, previous),
+            row_by_id={item.id: i for i, item in enumerate(items)},
+        )
+
+    def _build_backend(self, items: List[CorpusItem], matrix: np.ndarray, previous: Optional[_IndexState]):
+        # Small corpora are faster to scan exactly than to probe.
+        if self._backend_name != "ivf" or len(items) < RAG_ANN_MIN_ITEMS:
+            return ExactBackend(matrix)
+        if previous is not None and isinstance(previous.backend, IVFBackend):
+            # Incremental updates keep the trained centroids and only re-file rows into lists. The corpus they
+            # index lives in this process only, so the result is not written to disk.
+            return IVFBackend.assign(matrix, previous.backend.centroids, RAG_IVF_NPROBE)
+        fingerprint = corpus_fingerprint(OLLAMA_EMBED_MODEL, [item.text for item in items], f"ivf:{RAG_IVF_NLIST}")
+        path = RAG_INDEX_DIR / f"ivf-{fingerprint}.npz"
+        if path.exists():
+            return IVFBackend.load(path, matrix, RAG_IVF_NPROBE)
+        backend = IVFBackend.build(matrix, RAG_IVF_NLIST, RAG_IVF_NPROBE)
+        backend.save(path)
+        # Indexes for earlier versions of the corpus files are never loaded again.
+        for stale in RAG_INDEX_DIR.glob("ivf-*.npz"):
+            if stale != path and ".tmp." not in stale.name:
+                stale.unlink(missing_ok=True)
+        return backend
+
+    def warm(self) -> None:
+        """Embed the corpus and load (or build) the search backend ahead of the first query."""
         self._ensure_embeddings()
-        query_vec = self._embed([query])[0]
-        denom = np.linalg.norm(self._embeddings, axis=1) * np.linalg.norm(query_vec)
-        scores = np.dot(self._embeddings, query_vec) / np.clip(denom, 1e-6, None)
-        ranked_idx = np.argsort(scores)[::-1][:top_k]
-        return [(self.items[i], float(scores[i])) for i in ranked_idx]
+
+    def with_changes(self, items: List[CorpusItem], delete_ids: Iterable[str] = ()) -> Tuple[SemanticIndex, Dict[str, int]]:
+        """A new index with `delete_ids` removed and `items` added or replaced by id; this one is left untouched.
+
+        Searches still holding this index keep seeing the old corpus. Rows whose text is unchanged share their
+        vectors with this index, so only new or edited text is embedded.
+        """
+        drop = set(delete_ids)
+        current = self._state
+        base = current.items if current is not None else self._pending_items
+        merged = {item.id: item for item in base if item.id not in drop}
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "deleted": len(base) - len(merged)}
+        for item in items:
+            previous = merged.get(item.id)
+            if previous is None:
+                counts["added"] += 1
+            elif previous.text == item.text and previous.payload == item.payload:
+                counts["unchanged"] += 1
+                continue
+            else:
+                counts["updated"] += 1
+            merged[item.id] = item
+        index = copy.copy(self)
+        index._write_lock = threading.Lock()
+        index._pending_items = list(merged.values())
+        # Nothing embedded yet: the first search on the new index embeds the merged corpus.
+        index._state = self._changed_state(index._pending_items, current) if current is not None else None
+        return index, counts
+
+    def _changed_state(self, items: List[CorpusItem], current: _IndexState) -> _IndexState:
+        """Build the state for `items`, reusing `current`'s rows whose text is unchanged."""
+        reuse: List[int] = []
+        fresh: List[int] = []
+        for i, item in enumerate(items):
+            row = current.row_by_id.get(item.id)
+            if row is not None and current.items[row].text == item.text:
+                reuse.append(i)
+            else:
+                fresh.append(i)
+        old_matrix = current.matrix
+        dim = old_matrix.shape[1] if old_matrix.size else 0
+        new_vectors = self._embed_corpus([items[i].text for i in fresh])
+        if not dim and new_vectors.size:
+            dim = new_vectors.shape[1]
+        matrix = np.empty((len(items), dim), dtype=np.float32)
+        if reuse:
+            matrix[reuse] = old_matrix[[current.row_by_id[items[i].id] for i in reuse]]
+        if fresh:
+            matrix[fresh] = new_vectors
+        return self._make_state(items, matrix, previous=current)
+
+    def _allowed(self, state: _IndexState, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Boolean row mask for metadata equality filters; list-valued payload fields match on membership."""
+        if not where:
+            return None
+        mask = np.ones(len(state.items), dtype=bool)
+        for key, value in where.items():
+            cache_key = (key, repr(value))
+            clause = state.masks.get(cache_key)
+            if clause is None:
+                clause = np.fromiter(
+                    (_matches(item.payload.get(key), value) for item in state.items), dtype=bool, count=len(state.items)
+                )
+                state.masks[cache_key] = clause
+            mask &= clause
+        return mask
+
+    def cache_stats(self) -> Dict[str, Any]:
+        if self._cache is None:
+            return {"enabled": False}
+        return {"enabled": True, "model": self._cache.model, **self._cache.stats()}
+
+    def backend_name(self) -> str:
+        state = self._state
+        return state.backend.name if state is not None else self._backend_name
+
+    def search(self, query: str, top_k: int = 3, where: Optional[Dict[str, Any]] = None) -> List[Tuple[CorpusItem, float]]:
+        return self.search_many([query], top_k=top_k, where=where)[0]
+
+    def search_many(
+        self, queries: List[str], top_k: int = 3, where: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[CorpusItem, float]]]:
+        """Embed all queries in one round-trip and score them together.
+
+        `where` pre-filters the corpus on payload metadata (e.g. `{"type": "offer"}`) before scoring.
+        """
+        if not queries:
+            return []
+        if not self.items:
+            return [[] for _ in queries]
+        state = self._ensure_embeddings()
+        query_vectors = normalize_rows(self._embed(queries))
+        idx, scores = state.backend.search(query_vectors, top_k, self._allowed(state, where))
+        return [
+            [(state.items[i], float(score)) for i, score in zip(row_idx, row_scores) if i >= 0]
+            for row_idx, row_scores in zip(idx, scores)
+        ]
@@ -6,14 +6,21 @@ from langfuse.langchain import CallbackHandler
 from app.core.config import LANGFUSE_HOST, LANGFUSE_PUBLIC_KEY, LANGFUSE_SECRET_KEY
 
 
+_client: Optional[Langfuse] = None
+
+
 def get_langfuse() -> Optional[Langfuse]:
+    global _client
     if not LANGFUSE_PUBLIC_KEY or not LANGFUSE_SECRET_KEY:
         return None
-    return Langfuse(
-        public_key=LANGFUSE_PUBLIC_KEY,
-        secret_key=LANGFUSE_SECRET_KEY,
-        host=LANGFUSE_HOST,
-    )
+    # One client per process: it owns a background flush thread, so creating it per request is wasteful.
+    if _client is None:
+        _client = Langfuse(
+            public_key=LANGFUSE_PUBLIC_KEY,
+            secret_key=LANGFUSE_SECRET_KEY,
+            host=LANGFUSE_HOST,
+        )
+    return _client
 
 
 def start_trace(name: str, input_payload: Dict[str, Any]):
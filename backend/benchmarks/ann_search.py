@@ -0,0 +1,63 @@
+"""Recall@k and per-query latency of the IVF backend against the exact scan.
+
+    python -m benchmarks.ann_search --items 50000 --dim 768 --nprobe 1 4 8 16 32
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.rag.ann import ExactBackend, IVFBackend, normalize_rows
+
+
+def clustered_corpus(rng: np.random.Generator, items: int, dim: int, clusters: int) -> np.ndarray:
+    # Real document embeddings are clustered by topic; uniform noise would make any ANN look bad.
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size=items)
+    return normalize_rows(centers[labels] + 0.6 * rng.standard_normal((items, dim), dtype=np.float32))
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--filter-fraction", type=float, default=0.0, help="share of rows kept by a metadata pre-filter")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = clustered_corpus(rng, args.items, args.dim, args.clusters)
+    noise = 0.3 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    queries = normalize_rows(corpus[rng.integers(0, args.items, size=args.queries)] + noise)
+    allowed = rng.random(args.items) < args.filter_fraction if args.filter_fraction else None
+
+    exact = ExactBackend(corpus)
+    start = time.perf_counter()
+    truth, _ = exact.search(queries, args.top_k, allowed)
+    exact_ms = (time.perf_counter() - start) / args.queries * 1e3
+    print(f"exact scan: {exact_ms:.3f} ms/query over {args.items} items")
+
+    start = time.perf_counter()
+    ivf = IVFBackend.build(corpus, args.nlist, nprobe=1)
+    print(f"ivf build: {time.perf_counter() - start:.2f} s, nlist={ivf.nlist}")
+
+    print(f"{'nprobe':>7} {'recall@' + str(args.top_k):>10} {'ms/query':>10} {'speedup':>8}")
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        start = time.perf_counter()
+        found, _ = ivf.search(queries, args.top_k, allowed)
+        ivf_ms = (time.perf_counter() - start) / args.queries * 1e3
+        print(f"{nprobe:>7} {recall_at_k(truth, found):>10.3f} {ivf_ms:>10.3f} {exact_ms / ivf_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Throughput of POST /api/chat as the number of concurrent clients grows.
+
+Ollama, the embedding model and Postgres are replaced by in-process fakes with fixed latencies so the
+numbers reflect how well the request path overlaps waiting, not how fast the backends are. With a
+non-blocking path, throughput should scale roughly linearly with clients until the offload limit.
+Every client asks the same question, so the response cache is off unless `--response-cache` is given.
+
+    python -m benchmarks.chat_concurrency --clients 1 4 16 64 --llm-latency 0.2
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class FakeChatModel:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke(self, prompt):
+        time.sleep(self.latency)
+        return AIMessage(content='{"jailbreak": false, "threat": false}')
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return AIMessage(content='{"jailbreak": false, "threat": false}')
+
+    async def astream(self, prompt):
+        for part in ("retention_summary: ...\n", "offers: ...\n", "next_best_action: ..."):
+            await asyncio.sleep(self.latency / 3)
+            yield AIMessageChunk(content=part)
+
+
+def install_fakes(llm_latency: float, db_latency: float, embed_latency: float, response_cache: bool) -> None:
+    import app.agents.communication as communication
+    from app.agents.response_cache import RESPONSE_CACHE
+    import app.db as db
+    import app.guards.llm_guard as llm_guard
+    from app.data.snapshot import SNAPSHOTS
+
+    model = FakeChatModel(llm_latency)
+    communication.get_chat_llm = lambda: model
+    llm_guard.get_chat_llm = lambda: model
+
+    def fake_embed(texts):
+        time.sleep(embed_latency)
+        return np.random.default_rng(len(texts)).standard_normal((len(texts), 64)).astype(np.float32)
+
+    index = SNAPSHOTS.current.semantic_index
+    index._cache = None
+    index._embed = fake_embed
+    db._insert_rows = lambda rows: time.sleep(db_latency)
+    RESPONSE_CACHE.enabled = response_cache
+    RESPONSE_CACHE.shared = False
+
+
+async def run_level(app: FastAPI, clients: int, requests_per_client: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker() -> None:
+            for _ in range(requests_per_client):
+                response = await client.post("/api/chat", json={"message": "draft email", "customer_id": "CUST-1003"})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        return clients * requests_per_client / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--response-cache", action="store_true", help="serve repeated answers from the response cache")
+    args = parser.parse_args()
+
+    install_fakes(args.llm_latency, args.db_latency, args.embed_latency, args.response_cache)
+    from app.api.routes import router
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+
+    baseline = None
+    print(f"{'clients':>8} {'req/s':>8} {'scaling':>8}")
+    for clients in args.clients:
+        rps = asyncio.run(run_level(app, clients, args.requests_per_client))
+        baseline = baseline or rps
+        print(f"{clients:>8} {rps:>8.1f} {rps / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Churn scoring throughput: a per-row Python loop vs. the batched NumPy `score_book`, plus incremental rescoring.
+
+The per-row baseline is timed on a sample and extrapolated. "rescore" moves `--changed` customers within the
+existing ranking (`rescore_customers`) and checks the ranking matches a full re-sort.
+
+    python -m benchmarks.churn_scoring --sizes 1000000 10000000
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.agents.churn import MODEL, SIGNAL_COLUMNS, rescore_customers, score_book
+from app.data.store import CustomerStore
+from benchmarks.customer_store import PRODUCTS, REASONS, SEGMENTS
+
+
+def _time(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def make_signals(size: int, seed: int = 0) -> pd.DataFrame:
+    """Only the columns scoring and ranking touch, so 10M customers fit in a few GB."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "customer_id": [f"CUST-{i}" for i in range(1_000_000, 1_000_000 + size)],
+            "segment": pd.Categorical.from_codes(rng.integers(0, len(SEGMENTS), size), SEGMENTS),
+            "product": pd.Categorical.from_codes(rng.integers(0, len(PRODUCTS), size), PRODUCTS),
+            "tenure_months": rng.integers(1, 240, size),
+            "complaints_90d": rng.integers(0, 5, size),
+            "avg_balance": rng.integers(500, 400_000, size),
+            "last_login_days": rng.integers(0, 120, size),
+            "churn_risk_score": np.round(rng.random(size), 4),
+            "reason": pd.Categorical.from_codes(rng.integers(0, len(REASONS), size), REASONS),
+        }
+    )
+
+
+def per_row_score(record) -> float:
+    z = MODEL.bias + MODEL.tenure * math.log1p(max(record["tenure_months"], 0))
+    z += MODEL.complaints * min(max(record["complaints_90d"], 0), 5)
+    z += MODEL.balance * math.log10(1 + max(record["avg_balance"], 0))
+    z += MODEL.login * min(max(record["last_login_days"], 0), 180) / 30
+    return round(1 / (1 + math.exp(-z)), 4)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--sample", type=int, default=200_000, help="rows timed for the per-row baseline")
+    parser.add_argument("--changed", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'customers':>10} {'per-row (est.)':>15} {'batched':>9} {'rows/s':>12} {'speedup':>8} {'rescore':>9} {'same':>5}")
+    for size in args.sizes:
+        store = CustomerStore.from_frame(make_signals(size))
+        sample = make_signals(min(args.sample, size), seed=1)[list(SIGNAL_COLUMNS)].to_dict(orient="records")
+        row_time, _ = _time(lambda: [per_row_score(r) for r in sample], 1)
+        row_time *= size / len(sample)
+        book_time, scored = _time(lambda: score_book(store), args.repeat)
+
+        rng = np.random.default_rng(2)
+        changed = [f"CUST-{1_000_000 + i}" for i in rng.choice(size, min(args.changed, size), replace=False)]
+        rows = scored.rows_of(changed)
+        scored.columns["complaints_90d"][rows] = np.minimum(scored.columns["complaints_90d"][rows] + 2, 5)
+        rescore_time, rescored = _time(lambda: rescore_customers(scored, changed), args.repeat)
+        full = score_book(scored)
+        same = np.array_equal(rescored.top_at_risk_rows(size), full.top_at_risk_rows(size))
+        print(
+            f"{size:>10} {row_time:>14.2f}s {book_time:>8.2f}s {size / book_time:>12,.0f} "
+            f"{row_time / book_time:>7.0f}x {rescore_time:>8.3f}s {str(same):>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
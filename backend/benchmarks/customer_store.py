@@ -0,0 +1,126 @@
+"""Compare DataFrame lookups/ranking with the indexed CustomerStore as the book grows.
+
+Also times the one-off CSV -> column-file conversion, opening the memory-mapped store (what each worker
+pays at startup) against pd.read_csv, and queries on the mapped store.
+
+    python -m benchmarks.customer_store --sizes 10000 100000 1000000 5000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.agents.attrition import RANKED_COLUMNS
+from app.data.columnar import ensure_columnar
+from app.data.store import CATEGORY_COLUMNS, RISK_COLUMN, CustomerStore
+
+SEGMENTS = ["Mass Affluent", "High-Net-Worth", "New-to-Bank", "Service-Recovery"]
+PRODUCTS = ["Cash Back Mastercard", "Travel Rewards Visa", "Premier Checking", "High-Yield Savings"]
+REASONS = ["rewards_competitor", "fees", "service_issue", "rate_shopping", "relocation"]
+
+
+def make_book(size: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ids = np.char.add("CUST-", np.arange(1_000_000, 1_000_000 + size).astype(str))
+    return pd.DataFrame(
+        {
+            "customer_id": ids.astype(object),
+            "name": np.char.add("Customer ", np.arange(size).astype(str)).astype(object),
+            "email": np.char.add(ids, "@example.com").astype(object),
+            "segment": rng.choice(SEGMENTS, size),
+            "product": rng.choice(PRODUCTS, size),
+            "tenure_months": rng.integers(1, 240, size),
+            "complaints_90d": rng.integers(0, 5, size),
+            "avg_balance": rng.integers(500, 400_000, size),
+            "last_login_days": rng.integers(0, 120, size),
+            "churn_risk_score": np.round(rng.random(size), 4),
+            "reason": rng.choice(REASONS, size),
+        }
+    )
+
+
+def legacy_lookup(frame: pd.DataFrame, customer_id: str):
+    row = frame[frame["customer_id"] == customer_id]
+    return row.iloc[0].to_dict()
+
+
+def legacy_rank(frame: pd.DataFrame, top_n: int, segment=None):
+    if segment is not None:
+        frame = frame[frame["segment"] == segment]
+    return frame.sort_values(by="churn_risk_score", ascending=False).head(top_n)[RANKED_COLUMNS].to_dict(orient="records")
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    header = f"{'rows':>9} {'build':>9} {'lookup old/new':>20} {'top-N old/new':>20} {'top-N by segment old/new':>26}"
+    print(header)
+    rng = np.random.default_rng(1)
+    columnar = []
+    for size in args.sizes:
+        frame = make_book(size)
+        start = time.perf_counter()
+        store = CustomerStore.from_frame(frame)
+        build = time.perf_counter() - start
+
+        probe = frame["customer_id"].iloc[int(rng.integers(size))]
+        assert legacy_lookup(frame, probe) == store.get(probe)
+        expected = legacy_rank(frame, args.top_n)
+        got = store.top_at_risk(args.top_n, columns=RANKED_COLUMNS)
+        assert [r["churn_risk_score"] for r in expected] == [r["churn_risk_score"] for r in got], "ranking mismatch"
+
+        old_lookup = _time(lambda: legacy_lookup(frame, probe), args.repeat)
+        new_lookup = _time(lambda: store.get(probe), args.repeat)
+        old_top = _time(lambda: legacy_rank(frame, args.top_n), args.repeat)
+        new_top = _time(lambda: store.top_at_risk(args.top_n, columns=RANKED_COLUMNS), args.repeat)
+        old_seg = _time(lambda: legacy_rank(frame, args.top_n, "High-Net-Worth"), args.repeat)
+        new_seg = _time(lambda: store.top_at_risk(args.top_n, segment="High-Net-Worth", columns=RANKED_COLUMNS), args.repeat)
+        print(
+            f"{size:>9} {build:>8.2f}s "
+            f"{old_lookup * 1e3:>9.2f}/{new_lookup * 1e3:<8.4f}ms "
+            f"{old_top * 1e3:>9.2f}/{new_top * 1e3:<8.4f}ms "
+            f"{old_seg * 1e3:>13.2f}/{new_seg * 1e3:<10.3f}ms"
+        )
+        columnar.append((size, frame))
+
+    print(f"\n{'rows':>9} {'read_csv':>9} {'convert':>9} {'mmap open':>10} {'mmap lookup':>12} {'mmap top-N':>11}")
+    for size, frame in columnar:
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = Path(tmp) / "customers.csv"
+            frame.to_csv(csv_path, index=False)
+            read_csv = _time(lambda: pd.read_csv(csv_path), 1)
+            start = time.perf_counter()
+            directory = ensure_columnar(
+                csv_path, Path(tmp) / "cache", category_columns=CATEGORY_COLUMNS, id_column="customer_id", order_column=RISK_COLUMN
+            )
+            convert = time.perf_counter() - start
+            open_time = _time(lambda: CustomerStore.open(directory), args.repeat)
+            store = CustomerStore.open(directory)
+            probe = frame["customer_id"].iloc[size // 2]
+            assert store.get(probe) == legacy_lookup(frame, probe)
+            lookup = _time(lambda: store.get(probe), args.repeat)
+            top = _time(lambda: store.top_at_risk(args.top_n, columns=RANKED_COLUMNS), args.repeat)
+            print(
+                f"{size:>9} {read_csv:>8.2f}s {convert:>8.2f}s {open_time * 1e3:>7.2f} ms "
+                f"{lookup * 1e3:>9.4f} ms {top * 1e3:>8.4f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
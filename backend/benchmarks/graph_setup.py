@@ -0,0 +1,40 @@
+"""Per-request graph setup cost: rebuilding and compiling the StateGraph vs. reusing the compiled graph.
+
+    python -m benchmarks.graph_setup --requests 200
+"""
+import argparse
+import time
+
+from app.graph import build_graph, graph_config
+from app.telemetry.langfuse_client import get_langfuse_handler
+
+
+def per_request_rebuild(trace_id: str):
+    # The previous request path: build + compile, then bind the Langfuse callback.
+    compiled = build_graph()
+    handler = get_langfuse_handler(trace_id=trace_id)
+    return compiled.with_config({"callbacks": [handler]}) if handler else compiled
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for i in range(args.requests):
+        per_request_rebuild(f"trace-{i}")
+    before = (time.perf_counter() - start) / args.requests
+
+    start = time.perf_counter()
+    for i in range(args.requests):
+        graph_config(trace_id=f"trace-{i}")
+    after = (time.perf_counter() - start) / args.requests
+
+    print(f"rebuild + compile per request: {before * 1e3:8.3f} ms")
+    print(f"shared graph + runtime config: {after * 1e3:8.3f} ms")
+    print(f"setup saved per request:       {(before - after) * 1e3:8.3f} ms ({before / max(after, 1e-9):.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
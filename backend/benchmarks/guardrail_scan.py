@@ -0,0 +1,89 @@
+"""Compare the per-policy PII/keyword passes with the single-pass guardrail scanner.
+
+    python -m benchmarks.guardrail_scan --sizes 100 1000 10000 100000 1000000
+
+`same` compares labels, redacted text, counts and keyword flags. On long PII-heavy inputs it can read False:
+the old card pattern glued a date such as "2026-01-11" to a following card number and left digits unredacted.
+"""
+import argparse
+import random
+import re
+import time
+from typing import Dict, List, Tuple
+
+from app.guards.guardrails import JAILBREAK_KEYWORDS, SCANNER, THREAT_KEYWORDS
+from app.guards.policy import POLICIES
+
+# The card pattern before it was tightened; the nested lazy quantifier is what made long digit runs slow.
+LEGACY_CARD = re.compile(r"\b(?:\d[ -]*?){13,16}\b")
+LEGACY_PATTERNS = [(p.label, LEGACY_CARD if p.label == "credit_card" else p.pattern, p.replacement("")) for p in POLICIES]
+
+WORDS = "customer renewal plan discount churn offer billing support usage contract premium account".split()
+PII = ["jane.doe@example.com", "(415) 555-0134", "123-45-6789", "4111 1111 1111 1111", "order 88213 on 2026-01-11"]
+
+
+def legacy_scan(text: str) -> Tuple[List[str], str, Dict[str, int], bool, bool]:
+    # Mirrors the previous implementation: one search and one finditer/sub per policy, a lower() per keyword set.
+    labels = [label for label, pattern, _ in LEGACY_PATTERNS if pattern.search(text)]
+    redacted = text
+    counts: Dict[str, int] = {}
+    for label, pattern, replacement in LEGACY_PATTERNS:
+        matches = list(pattern.finditer(redacted))
+        if matches:
+            counts[label] = counts.get(label, 0) + len(matches)
+            redacted = pattern.sub(replacement, redacted)
+    jailbreak = any(k in text.lower() for k in JAILBREAK_KEYWORDS)
+    threat = any(k in text.lower() for k in THREAT_KEYWORDS)
+    return labels, redacted, counts, jailbreak, threat
+
+
+def engine_scan(text: str) -> Tuple[List[str], str, Dict[str, int], bool, bool]:
+    labels, redacted, counts = SCANNER.scan_pii(text)
+    keywords = SCANNER.match_keywords(text)
+    return labels, redacted, counts, keywords["jailbreak"], keywords["threat"]
+
+
+def make_text(size: int, pii_rate: float, rng: random.Random) -> str:
+    parts: List[str] = []
+    length = 0
+    while length < size:
+        token = rng.choice(PII) if rng.random() < pii_rate else rng.choice(WORDS)
+        parts.append(token)
+        length += len(token) + 1
+    return " ".join(parts)[:size]
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--pii-rate", type=float, nargs="+", default=[0.0, 0.05])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'bytes':>9} {'pii':>5} {'legacy':>12} {'engine':>12} {'speedup':>8} {'same':>5}")
+    for size in args.sizes:
+        for rate in args.pii_rate:
+            text = make_text(size, rate, rng)
+            # Loop short inputs so timer resolution doesn't dominate.
+            loops = max(1, 100_000 // max(size, 1))
+            same = legacy_scan(text) == engine_scan(text)
+            legacy = _time(lambda: [legacy_scan(text) for _ in range(loops)], args.repeat) / loops
+            engine = _time(lambda: [engine_scan(text) for _ in range(loops)], args.repeat) / loops
+            print(
+                f"{size:>9} {rate:>5.2f} {legacy * 1e3:>9.3f} ms {engine * 1e3:>9.3f} ms "
+                f"{legacy / engine:>7.1f}x {str(same):>5}"
+            )
+
+
+if __name__ == "__main__":
+    main()
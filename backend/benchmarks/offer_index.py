@@ -0,0 +1,99 @@
+"""Offer matching: the linear catalog scan vs. the (segment, reason) / segment `OfferIndex`.
+
+    python -m benchmarks.offer_index --offers 10000 --queries 2000
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.agents.rag import OfferIndex
+
+REGIONS = ["ON", "QC", "BC", "AB", "MB", "SK", "NS", "NB", "NL", "PE"]
+BASE_SEGMENTS = ["Mass Affluent", "High-Net-Worth", "New-to-Bank", "Service-Recovery"]
+REASONS = [
+    "rewards_competitor",
+    "fees",
+    "service_issue",
+    "rate_sensitivity",
+    "onboarding_confusion",
+    "relocation",
+    "rate_shopping",
+    "digital_experience",
+]
+
+
+def legacy_find_offers(offers_catalog, segment, reason):
+    matches = []
+    for offer in offers_catalog:
+        if segment in offer["segments"] and reason in offer["reasons"]:
+            matches.append(offer)
+    if not matches:
+        matches = [o for o in offers_catalog if segment in o["segments"]]
+    return matches[:3]
+
+
+def make_catalog(size: int, timed: bool, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # Regional variants of the base segments, so most (segment, reason) buckets are small.
+    segments = BASE_SEGMENTS + [f"{segment} {region}" for segment in BASE_SEGMENTS for region in REGIONS]
+    today = date.today()
+    catalog = []
+    for i in range(size):
+        offer = {
+            "id": f"offer-{i:06d}",
+            "name": f"Offer {i}",
+            "segments": list(rng.choice(segments, rng.integers(1, 4), replace=False)),
+            "reasons": list(rng.choice(REASONS, rng.integers(1, 3), replace=False)),
+            "details": "synthetic",
+        }
+        if timed:
+            # A third expired, a third not started yet, a third live; priorities 0-9.
+            start = today + timedelta(days=int(rng.integers(-90, 30)))
+            offer["valid_from"] = start.isoformat()
+            offer["valid_until"] = (start + timedelta(days=int(rng.integers(7, 60)))).isoformat()
+            offer["priority"] = int(rng.integers(0, 10))
+        catalog.append(offer)
+    return catalog, segments
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--offers", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'catalog':>22} {'build':>9} {'scan/query':>11} {'index/query':>12} {'speedup':>8} {'same':>5}")
+    for timed in (False, True):
+        catalog, segments = make_catalog(args.offers, timed)
+        queries = list(zip(rng.choice(segments, args.queries), rng.choice(REASONS, args.queries)))
+
+        start = time.perf_counter()
+        index = OfferIndex(catalog)
+        build = time.perf_counter() - start
+
+        scan = _time(lambda: [legacy_find_offers(catalog, s, r) for s, r in queries], args.repeat) / len(queries)
+        indexed = _time(lambda: [index.find(s, r) for s, r in queries], args.repeat) / len(queries)
+        # Validity windows and priorities change the answer on purpose; compare only the untimed catalog.
+        same = "-" if timed else str(all(index.find(s, r) == legacy_find_offers(catalog, s, r) for s, r in queries))
+        label = f"{args.offers} offers" + (" (windows)" if timed else "")
+        print(
+            f"{label:>22} {build * 1e3:>6.1f} ms {scan * 1e6:>8.1f} us {indexed * 1e6:>9.2f} us "
+            f"{scan / max(indexed, 1e-12):>7.0f}x {same:>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
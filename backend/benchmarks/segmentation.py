@@ -0,0 +1,58 @@
+"""Whole-book segmentation: `segment_customer` per row vs. the vectorized `segment_codes` / `segment_book_ndjson`.
+
+"classify" times the rules alone (per-row over pre-built dicts vs. one pass over the columns); "ndjson" times
+producing the full streamed output of `GET /api/segments`.
+
+    python -m benchmarks.segmentation --sizes 100000 1000000
+"""
+import argparse
+import json
+import time
+
+from app.agents.segmentation import SEGMENTS, segment_book_ndjson, segment_codes, segment_customer
+from app.data.store import CustomerStore
+from benchmarks.customer_store import make_book
+
+
+def _time(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def per_row_ndjson(records):
+    return "".join(
+        json.dumps({"customer_id": record["customer_id"], **segment_customer(record)}) + "\n" for record in records
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'classify per-row':>17} {'vectorized':>11} {'speedup':>8} {'ndjson per-row':>15} {'chunked':>9} {'same':>5}")
+    for size in args.sizes:
+        frame = make_book(size)
+        records = frame.to_dict(orient="records")
+        store = CustomerStore.from_frame(frame)
+
+        row_time, row_segments = _time(lambda: [segment_customer(r)["segment"] for r in records], args.repeat)
+        vec_time, codes = _time(
+            lambda: segment_codes(frame["avg_balance"], frame["tenure_months"], frame["complaints_90d"]), args.repeat
+        )
+        row_ndjson_time, row_ndjson = _time(lambda: per_row_ndjson(records), 1)
+        book_ndjson_time, book_ndjson = _time(lambda: "".join(segment_book_ndjson(store, {})), 1)
+        same = [SEGMENTS[c] for c in codes.tolist()] == row_segments and row_ndjson == book_ndjson
+        print(
+            f"{size:>9} {row_time:>16.3f}s {vec_time:>10.4f}s {row_time / max(vec_time, 1e-9):>7.0f}x "
+            f"{row_ndjson_time:>14.2f}s {book_ndjson_time:>8.2f}s {str(same):>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare the original per-query cosine scan with the normalized-matrix top-k search.
+
+    python -m benchmarks.semantic_search --sizes 1000 100000 1000000 --dim 768
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.rag.semantic import cosine_top_k, normalize_rows
+
+
+def legacy_search(embeddings: np.ndarray, query_vec: np.ndarray, top_k: int) -> np.ndarray:
+    # Mirrors the pre-normalization implementation: norms recomputed and a full argsort per query.
+    denom = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_vec)
+    scores = np.dot(embeddings, query_vec) / np.clip(denom, 1e-6, None)
+    return np.argsort(scores)[::-1][:top_k]
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'items':>10} {'legacy/query':>14} {'search/query':>14} {'search_many/query':>18} {'speedup':>8}")
+    for size in args.sizes:
+        corpus = rng.standard_normal((size, args.dim), dtype=np.float32)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        matrix = normalize_rows(corpus)
+
+        expected = [legacy_search(corpus, q, args.top_k) for q in queries[:4]]
+        got, _ = cosine_top_k(matrix, queries[:4], args.top_k)
+        assert all(np.array_equal(e, g) for e, g in zip(expected, got)), "top-k mismatch"
+
+        legacy = _time(lambda: [legacy_search(corpus, q, args.top_k) for q in queries], args.repeat)
+        single = _time(lambda: [cosine_top_k(matrix, q, args.top_k) for q in queries], args.repeat)
+        batched = _time(lambda: cosine_top_k(matrix, queries, args.top_k), args.repeat)
+        n = args.queries
+        print(
+            f"{size:>10} {legacy / n * 1e3:>11.3f} ms {single / n * 1e3:>11.3f} ms "
+            f"{batched / n * 1e3:>15.3f} ms {legacy / batched:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Transaction features: loading the whole feed into one DataFrame vs. the chunked incremental pipeline.
+
+Times and peak traced memory (tracemalloc) for a one-shot pd.read_csv + groupby, the streaming pipeline from
+scratch, and the pipeline again after 1% more rows were appended (only the new rows are read).
+
+    python -m benchmarks.transaction_features --rows 1000000 5000000 --customers 200000
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.data.features import update_transaction_features
+
+CATEGORIES = ["Groceries", "Transit", "Travel", "Bills", "Health", "Education", "Electronics", "Dining"]
+
+
+def write_feed(path: Path, rows: int, customers: int, start_day: int, mode: str = "w", seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    chunk = 1_000_000
+    with open(path, mode, encoding="utf-8") as handle:
+        if mode == "w":
+            handle.write("customer_id,merchant,category,amount,transaction_date\n")
+        for begin in range(0, rows, chunk):
+            n = min(chunk, rows - begin)
+            frame = pd.DataFrame(
+                {
+                    "customer_id": np.char.add("CUST-", (1_000_000 + rng.integers(0, customers, n)).astype(str)),
+                    "merchant": "Merchant",
+                    "category": rng.choice(CATEGORIES, n),
+                    "amount": np.round(rng.gamma(2.0, 40.0, n), 2),
+                    # Roughly time-ordered, like an appended feed.
+                    "transaction_date": (
+                        np.datetime64("2025-01-01") + start_day + np.sort(rng.integers(0, 120, n)).astype("timedelta64[D]")
+                    ).astype(str),
+                }
+            )
+            frame.to_csv(handle, header=False, index=False)
+
+
+def one_shot(path: Path) -> int:
+    frame = pd.read_csv(path)
+    frame["transaction_date"] = pd.to_datetime(frame["transaction_date"])
+    as_of = frame["transaction_date"].max()
+    recent = frame[frame["transaction_date"] > as_of - pd.Timedelta(days=30)]
+    totals = frame.groupby("customer_id").agg(total=("amount", "sum"), last=("transaction_date", "max"))
+    totals["spend_30d"] = recent.groupby("customer_id")["amount"].sum()
+    totals.join(frame.groupby(["customer_id", "category"])["amount"].sum().unstack(fill_value=0.0))
+    return len(totals)
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    parser.add_argument("--customers", type=int, default=200_000)
+    parser.add_argument("--chunk-rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'one-shot':>9} {'peak MB':>8} {'streaming':>10} {'peak MB':>8} {'+1% rows':>9} {'customers':>10}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            feed = Path(tmp) / "transactions.csv"
+            write_feed(feed, rows, args.customers, start_day=0)
+            shot_time, shot_peak, _ = _measure(lambda: one_shot(feed))
+            stream_time, stream_peak, features = _measure(
+                lambda: update_transaction_features(feed, Path(tmp) / "state", args.chunk_rows)
+            )
+            write_feed(feed, max(1, rows // 100), args.customers, start_day=120, mode="a", seed=1)
+            start = time.perf_counter()
+            update_transaction_features(feed, Path(tmp) / "state", args.chunk_rows)
+            append_time = time.perf_counter() - start
+            print(
+                f"{rows:>10} {shot_time:>8.2f}s {shot_peak:>8.0f} {stream_time:>9.2f}s {stream_peak:>8.0f} "
+                f"{append_time:>8.2f}s {len(features):>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -126,6 +126,9 @@ export default function ChatPage() {
           if (data && !conversationId) setConversationId(data);
         } else if (event === "chunk") {
           streamBufferRef.current = streamBufferRef.current + data;
+        } else if (event === "replace") {
+          // The stored answer differs from the streamed tokens; show what was saved.
+          streamBufferRef.current = data;
         } else if (event === "done") {
           const full = streamBufferRef.current;
           setMessages((prev) => {